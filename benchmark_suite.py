@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# 🎲 Vocabulary for synthetic catalogs
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family", "Fantasy",
+          "History", "Horror", "Music", "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western"]
+SORT_FIELDS = ["title", "year", "rating"]
+
+
+def synthetic_movies(n, seed=0, vocabulary_size=5000):
+    """
+    `n` movie rows with the same columns as the movie tables. Words follow a Zipf
+    distribution, so TF-IDF and title search behave roughly like a real catalog.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f"{prefix}{i}" for i, prefix in
+                      zip(range(vocabulary_size), np.resize(["ka", "lo", "mi", "ra", "su", "to", "ve"], vocabulary_size))])
+    ranks = np.arange(1, vocabulary_size + 1)
+    weights = 1.0 / ranks
+    weights /= weights.sum()
+
+    def phrases(count, length):
+        picks = words[rng.choice(vocabulary_size, size=(count, length), p=weights)]
+        return [" ".join(row) for row in picks]
+
+    genre_picks = rng.integers(0, len(GENRES), size=(n, 2))
+    return pd.DataFrame({
+        "title": [f"{phrase} {i}".title() for i, phrase in enumerate(phrases(n, 2))],
+        "genres": [", ".join(sorted({GENRES[a], GENRES[b]})) for a, b in genre_picks],
+        "year": rng.integers(1920, 2025, size=n),
+        "rating": np.round(rng.uniform(1.0, 10.0, size=n), 1),
+        "description": phrases(n, 25),
+        "director": [f"Director {i}" for i in rng.integers(0, max(n // 20, 1), size=n)],
+        "stars": [f"Star {a}, Star {b}" for a, b in rng.integers(0, max(n // 5, 1), size=(n, 2))],
+    })
+
+
+def percentiles(latencies_ms):
+    latencies = np.asarray(latencies_ms)
+    return {
+        "count": int(len(latencies)),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p90_ms": round(float(np.percentile(latencies, 90)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+
+def timed_calls(fn, inputs):
+    """
+    Call `fn` once per input; per-call latency percentiles (ms). Prints from the code
+    under test are swallowed so they don't flood the report.
+    """
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def throughput(fn, inputs, concurrency):
+    """
+    Requests/sec and latency percentiles with `concurrency` callers sharing `inputs`.
+    """
+    def call(item):
+        start = time.perf_counter()
+        fn(item)
+        return (time.perf_counter() - start) * 1000
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(call, inputs))
+        seconds = time.perf_counter() - start
+    stats = percentiles(latencies)
+    stats.update({"concurrency": concurrency, "rps": round(len(inputs) / seconds, 1)})
+    return stats
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, or None where `resource` is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, tolerance=0.10):
+    """
+    Print every numeric metric next to its value in `previous`, flagging regressions
+    beyond `tolerance` (higher is worse, except for requests/sec).
+    """
+    def flatten(results, prefix=""):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+
+    old = dict(flatten(previous["results"]))
+    print(f"\n📈 Compared with {previous.get('commit') or 'previous run'}:")
+    for name, value in flatten(current["results"]):
+        if name not in old or not old[name] or name.endswith((".count", ".movies", ".concurrency")):
+            continue
+        ratio = value / old[name]
+        worse = ratio < 1 - tolerance if name.endswith("rps") else ratio > 1 + tolerance
+        print(f"{'⚠️' if worse else '  '} {name:<48} {old[name]:>12} -> {value:>12} ({ratio:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark catalog loading, recommendations, search and the API")
+    parser.add_argument("--movies", type=int, default=100_000, help="Synthetic movies to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500, help="Calls per micro benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="HTTP requests per route benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients for throughput runs")
+    parser.add_argument("--database-url", default=None,
+                        help="Database to benchmark against (default: a fresh SQLite file in a temp dir)")
+    parser.add_argument("--reseed", action="store_true",
+                        help="Delete movies already in the database and seed a fresh catalog (default: reuse them)")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on for the route benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Step 1: Point the app at the benchmark database before any app module creates its engine
+    workdir = tempfile.mkdtemp(prefix="movies-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ["RECOMMENDER_ARTIFACT_DIR"] = ""
+    os.environ["RECOMMENDER_REFRESH_SECONDS"] = "0"
+    if not args.cache:
+        os.environ["CACHE_BACKEND"] = "off"
+
+    from fastapi.testclient import TestClient
+
+    import crud
+    import main
+    import recommender
+    from bulk_loader import load_dataframe
+    from database import SessionLocal, engine
+    from models import IMDbMovie, KaggleMovie
+
+    results = {}
+    rng = np.random.default_rng(args.seed)
+
+    # Step 2: Seed both tables with the synthetic catalog
+    db = SessionLocal()
+    existing = db.query(IMDbMovie).count() + db.query(KaggleMovie).count()
+    db.close()
+    if existing and not args.reseed:
+        print(f"♻️ Reusing {existing} movies already in the database (pass --reseed to replace them).")
+    else:
+        if existing:
+            with engine.begin() as conn:
+                conn.execute(IMDbMovie.__table__.delete())
+                conn.execute(KaggleMovie.__table__.delete())
+        start = time.perf_counter()
+        catalog = synthetic_movies(args.movies, args.seed)
+        generate_seconds = time.perf_counter() - start
+        half = len(catalog) // 2
+        with contextlib.redirect_stdout(io.StringIO()):
+            imdb_stats = load_dataframe(engine, catalog.iloc[:half], IMDbMovie.__tablename__)
+            kaggle_stats = load_dataframe(engine, catalog.iloc[half:], KaggleMovie.__tablename__)
+        results["seed"] = {
+            "movies": len(catalog),
+            "generate_seconds": round(generate_seconds, 3),
+            "load_seconds": round(imdb_stats["seconds"] + kaggle_stats["seconds"], 3),
+        }
+        del catalog
+
+    # Step 3: Read the catalog and build the recommender (legacy load_combined_data path)
+    db = SessionLocal()
+    start = time.perf_counter()
+    imdb_movies, kaggle_movies = crud.get_catalog(db)
+    read_seconds = time.perf_counter() - start
+    db.close()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender.load_combined_data(imdb_movies, kaggle_movies)
+    results["build"] = {
+        "movies": len(imdb_movies) + len(kaggle_movies),
+        "read_seconds": round(read_seconds, 3),
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "embedding": recommender.EMBEDDING,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"🧠 Built index over {results['build']['movies']} movies in {results['build']['build_seconds']}s")
+
+    # Step 4: Micro benchmarks straight against the Python functions
+    titles = recommender.combined_df["title"].to_numpy()
+    sample_titles = titles[rng.integers(0, len(titles), size=args.queries)].tolist()
+    sample_genres = rng.choice(GENRES, size=args.queries).tolist()
+    sample_words = [title.split()[0] for title in sample_titles]
+
+    results["recommendations"] = {
+        "title": timed_calls(lambda t: recommender.get_combined_recommendations(t, "", None, 10), sample_titles),
+        "title_genre": timed_calls(lambda q: recommender.get_combined_recommendations(q[0], q[1], None, 10),
+                                   list(zip(sample_titles, sample_genres))),
+        "title_genre_rating": timed_calls(lambda q: recommender.get_combined_recommendations(q[0], q[1], 7.0, 10),
+                                          list(zip(sample_titles, sample_genres))),
+    }
+
+    db = SessionLocal()
+    results["crud"] = {
+        f"search_by_{sort_by}": timed_calls(lambda w: crud._get_movies(db, IMDbMovie, w, sort_by, 0, 50), sample_words)
+        for sort_by in SORT_FIELDS
+    }
+    results["crud"]["list_first_page"] = timed_calls(lambda _: crud._get_movies(db, IMDbMovie, "", "title", 0, 50),
+                                                     range(args.queries))
+    db.close()
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    # Step 5: Macro benchmarks through the HTTP routes, sequential and concurrent
+    request_titles = [sample_titles[i % len(sample_titles)] for i in range(args.requests)]
+    request_words = [sample_words[i % len(sample_words)] for i in range(args.requests)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), TestClient(main.app) as client:
+        startup_seconds = time.perf_counter() - start
+
+        def recommend(title):
+            client.get("/recommendations/filter", params={"title": title}).raise_for_status()
+
+        def search(word):
+            client.get("/search", params={"query": word, "limit": 50}).raise_for_status()
+
+        sequential = min(args.requests, args.queries)
+        results["api"] = {
+            "startup_seconds": round(startup_seconds, 3),
+            "recommendations_filter": timed_calls(recommend, request_titles[:sequential]),
+            "recommendations_filter_concurrent": throughput(recommend, request_titles, args.concurrency),
+            "search": timed_calls(search, request_words[:sequential]),
+            "search_concurrent": throughput(search, request_words, args.concurrency),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    # Step 6: Save for comparison across commits
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": engine.dialect.name,
+        "params": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"✅ Results saved to '{args.output}'")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
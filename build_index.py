@@ -0,0 +1,31 @@
+import sys
+import time
+
+import crud
+import index_artifact
+import neighbour_table
+from database import SessionLocal
+from recommender import build_snapshot
+
+if __name__ == "__main__":
+    # Step 1: Where to write the artifact
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else index_artifact.DEFAULT_ARTIFACT_DIR
+    # Neighbours to precompute per movie (0 skips the table)
+    neighbours_k = int(sys.argv[2]) if len(sys.argv) > 2 else neighbour_table.NEIGHBOURS_K
+
+    # Step 2: Load both tables
+    db = SessionLocal()
+    try:
+        imdb_movies, kaggle_movies = crud.get_catalog(db)
+    finally:
+        db.close()
+
+    # Step 3: Fit TF-IDF, build the FAISS index and the top-K neighbour table
+    start = time.perf_counter()
+    snapshot = build_snapshot(imdb_movies, kaggle_movies, neighbours_k=neighbours_k)
+    print(f"🧠 Built index over {len(snapshot.combined_df)} movies in {time.perf_counter() - start:.1f}s"
+          + (f" with {neighbours_k} neighbours per movie" if neighbours_k else ""))
+
+    # Step 4: Persist for memory-mapped loading by the API workers
+    manifest = index_artifact.save_artifact(out_dir, snapshot)
+    print(f"✅ Saved index artifact to '{out_dir}' (source hash {manifest['source_hash'][:12]})")
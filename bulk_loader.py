@@ -0,0 +1,232 @@
+import io
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+from sqlalchemy import inspect
+
+from models import BUMP_CATALOG_VERSION, CATALOG_TABLES, CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+# 📦 Rows sent per COPY statement; bounds the CSV buffer held in memory
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "50000"))
+
+# Natural key used to match incoming movies against existing rows in "upsert" mode
+NATURAL_KEY = ("title", "year")
+
+LOAD_MODES = ("append", "replace", "upsert")
+
+# 🔔 API server that upload scripts (running outside it) notify after a load
+RECOMMENDER_URL = os.getenv("RECOMMENDER_URL", "http://127.0.0.1:8000")
+NOTIFY_TIMEOUT = float(os.getenv("RECOMMENDER_NOTIFY_TIMEOUT", "30"))
+
+
+def load_dataframe(engine, df, table_name, mode="append", key=NATURAL_KEY, chunk_rows=COPY_CHUNK_ROWS,
+                   recommender=None):
+    """
+    Bulk-load a cleaned DataFrame into `table_name` with PostgreSQL `COPY FROM STDIN`.
+
+    - "append": copy the rows straight into the table
+    - "replace": copy into a staging table, then swap the table contents for it
+    - "upsert": copy into a staging table, then update rows matching on `key`
+      and insert the rest
+
+    Everything runs in one transaction, so readers keep seeing the previous
+    contents until the load commits and never a half-loaded table.
+    Returns `{"rows", "inserted", "updated", "updated_ids", "seconds", "rows_per_second"}`.
+
+    With `recommender` (a RecommenderEngine in the same process), the index is brought
+    up to date after the commit; see `update_index`.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}' (expected {', '.join(LOAD_MODES)})")
+
+    df = _prepare(df)
+    if mode == "upsert":
+        missing = [column for column in key if column not in df.columns]
+        if missing:
+            raise ValueError(f"Upsert key columns missing from the data: {missing}")
+        # Rows without a full key can't be matched; the last duplicate of a key wins
+        df = df.dropna(subset=list(key)).drop_duplicates(subset=list(key), keep="last")
+
+    # Create the table from the DataFrame dtypes if it doesn't exist yet (no rows written)
+    df.head(0).to_sql(table_name, engine, if_exists="append", index=False)
+    bump_version = _bumps_catalog_version(engine, table_name)
+
+    started = time.perf_counter()
+    if engine.dialect.name != "postgresql":
+        if mode != "append":
+            raise ValueError(f"'{mode}' loads need PostgreSQL, not {engine.dialect.name}")
+        with engine.begin() as conn:
+            df.to_sql(table_name, conn, if_exists="append", index=False, method="multi", chunksize=1000)
+            if bump_version:
+                conn.exec_driver_sql(BUMP_CATALOG_VERSION)
+        stats = {"inserted": len(df), "updated": 0, "updated_ids": []}
+    else:
+        stats = _copy_load(engine, df, table_name, mode, key, chunk_rows, bump_version)
+
+    seconds = time.perf_counter() - started
+    stats.update({
+        "rows": len(df),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(len(df) / seconds) if seconds else len(df),
+    })
+    logger.info(f"✅ Loaded {len(df)} rows into '{table_name}' ({mode}) in {seconds:.2f}s",
+                extra={"table": table_name, "mode": mode, "rows_per_second": stats["rows_per_second"],
+                       "inserted": stats["inserted"], "updated": stats["updated"]})
+
+    if recommender is not None:
+        update_index(recommender, table_name, mode, stats)
+    return stats
+
+
+def update_index(recommender, table_name, mode, stats):
+    """
+    Bring `recommender` up to date with a finished load into `table_name`.
+
+    - "append": new rows are above the index's high-water marks, so a refresh finds them
+    - "replace": every row got a new id and the old ids are gone, so only a full reload is correct
+    - "upsert": inserted rows are found by the refresh; rows updated in place sit below
+      the marks and are passed to it explicitly as `updated_ids`
+    """
+    source = _index_source(table_name)
+    if source is None:
+        return None
+    if mode == "replace":
+        return recommender.reload()
+    return recommender.refresh(updated_keys=[(source, movie_id) for movie_id in stats["updated_ids"]])
+
+
+def notify_server(table_name, mode, stats, url=RECOMMENDER_URL, timeout=NOTIFY_TIMEOUT):
+    """
+    `update_index` for loads run outside the server: POST /admin/reload after a replace
+    (the background poller would otherwise append the new ids next to the old ones), and
+    /admin/index/refresh with the `updated_ids` otherwise.
+
+    Returns the server's JSON reply, or None when `table_name` isn't indexed or the
+    server can't be reached (it picks the load up on its next reload then).
+    """
+    source = _index_source(table_name)
+    if source is None:
+        return None
+    if mode == "replace":
+        path, body = "/admin/reload", {}
+    else:
+        path, body = "/admin/index/refresh", {"updated": [{"source": source, "id": int(movie_id)}
+                                                          for movie_id in stats["updated_ids"]]}
+
+    request = urllib.request.Request(url.rstrip("/") + path, data=json.dumps(body).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b"null")
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.warning(f"⚠️ Could not update the recommender index at {url}{path}: {e}")
+        return None
+
+
+def _index_source(table_name):
+    """
+    Source name ("imdb" / "kaggle") of the served movie table `table_name`, or None.
+    """
+    from crud import MODEL_SOURCES
+
+    sources = {model.__tablename__: source for model, source in MODEL_SOURCES.items()}
+    return sources.get(table_name)
+
+
+def _bumps_catalog_version(engine, table_name):
+    """
+    True when a load into `table_name` changes what /search serves, so it must bump the
+    catalog version (see models.CatalogVersion) in its own transaction.
+    """
+    return table_name in CATALOG_TABLES and inspect(engine).has_table(CatalogVersion.__tablename__)
+
+
+def _copy_load(engine, df, table_name, mode, key, chunk_rows, bump_version=False):
+    quote = engine.dialect.identifier_preparer.quote
+    target = quote(table_name)
+    columns = ", ".join(quote(column) for column in df.columns)
+    stats = {"inserted": len(df), "updated": 0, "updated_ids": []}
+    # Tables created by pandas have no id column to report updated rows by
+    has_id = mode == "upsert" and "id" in {column["name"] for column in inspect(engine).get_columns(table_name)}
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        copy_into = target
+        if mode != "append":
+            # Temp tables skip the WAL; only the loaded columns, so no ids are drawn from the sequence
+            copy_into = quote(f"{table_name}_staging")
+            cursor.execute(f"CREATE TEMP TABLE {copy_into} ON COMMIT DROP AS "
+                           f"SELECT {columns} FROM {target} WITH NO DATA")
+
+        for start in range(0, len(df), chunk_rows):
+            _copy_chunk(cursor, copy_into, columns, df.iloc[start:start + chunk_rows])
+
+        if mode != "append":
+            cursor.execute(f"ANALYZE {copy_into}")
+
+        if mode == "replace":
+            # DELETE rather than TRUNCATE: readers aren't locked out while the swap runs
+            cursor.execute(f"DELETE FROM {target}")
+            cursor.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {copy_into}")
+        elif mode == "upsert":
+            match = " AND ".join(f"t.{quote(column)} = s.{quote(column)}" for column in key)
+            updates = ", ".join(f"{quote(column)} = s.{quote(column)}" for column in df.columns if column not in key)
+            if updates:
+                returning = " RETURNING t.id" if has_id else ""
+                cursor.execute(f"UPDATE {target} AS t SET {updates} FROM {copy_into} AS s WHERE {match}{returning}")
+                stats["updated"] = cursor.rowcount
+                if has_id:
+                    stats["updated_ids"] = [int(row[0]) for row in cursor.fetchall()]
+            cursor.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {copy_into} AS s "
+                           f"WHERE NOT EXISTS (SELECT 1 FROM {target} AS t WHERE {match})")
+            stats["inserted"] = cursor.rowcount
+
+        if bump_version:
+            # Last statement before the commit, so the row lock is held only for the commit itself
+            cursor.execute(BUMP_CATALOG_VERSION)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return stats
+
+
+def _copy_chunk(cursor, table, columns, chunk):
+    """
+    Stream one chunk as CSV through COPY (psycopg2 `copy_expert`, or psycopg 3 `copy`).
+    """
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    statement = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(statement, buffer)
+    else:
+        with cursor.copy(statement) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _prepare(df):
+    """
+    Copy of `df` whose whole-number float columns (e.g. years read with NaNs) are
+    nullable integers, so COPY into INTEGER columns doesn't choke on "2010.0".
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values):
+            present = values.dropna()
+            if len(present) and (present % 1 == 0).all():
+                df[column] = values.astype("Int64")
+    return df
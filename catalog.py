@@ -0,0 +1,287 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import literal, select
+
+# 🪶 With pyarrow installed (pip install pyarrow), saved text columns load zero-copy too
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# 📚 Movie columns read from both tables, in output order
+CATALOG_COLUMNS = ["id", "title", "year", "rating", "genres", "director", "stars", "description"]
+SOURCES = ("imdb", "kaggle")
+
+# Low-cardinality text stored once per distinct value, as int codes per row
+CATEGORY_COLUMNS = ["genres", "director"]
+TEXT_COLUMNS = ["title", "stars", "description"]
+
+# `source:id` of the duplicate rows merged into a catalog entry (see dedup.py); mostly empty
+PROVENANCE_COLUMN = "merged_from"
+# Their titles, where they differ from the entry's own, so title lookups still find them
+ALIAS_COLUMN = "merged_titles"
+ALIAS_SEPARATOR = "\x1f"
+MERGE_COLUMNS = [PROVENANCE_COLUMN, ALIAS_COLUMN]
+
+# Rows fetched from the database per round trip while loading the catalog
+READ_CHUNK_ROWS = 50000
+
+# Layout of a catalog saved with `save_frame`
+LAYOUT_FILE = "columns.json"
+
+
+def movie_columns(model, source=None):
+    """
+    Core column select for `model`: plain rows, no ORM objects or identity map.
+    With `source`, each row also carries it as a constant `source` column (and an
+    empty provenance column, as table rows are never merged).
+    """
+    columns = [getattr(model, column) for column in CATALOG_COLUMNS]
+    if source is not None:
+        columns += [literal(source).label("source"), literal("").label(PROVENANCE_COLUMN)]
+    return select(*columns)
+
+
+def read_movies(db, model, condition=None, chunk_rows=READ_CHUNK_ROWS):
+    """
+    Catalog rows of one table as a compact DataFrame, streamed in chunks so the
+    full set of row tuples never sits in memory next to the columns built from it.
+    """
+    statement = movie_columns(model).order_by(model.id).execution_options(yield_per=chunk_rows)
+    if condition is not None:
+        statement = statement.where(condition)
+
+    chunks = [compact_frame(pd.DataFrame.from_records(rows, columns=CATALOG_COLUMNS))
+              for rows in db.execute(statement).partitions()]
+    return concat_frames(chunks) if chunks else compact_frame(pd.DataFrame(columns=CATALOG_COLUMNS))
+
+
+def frame_from_movies(movies):
+    """
+    Catalog DataFrame from ORM objects or result rows that have the catalog attributes.
+    """
+    return compact_frame(pd.DataFrame.from_records(
+        [tuple(getattr(movie, column) for column in CATALOG_COLUMNS) for movie in movies],
+        columns=CATALOG_COLUMNS,
+    ))
+
+
+def compact_frame(df):
+    """
+    Catalog dtypes: int64 ids, nullable Int16 years, float ratings, categorical
+    genres/director and empty strings instead of missing text.
+    """
+    columns = {
+        "id": pd.to_numeric(df["id"]).astype(np.int64),
+        "year": pd.to_numeric(df["year"], errors="coerce").astype("Int16"),
+        "rating": pd.to_numeric(df["rating"], errors="coerce").astype(np.float64),
+    }
+    for column in TEXT_COLUMNS:
+        columns[column] = df[column].fillna("").astype(str)
+    for column in CATEGORY_COLUMNS + MERGE_COLUMNS:
+        if column in df:
+            columns[column] = df[column].fillna("").astype(str).astype("category")
+    if "source" in df:
+        columns["source"] = df["source"].astype(pd.CategoricalDtype(SOURCES))
+    return pd.DataFrame(columns, index=df.index)[[c for c in df.columns if c in columns]]
+
+
+def combine_sources(imdb_df, kaggle_df):
+    """
+    One catalog over both tables, IMDb rows first, with categorical `source` and
+    (still empty) provenance and alias columns.
+    """
+    frames = [df.assign(source=pd.Categorical.from_codes(np.full(len(df), code, dtype=np.int8), categories=SOURCES))
+              for code, df in enumerate((imdb_df, kaggle_df))]
+    combined = concat_frames(frames)
+    for column in MERGE_COLUMNS:
+        combined[column] = pd.Categorical.from_codes(np.zeros(len(combined), dtype=np.int8), categories=[""])
+    return combined
+
+
+def concat_frames(frames):
+    """
+    `pd.concat` that keeps categorical columns categorical (plain concat falls back
+    to object dtype whenever the frames' categories differ).
+    """
+    combined = pd.concat(frames, ignore_index=True)
+    for column in CATEGORY_COLUMNS + MERGE_COLUMNS:
+        if column in combined and all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames):
+            combined[column] = union_categoricals([df[column].array for df in frames], ignore_order=True)
+    if "source" in combined:
+        combined["source"] = combined["source"].astype(pd.CategoricalDtype(SOURCES))
+    return combined
+
+
+class MovieCatalog:
+    """
+    Read-only view over a catalog DataFrame that turns row positions into
+    response dicts straight from the column arrays, with no per-row Series.
+    """
+
+    def __init__(self, combined_df, columns=CATALOG_COLUMNS + ["source", PROVENANCE_COLUMN]):
+        self.columns = [column for column in columns if column in combined_df]
+        self._readers = [_column_reader(combined_df[column]) for column in self.columns]
+
+    def records(self, rows):
+        """
+        One dict per row position, with plain Python values (None for missing).
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 0:
+            return []
+        values = [read(rows) for read in self._readers]
+        return [dict(zip(self.columns, row)) for row in zip(*values)]
+
+
+def _column_reader(series):
+    """
+    `rows -> list of values` for one column, resolving categories and missing values.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        categories = np.append(series.cat.categories.to_numpy(dtype=object), None)
+        # Missing values have code -1, which picks the trailing None
+        return lambda rows: categories[codes[rows]].tolist()
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        # Nullable ints and pandas strings: take the rows first, then convert just those
+        array = series.array
+        return lambda rows: array[rows].to_numpy(dtype=object, na_value=None).tolist()
+
+    values = series.to_numpy()
+    if values.dtype.kind == "f":
+        return lambda rows: [None if v != v else v for v in values[rows].tolist()]
+    return lambda rows: values[rows].tolist()
+
+
+class TitleIndex:
+    """
+    Case/whitespace-insensitive title -> first live row, as sorted 64-bit hashes of the
+    normalized titles. Plain arrays (no dict of strings), so it can be saved and memory-mapped.
+    A hit is only a candidate; callers compare the row's title (or its aliases) to rule out
+    hash collisions.
+    """
+
+    def __init__(self, hashes, rows):
+        self.hashes = hashes
+        self.rows = rows
+
+    @classmethod
+    def build(cls, titles, live=None, aliases=None):
+        """
+        Index `titles`, plus each row's `aliases` (ALIAS_SEPARATOR-joined titles of the
+        duplicates merged into it). A row's own title wins over another row's alias.
+        """
+        rows = np.arange(len(titles)) if live is None else np.flatnonzero(live)
+        keys = title_keys(titles).to_numpy(dtype=object)[rows]
+        if aliases is not None:
+            merged = pd.Series(aliases.astype(str).to_numpy(dtype=object)[rows])
+            merged = merged[merged != ""].str.split(ALIAS_SEPARATOR).explode()
+            rows = np.concatenate([rows, rows[merged.index.to_numpy(dtype=np.intp)]])
+            keys = np.concatenate([keys, title_keys(merged).to_numpy(dtype=object)])
+        hashes = _title_hashes(keys)
+        order = np.argsort(hashes, kind="stable")
+        hashes, rows = hashes[order], rows[order]
+        first = np.ones(len(hashes), dtype=bool)
+        first[1:] = hashes[1:] != hashes[:-1]
+        return cls(hashes[first], rows[first])
+
+    def find(self, key):
+        """
+        Candidate row for an already normalized title, or None.
+        """
+        target = _title_hashes(np.array([key], dtype=object))[0]
+        i = np.searchsorted(self.hashes, target)
+        if i < len(self.hashes) and self.hashes[i] == target:
+            return int(self.rows[i])
+        return None
+
+
+def title_keys(titles):
+    return titles.fillna("").astype(str).str.lower().str.strip()
+
+
+def _title_hashes(keys):
+    return pd.util.hash_array(keys, categorize=False)
+
+
+def save_frame(df, path):
+    """
+    Write a catalog frame as one .npy file per column array (codes for categoricals,
+    UTF-8 bytes plus offsets for text), for `load_frame` to memory-map.
+    """
+    os.makedirs(path, exist_ok=True)
+    layout = {"rows": len(df), "columns": []}
+    for column in df.columns:
+        values = df[column]
+        prefix = os.path.join(path, column)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(f"{prefix}.codes.npy", values.array.codes)
+            layout["columns"].append({"name": column, "kind": "category",
+                                      "categories": values.cat.categories.astype(str).tolist()})
+        elif pd.api.types.is_string_dtype(values.dtype):
+            encoded = [value.encode() for value in values.fillna("").astype(str).tolist()]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            np.save(f"{prefix}.offsets.npy", offsets)
+            np.save(f"{prefix}.data.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            layout["columns"].append({"name": column, "kind": "text"})
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+            # Nullable integers (year): values plus missing-value mask
+            np.save(f"{prefix}.npy", values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+            np.save(f"{prefix}.mask.npy", values.isna().to_numpy())
+            layout["columns"].append({"name": column, "kind": "nullable"})
+        else:
+            np.save(f"{prefix}.npy", values.to_numpy())
+            layout["columns"].append({"name": column, "kind": "array"})
+
+    with open(os.path.join(path, LAYOUT_FILE), "w", encoding="utf-8") as f:
+        json.dump(layout, f)
+
+
+def load_frame(path):
+    """
+    Catalog frame saved by `save_frame`, with its arrays memory-mapped copy-on-write:
+    every process loading the same files shares their pages. Text columns are shared
+    as well with pyarrow; without it each process decodes its own copy.
+    """
+    with open(os.path.join(path, LAYOUT_FILE), encoding="utf-8") as f:
+        layout = json.load(f)
+
+    columns = {}
+    for entry in layout["columns"]:
+        prefix = os.path.join(path, entry["name"])
+        if entry["kind"] == "category":
+            columns[entry["name"]] = pd.Categorical.from_codes(
+                _mapped(f"{prefix}.codes.npy"), categories=entry["categories"], validate=False)
+        elif entry["kind"] == "text":
+            columns[entry["name"]] = _text_array(_mapped(f"{prefix}.offsets.npy"), _mapped(f"{prefix}.data.npy"))
+        elif entry["kind"] == "nullable":
+            columns[entry["name"]] = pd.arrays.IntegerArray(_mapped(f"{prefix}.npy"), _mapped(f"{prefix}.mask.npy"),
+                                                            copy=False)
+        else:
+            columns[entry["name"]] = pd.Series(_mapped(f"{prefix}.npy"), copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _mapped(path):
+    """
+    Copy-on-write memory map of a saved array (pandas wraps writable arrays without copying).
+    """
+    array = np.load(path, mmap_mode="c")
+    return array if array.size else np.load(path)
+
+
+def _text_array(offsets, data):
+    if pyarrow is not None:
+        strings = pyarrow.LargeStringArray.from_buffers(len(offsets) - 1, pyarrow.py_buffer(offsets),
+                                                        pyarrow.py_buffer(data))
+        return pd.array(strings, dtype=pd.StringDtype("pyarrow", na_value=np.nan))
+    raw = bytes(data)
+    bounds = offsets.tolist()
+    return pd.array([raw[start:end].decode() for start, end in zip(bounds[:-1], bounds[1:])], dtype=str)
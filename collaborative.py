@@ -0,0 +1,394 @@
+import json
+import logging
+import os
+import threading
+
+import faiss
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import catalog
+import dedup
+import vector_index
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# 👥 Implicit ALS: latent factors, alternating sweeps, L2 regularization and the confidence
+# scale (an event with weight w counts as confidence 1 + alpha * w)
+FACTORS = int(os.getenv("RECOMMENDER_CF_FACTORS", "64"))
+ITERATIONS = int(os.getenv("RECOMMENDER_CF_ITERATIONS", "15"))
+REGULARIZATION = float(os.getenv("RECOMMENDER_CF_REGULARIZATION", "0.05"))
+ALPHA = float(os.getenv("RECOMMENDER_CF_ALPHA", "40"))
+
+# Conjugate-gradient steps per least-squares solve, and events handled per vectorized block
+CG_STEPS = int(os.getenv("RECOMMENDER_CF_CG_STEPS", "3"))
+BLOCK_EVENTS = int(os.getenv("RECOMMENDER_CF_BLOCK_EVENTS", "262144"))
+
+# Explicit ratings below this are negative feedback and not counted as interest
+MIN_RATING = float(os.getenv("RECOMMENDER_CF_MIN_RATING", "5"))
+
+# 🔀 Hybrid mode: default share of the collaborative score, and candidates drawn
+# from each index per requested result before the blended re-ranking
+HYBRID_WEIGHT = float(os.getenv("RECOMMENDER_HYBRID_WEIGHT", "0.5"))
+HYBRID_POOL = int(os.getenv("RECOMMENDER_HYBRID_POOL", "3"))
+
+MODES = ("content", "collaborative", "hybrid")
+
+# Files of a saved CollaborativeIndex
+VECTORS_FILE = "vectors.npy"
+KNOWN_FILE = "known.npy"
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+
+
+class CollaborativeModel:
+    """
+    Trained item factors, keyed by `(source, id)` so they can be re-aligned
+    to any snapshot that still has those movies.
+    """
+
+    def __init__(self, keys, item_factors, users=0, events=0):
+        self.keys = keys  # DataFrame with source / movie_id columns, one row per factor row
+        self.item_factors = item_factors
+        self.users = users
+        self.events = events
+
+
+class CollaborativeIndex:
+    """
+    Item factors laid out in a snapshot's row positions, with their own search index.
+    Rows without factors (no events yet, or added after alignment) are never returned.
+    """
+
+    def __init__(self, vectors, known, faiss_index, lineage):
+        self.vectors = vectors
+        self.known = known
+        self.faiss_index = faiss_index
+        self.lineage = lineage
+
+    def padded(self, n_rows):
+        """
+        The same index for a snapshot extended to `n_rows` rows; the new rows have no factors.
+        """
+        known = np.zeros(n_rows, dtype=bool)
+        known[:len(self.known)] = self.known[:n_rows]
+        return CollaborativeIndex(self.vectors, known, self.faiss_index, self.lineage)
+
+    def has(self, rows):
+        return self.known[np.asarray(rows, dtype=np.intp)]
+
+    def row_vectors(self, rows):
+        """
+        Factor vectors for catalog rows, zero for rows without factors.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        vectors = np.zeros((len(rows), self.vectors.shape[1]), dtype=np.float32)
+        found = self.known[rows]
+        vectors[found] = self.vectors[rows[found]]
+        return vectors
+
+    def search(self, queries, k, allowed=None):
+        """
+        Top-k rows with factors by inner product, restricted to the `allowed` row mask.
+        """
+        allowed = self.known if allowed is None else allowed & self.known
+        return vector_index.search(self.faiss_index, self.vectors, queries, k, allowed=allowed)
+
+
+def save_index(cf_index, path, version=0):
+    """
+    Write an aligned index to `path` for `load_index` to memory-map.
+    """
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, VECTORS_FILE), cf_index.vectors)
+    np.save(os.path.join(path, KNOWN_FILE), cf_index.known)
+    faiss.write_index(cf_index.faiss_index, os.path.join(path, INDEX_FILE))
+    with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"lineage": cf_index.lineage, "version": version}, f)
+
+
+def load_index(path):
+    """
+    `(CollaborativeIndex, version)` saved by `save_index`, arrays and FAISS index memory-mapped.
+    """
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    cf_index = CollaborativeIndex(
+        np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r"),
+        np.load(os.path.join(path, KNOWN_FILE), mmap_mode="r"),
+        faiss.read_index(os.path.join(path, INDEX_FILE), mmap_flag | faiss.IO_FLAG_READ_ONLY),
+        meta["lineage"],
+    )
+    return cf_index, meta["version"]
+
+
+def interaction_matrix(events, item_rows, n_items):
+    """
+    CSR users x items matrix of summed event weights. `item_rows` gives each event's
+    item row (-1 to drop it). Returns `(matrix, user_ids)`.
+    """
+    keep = item_rows >= 0
+    user_codes, user_ids = pd.factorize(events["user_id"].to_numpy()[keep])
+    weights = events["weight"].to_numpy(dtype=np.float32)[keep]
+    # Duplicate (user, item) events are summed by the COO -> CSR conversion
+    matrix = sparse.csr_matrix((weights, (user_codes, item_rows[keep])),
+                               shape=(len(user_ids), n_items), dtype=np.float32)
+    matrix.sum_duplicates()
+    return matrix, user_ids
+
+
+def train_als(matrix, factors=FACTORS, iterations=ITERATIONS, regularization=REGULARIZATION, alpha=ALPHA,
+              cg_steps=CG_STEPS, block_events=BLOCK_EVENTS, seed=0):
+    """
+    Implicit-feedback ALS (Hu, Koren & Volinsky) on a users x items weight matrix.
+    Returns `(user_factors, item_factors)` as float32 arrays.
+
+    Each half-sweep solves every row's regularized least squares with a few
+    conjugate-gradient steps, run for a whole block of rows at once as dense
+    array and sparse-matrix products; nothing loops in Python per user or item.
+    """
+    confidence = sparse.csr_matrix(matrix, dtype=np.float32) * np.float32(alpha)  # c_ui - 1
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((matrix.shape[0], factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+
+    for _ in range(iterations):
+        _least_squares(confidence, user_factors, item_factors, regularization, cg_steps, block_events)
+        _least_squares(confidence_t, item_factors, user_factors, regularization, cg_steps, block_events)
+    return user_factors, item_factors
+
+
+def _least_squares(confidence, X, Y, regularization, cg_steps, block_events):
+    """
+    Update X in place: row u minimizes sum_i c_ui (p_ui - x_u.y_i)^2 + reg |x_u|^2,
+    warm-started from its current value.
+    """
+    YtY = Y.T @ Y + regularization * np.eye(Y.shape[1], dtype=np.float32)
+    indptr = confidence.indptr
+    bounds = np.unique(np.append(np.searchsorted(indptr, np.arange(0, indptr[-1], block_events)), len(indptr) - 1))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block = confidence[start:end]
+        if block.nnz == 0:
+            continue
+        owners = np.repeat(np.arange(end - start), np.diff(block.indptr))
+        Y_events = Y[block.indices]
+
+        def product(P):
+            # (YtY + Y^T (C_u - I) Y) p_u for every row of the block at once
+            s = np.einsum("ij,ij->i", Y_events, P[owners]) * block.data
+            return P @ YtY + sparse.csr_matrix((s, block.indices, block.indptr), shape=block.shape) @ Y
+
+        x = X[start:end]
+        # Right-hand side Y^T C_u p_u, with p_ui = 1 wherever there was an event
+        rhs = sparse.csr_matrix((block.data + 1, block.indices, block.indptr), shape=block.shape) @ Y
+        r = rhs - product(x)
+        p = r.copy()
+        rs = np.einsum("ij,ij->i", r, r)
+        for _ in range(cg_steps):
+            Ap = product(p)
+            pAp = np.einsum("ij,ij->i", p, Ap)
+            step = np.divide(rs, pAp, out=np.zeros_like(rs), where=pAp > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * Ap
+            rs_next = np.einsum("ij,ij->i", r, r)
+            p = r + np.divide(rs_next, rs, out=np.zeros_like(rs), where=rs > 0)[:, None] * p
+            rs = rs_next
+        X[start:end] = x
+
+
+def snapshot_keys(snapshot):
+    """
+    `(source, movie_id) -> row` for a snapshot's live rows as a DataFrame, including the
+    keys of duplicates merged into a row, so events on either copy land on the same row.
+    """
+    df = snapshot.combined_df
+    rows = np.arange(len(df)) if snapshot.live_mask is None else np.flatnonzero(snapshot.live_mask)
+    keys = pd.DataFrame({"source": df["source"].astype(str).to_numpy()[rows],
+                         "movie_id": df["id"].to_numpy(dtype=np.int64)[rows], "row": rows})
+
+    provenance = df[catalog.PROVENANCE_COLUMN].astype(str).to_numpy()[rows]
+    aliases = [(source, movie_id, row) for row, merged_from in zip(rows[provenance != ""], provenance[provenance != ""])
+               for source, movie_id in dedup.parse_provenance(merged_from)]
+    if aliases:
+        keys = pd.concat([keys, pd.DataFrame(aliases, columns=["source", "movie_id", "row"])], ignore_index=True)
+    return keys.drop_duplicates(["source", "movie_id"])
+
+
+def _rows_for(keys, lookup):
+    """
+    Snapshot row for each `(source, movie_id)` in `keys`, -1 where the movie is gone.
+    """
+    found = keys[["source", "movie_id"]].merge(lookup, on=["source", "movie_id"], how="left")
+    return found["row"].fillna(-1).to_numpy(dtype=np.intp)
+
+
+def train(events, snapshot, **params):
+    """
+    Fit item factors from interaction `events` (user_id, source, movie_id, weight)
+    against the movies of `snapshot`. Returns a CollaborativeModel, or None without events.
+    """
+    lookup = snapshot_keys(snapshot)
+    item_rows = _rows_for(events, lookup)
+    matrix, user_ids = interaction_matrix(events, item_rows, len(snapshot.combined_df))
+    if matrix.nnz == 0:
+        return None
+
+    with stage("cf.train"):
+        _, item_factors = train_als(matrix, **params)
+
+    # Keep the factors of items that had events, under their canonical key
+    items = np.flatnonzero(np.diff(matrix.tocsc().indptr))
+    df = snapshot.combined_df
+    keys = pd.DataFrame({"source": df["source"].astype(str).to_numpy()[items],
+                         "movie_id": df["id"].to_numpy(dtype=np.int64)[items]})
+    logger.info("👥 Trained collaborative model", extra={"users": len(user_ids), "items": len(items),
+                                                        "events": int(matrix.nnz)})
+    return CollaborativeModel(keys, item_factors[items], users=len(user_ids), events=int(matrix.nnz))
+
+
+def align(model, snapshot, index_kind=None):
+    """
+    Lay the model's item factors out in `snapshot` row order (L2-normalized, so inner
+    product is cosine) and index them with the same FAISS machinery as the content vectors.
+    """
+    with stage("cf.align"):
+        n_rows = len(snapshot.combined_df)
+        rows = _rows_for(model.keys, snapshot_keys(snapshot))
+        found = rows >= 0
+
+        vectors = np.zeros((n_rows, model.item_factors.shape[1]), dtype=np.float32)
+        vectors[rows[found]] = model.item_factors[found]
+        faiss.normalize_L2(vectors)
+        known = np.zeros(n_rows, dtype=bool)
+        known[rows[found]] = True
+        known &= np.linalg.norm(vectors, axis=1) > 0
+
+        faiss_index = vector_index.build_faiss_index(vectors, index_kind)
+    return CollaborativeIndex(vectors, known, faiss_index, snapshot.lineage)
+
+
+class CollaborativeEngine:
+    """
+    Owns the trained model and its index aligned to the content engine's current snapshot.
+
+    Training runs off the request path; every published snapshot is re-aligned by a
+    reload listener, cheaply (same index, padded mask) when it only extends the aligned one.
+    """
+
+    def __init__(self):
+        self._loader = None
+        self._content = None
+        self._model = None
+        self._index = None
+        self._version = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def version(self):
+        """
+        Number of models published so far; part of the response cache key for collaborative results.
+        """
+        return self._version
+
+    @property
+    def training(self):
+        return self._train_lock.locked()
+
+    def add_listener(self, listener):
+        """
+        Call `listener()` after every newly trained model is published.
+        """
+        self._listeners.append(listener)
+
+    def install(self, cf_index, version):
+        """
+        Use an index aligned elsewhere (the shared-serving parent process).
+        """
+        with self._lock:
+            self._index = cf_index
+            self._version = version
+
+    def start(self, loader, content_engine):
+        """
+        Register `loader` (returns the events DataFrame), follow `content_engine`'s
+        snapshots and train the first model in the background.
+        """
+        self._loader = loader
+        self._content = content_engine
+        content_engine.add_reload_listener(self._on_snapshot)
+        self.train_in_background()
+
+    def index_for(self, snapshot):
+        """
+        The collaborative index for `snapshot`, or None if there is no model for it yet.
+        """
+        index = self._index
+        if index is None or snapshot is None or index.lineage != snapshot.lineage:
+            return None
+        if len(index.known) != len(snapshot.combined_df):
+            return index.padded(len(snapshot.combined_df))
+        return index
+
+    def train(self):
+        """
+        Load the events, fit a new model against the current snapshot and publish it.
+        """
+        if self._loader is None:
+            raise RuntimeError("CollaborativeEngine.start() has not been called")
+
+        with self._train_lock:
+            snapshot = self._content.snapshot
+            if snapshot is None:
+                return None
+            with stage("cf.load_events"):
+                events = self._loader()
+            model = train(events, snapshot)
+            with self._lock:
+                self._model = model
+                self._index = None if model is None else align(model, self._content.snapshot)
+                self._version += 1
+        for listener in self._listeners:
+            listener()
+        return model
+
+    def train_in_background(self):
+        """
+        Start `train()` on a daemon thread. Returns False if one is already running.
+        """
+        if self.training:
+            return False
+
+        def run():
+            try:
+                self.train()
+            except Exception as e:
+                logger.exception(f"❌ Collaborative training failed: {e}")
+
+        threading.Thread(target=run, name="collaborative-train", daemon=True).start()
+        return True
+
+    def _on_snapshot(self, snapshot):
+        with self._lock:
+            if self._model is None:
+                return
+            index = self._index
+            if index is not None and index.lineage == snapshot.lineage:
+                self._index = index.padded(len(snapshot.combined_df))
+            else:
+                self._index = align(self._model, snapshot)
+
+
+# 👥 Process-wide engine, started from the FastAPI lifespan hook after the content engine
+collaborative_engine = CollaborativeEngine()
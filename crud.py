@@ -1,7 +1,22 @@
+from sqlalchemy import Row, or_, select, tuple_, union_all
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import Type, List
-from models import IMDbMovie, KaggleMovie
+from typing import Type, List, Tuple, Optional
+import base64
+import json
+import pandas as pd
+from catalog import movie_columns, read_movies
+from metrics import stage
+from models import CatalogVersion, IMDbMovie, KaggleMovie, MovieRating
+
+# 🏷️ Source name each table's rows are tagged with in responses
+MODEL_SOURCES = {IMDbMovie: "imdb", KaggleMovie: "kaggle"}
+
+# 📦 Page sizes for API reads; the cap holds no matter what the caller asks for
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 📤 Rows fetched per server-side cursor round trip in full exports
+EXPORT_CHUNK_ROWS = 5000
 
 
 def get_imdb_movies(
@@ -9,9 +24,10 @@ def get_imdb_movies(
     search: str = "",
     sort_by: str = "title",
     skip: int = 0,
-    limit: int = 50000
-) -> List[IMDbMovie]:
-    return _get_movies(db, IMDbMovie, search, sort_by, skip, limit)
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> List[Row]:
+    return _get_movies(db, IMDbMovie, search, sort_by, skip, limit, cursor)
 
 
 def get_kaggle_movies(
@@ -19,9 +35,199 @@ def get_kaggle_movies(
     search: str = "",
     sort_by: str = "title",
     skip: int = 0,
-    limit: int = 50000
-) -> List[KaggleMovie]:
-    return _get_movies(db, KaggleMovie, search, sort_by, skip, limit)
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> List[Row]:
+    return _get_movies(db, KaggleMovie, search, sort_by, skip, limit, cursor)
+
+
+def get_catalog(db: Session) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Both tables as compact columnar frames (see catalog.py), read with Core selects
+    instead of ORM objects; what the recommender index is built from.
+    """
+    with stage("db.load_catalog"):
+        return read_movies(db, IMDbMovie), read_movies(db, KaggleMovie)
+
+
+def get_movies_since(
+    db: Session,
+    high_water_marks: dict,
+    keys: List[Tuple[str, int]] = ()
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Rows added after each table's high-water mark (`{"imdb": max_id, "kaggle": max_id}`),
+    plus the explicitly listed `(source, id)` keys, as catalog frames for incremental index updates.
+    """
+    results = []
+    for source, model in (("imdb", IMDbMovie), ("kaggle", KaggleMovie)):
+        condition = model.id > int(high_water_marks.get(source, 0))
+        ids = [int(movie_id) for key_source, movie_id in keys if key_source == source]
+        if ids:
+            condition = or_(condition, model.id.in_(ids))
+        with stage("db.load_delta"):
+            results.append(read_movies(db, model, condition))
+    return results[0], results[1]
+
+
+def get_catalog_version(db: Session) -> int:
+    """
+    Current catalog version; every bulk load into either movie table bumps it (see models.CatalogVersion).
+    """
+    return db.execute(_catalog_version_statement()).scalar() or 0
+
+
+def get_interactions(db: Session, min_rating: float, chunk_rows: int = 500000) -> pd.DataFrame:
+    """
+    Rating/interaction events for collaborative training, as a `user_id, source, movie_id,
+    weight` DataFrame. Each event weighs 1; explicit ratings below `min_rating` are left out.
+    """
+    statement = (
+        select(MovieRating.user_id, MovieRating.source, MovieRating.movie_id)
+        .where(or_(MovieRating.rating.is_(None), MovieRating.rating >= min_rating))
+        .execution_options(yield_per=chunk_rows)
+    )
+    columns = ["user_id", "source", "movie_id"]
+    with stage("db.load_interactions"):
+        chunks = [pd.DataFrame.from_records(rows, columns=columns)
+                  for rows in db.execute(statement).partitions()]
+    events = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    return events.astype({"user_id": "int64", "source": "str", "movie_id": "int64"}).assign(weight=1.0)
+
+
+def search_movies(
+    db: Session,
+    search: str = "",
+    sort_by: str = "title",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    One page of IMDb matches followed by Kaggle matches, plus the cursor for the next page
+    (None once both tables are exhausted).
+    """
+    limit = _page_size(limit)
+    movies = []
+    last_source = None
+    for source, model, table_cursor in _search_sources(cursor):
+        page = _get_movies(db, model, search, sort_by, 0, limit - len(movies), table_cursor)
+        if page:
+            movies += page
+            last_source = source
+        if len(movies) >= limit:
+            break
+
+    return movies, _next_search_cursor(movies, limit, sort_by, last_source)
+
+
+def stream_movies(
+    db: Session,
+    search: str = "",
+    sort_by: str = "title",
+    chunk_rows: int = EXPORT_CHUNK_ROWS
+):
+    """
+    Every matching row of both tables (IMDb first, each in `sort_by` order), yielded in
+    lists of up to `chunk_rows`. Rows come through a server-side cursor (`yield_per`),
+    so memory stays flat however large the tables are.
+    """
+    for model in MODEL_SOURCES:
+        statement = _movies_statement(model, search, sort_by, 0, None, None)
+        result = db.execute(statement.execution_options(yield_per=chunk_rows))
+        for rows in result.partitions():
+            yield rows
+
+
+# ⚡ Async /search for AsyncSession (DB_ASYNC=1); same queries, no thread held while waiting
+async def search_movies_async(
+    db,
+    search: str = "",
+    sort_by: str = "title",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Tuple[list, Optional[str]]:
+    limit = _page_size(limit)
+    movies = []
+    last_source = None
+    for source, model, table_cursor in _search_sources(cursor):
+        page = await _get_movies_async(db, model, search, sort_by, 0, limit - len(movies), table_cursor)
+        if page:
+            movies += page
+            last_source = source
+        if len(movies) >= limit:
+            break
+
+    return movies, _next_search_cursor(movies, limit, sort_by, last_source)
+
+
+async def get_catalog_version_async(db) -> int:
+    return (await db.execute(_catalog_version_statement())).scalar() or 0
+
+
+def _search_sources(cursor: Optional[str]):
+    """
+    `(source, model, cursor)` for each table a search page still has to read, in order.
+    """
+    sources = [(source, model) for model, source in MODEL_SOURCES.items()]
+    if not cursor:
+        return [(source, model, None) for source, model in sources]
+
+    position = decode_cursor(cursor)
+    names = [name for name, _ in sources]
+    if position.get("source") not in names:
+        raise ValueError("Invalid cursor")
+    start = names.index(position["source"])
+    return [(source, model, cursor if i == start else None) for i, (source, model) in enumerate(sources) if i >= start]
+
+
+def _next_search_cursor(movies, limit, sort_by, last_source):
+    if len(movies) < limit:
+        return None
+    return encode_cursor(sort_by, movies[-1], last_source)
+
+
+def encode_cursor(sort_by: str, movie, source: Optional[str] = None) -> str:
+    """
+    Opaque keyset cursor pointing just after `movie` in `sort_by` order.
+    """
+    sort_by = _sort_field_name(sort_by)
+    payload = {"sort": sort_by, "value": getattr(movie, sort_by), "id": movie.id, "source": source}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Payload of a cursor from `encode_cursor`; ValueError if it was tampered with or truncated.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        payload["id"] = int(payload["id"])
+        if payload["sort"] not in SORT_FIELDS:
+            raise ValueError
+        value = payload["value"]
+        # The value is bound against the sort column, so it must have that column's type
+        if value is not None and (isinstance(value, bool) or not isinstance(value, SORT_VALUE_TYPES[payload["sort"]])):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+# 🧠 Supported sort fields
+SORT_FIELDS = ["title", "year", "rating", "genres", "director", "stars", "description"]
+
+# JSON types a cursor value may have for each sort field
+SORT_VALUE_TYPES = {field: (str,) for field in SORT_FIELDS}
+SORT_VALUE_TYPES.update(year=(int,), rating=(int, float))
+
+
+def _sort_field_name(sort_by: str) -> str:
+    return sort_by if sort_by in SORT_FIELDS else "title"
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
 
 
 # 🔧 Shared logic for both IMDb and Kaggle tables
@@ -31,39 +237,69 @@ def _get_movies(
     search: str,
     sort_by: str,
     skip: int,
-    limit: int
+    limit: int,
+    cursor: Optional[str] = None
 ):
-    query = db.query(model)
+    statement = _movies_statement(model, search, sort_by, skip, limit, cursor)
+    with stage("db.query"):
+        return db.execute(statement).all()
+
+
+async def _get_movies_async(db, model: Type, search: str, sort_by: str, skip: int, limit: int,
+                            cursor: Optional[str] = None):
+    statement = _movies_statement(model, search, sort_by, skip, limit, cursor)
+    with stage("db.query"):
+        return (await db.execute(statement)).all()
+
+
+def _movies_statement(model: Type, search: str, sort_by: str, skip: int, limit: Optional[int],
+                      cursor: Optional[str]):
+    # Plain column rows, same as the catalog; no ORM objects to build per result
+    statement = movie_columns(model, MODEL_SOURCES.get(model))
 
-    # 🔍 Filter by search
+    # 🔍 Filter by search (served by the pg_trgm GIN index on title)
     if search:
-        query = query.filter(model.title.ilike(f"%{search}%"))
-
-    # 🧠 Supported sort fields
-    sort_fields = {
-        "title": model.title,
-        "year": model.year,
-        "rating": model.rating,
-        "genres": model.genres,
-        "director": model.director,
-        "stars": model.stars,
-        "description": model.description,
-    }
-    sort_column = sort_fields.get(sort_by, model.title)
-    query = query.order_by(sort_column)
-
-    # 📦 Pagination
-    movies = query.offset(skip).limit(limit).all()
-
-    # ⏱️ Format duration
-    for movie in movies:
-        if hasattr(movie, "duration"):
-            if isinstance(movie.duration, timedelta):
-                total_minutes = int(movie.duration.total_seconds() // 60)
-                hours = total_minutes // 60
-                minutes = total_minutes % 60
-                movie.duration = f"{hours}h {minutes}m"
-            elif isinstance(movie.duration, str):
-                movie.duration = movie.duration.strip()
-
-    return movies
+        statement = statement.where(model.title.ilike(f"%{_escape_like(search)}%", escape="\\"))
+
+    # Order by (sort column, id) so every row has a unique, stable position
+    sort_by = _sort_field_name(sort_by)
+    sort_column = getattr(model, sort_by)
+    order = (sort_column.asc().nulls_last(), model.id)
+
+    # ⏭️ Keyset pagination: continue strictly after the cursor row
+    if cursor:
+        position = decode_cursor(cursor)
+        if position["sort"] != sort_by:
+            raise ValueError("Cursor was issued for a different sort order")
+        value, last_id = position["value"], int(position["id"])
+        if value is None:
+            # NULL phase: the cursor row is already in the NULL tail, which runs in id order
+            statement = statement.where(sort_column.is_(None), model.id > last_id).order_by(model.id)
+        else:
+            # Non-NULL phase: a row-value range the (column, id) B-tree answers directly,
+            # followed by the NULL tail; each branch reads at most what this page needs
+            after = statement.where(tuple_(sort_column, model.id) > tuple_(value, last_id)).order_by(*order)
+            tail = statement.where(sort_column.is_(None)).order_by(model.id)
+            if limit is not None:
+                after = after.limit(skip + _page_size(limit))
+                tail = tail.limit(skip + _page_size(limit))
+            pages = union_all(select(after.subquery()), select(tail.subquery())).subquery()
+            statement = select(*pages.c).order_by(pages.c[sort_by].asc().nulls_last(), pages.c.id)
+    else:
+        statement = statement.order_by(*order)
+
+    # 📦 Pagination (none for full exports)
+    if limit is None:
+        return statement
+    return statement.offset(skip).limit(_page_size(limit))
+
+
+def _catalog_version_statement():
+    return select(CatalogVersion.version).where(CatalogVersion.id == 1)
+
+
+def _escape_like(value: str) -> str:
+    """
+    Make LIKE wildcards in user input match literally.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
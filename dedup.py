@@ -0,0 +1,172 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import catalog
+import vectorization
+from index_artifact import row_keys
+
+logger = logging.getLogger(__name__)
+
+# 🧬 Same film in both datasets: rows sharing a normalized title and year are merged
+# when their TF-IDF vectors are at least this similar (RECOMMENDER_DEDUP=0 turns it off)
+DEDUP_ENABLED = os.getenv("RECOMMENDER_DEDUP", "1") == "1"
+MIN_SIMILARITY = float(os.getenv("RECOMMENDER_DEDUP_SIMILARITY", "0.5"))
+
+
+def normalize_titles(titles):
+    """
+    Blocking keys for titles: lowercase alphanumerics only, without a leading or
+    trailing article, so "The Matrix", "Matrix, The" and "the matrix!" all match.
+    """
+    words = titles.astype(str).str.lower().str.replace(r"[^0-9a-z]+", " ", regex=True).str.strip()
+    words = words.str.replace(r"^(the|a|an) | (the|a|an)$", "", regex=True)
+    return words.str.replace(" ", "", regex=False)
+
+
+def find_duplicates(combined_df, tfidf_matrix, min_similarity=MIN_SIMILARITY):
+    """
+    Groups of row positions describing the same film, canonical row first.
+
+    Rows are blocked on normalized title + year; within a block, each row is
+    compared with the block's first row (IMDb rows come first) and joins its
+    group when their L2-normalized TF-IDF rows have cosine >= `min_similarity`.
+    """
+    keys = pd.DataFrame({"title": normalize_titles(combined_df["title"]).to_numpy(),
+                         "year": combined_df["year"].array})
+    keys = keys[keys["title"] != ""]
+    keys = keys[keys.duplicated(["title", "year"], keep=False)]
+    if keys.empty:
+        return []
+
+    positions = keys.index.to_numpy()
+    anchors = pd.Series(positions, index=keys.index).groupby(
+        [keys["title"], keys["year"]], dropna=False, sort=False).transform("first").to_numpy()
+    others = positions != anchors
+    rows, anchors = positions[others], anchors[others]
+
+    # Row-wise dot products of the candidate pairs, in one sparse operation
+    similarity = np.asarray(tfidf_matrix[rows].multiply(tfidf_matrix[anchors]).sum(axis=1)).ravel()
+    matched = similarity >= min_similarity
+
+    groups = {}
+    for row, anchor in zip(rows[matched].tolist(), anchors[matched].tolist()):
+        groups.setdefault(anchor, [anchor]).append(row)
+    return list(groups.values())
+
+
+def merge_groups(combined_df, groups):
+    """
+    Collapse each group into its canonical row. Returns `(merged_df, kept_rows, merged_rows)`:
+    the catalog without the duplicate rows, the original positions of its rows, and the
+    positions (in `merged_df`) of the canonical rows whose fields changed.
+
+    Ratings are averaged, genres and stars unioned, and missing year, director or
+    description filled from the duplicates; the duplicates' `source:id` are recorded
+    in the provenance column and their titles in the alias column.
+    """
+    if not groups:
+        return combined_df, np.arange(len(combined_df)), np.array([], dtype=np.intp)
+
+    view = catalog.MovieCatalog(combined_df, catalog.CATALOG_COLUMNS + ["source"] + catalog.MERGE_COLUMNS)
+    canonical = np.array([group[0] for group in groups], dtype=np.intp)
+    drop = np.zeros(len(combined_df), dtype=bool)
+    drop[np.concatenate([group[1:] for group in groups])] = True
+    records = [_merge_records(view.records(group)) for group in groups]
+
+    kept_rows = np.flatnonzero(~drop)
+    unchanged = np.setdiff1d(kept_rows, canonical)
+    merged = catalog.compact_frame(pd.DataFrame.from_records(records, columns=list(records[0])))
+    combined = catalog.concat_frames([combined_df.iloc[unchanged], merged])
+
+    # Back to catalog order: the canonical rows sit where they were
+    order = np.argsort(np.concatenate([unchanged, canonical]), kind="stable")
+    merged_df = combined.iloc[order].reset_index(drop=True)
+    return merged_df, kept_rows, np.searchsorted(kept_rows, np.sort(canonical))
+
+
+def deduplicate(combined_df, vectorizer, tfidf_matrix, min_similarity=MIN_SIMILARITY):
+    """
+    Merge cross-dataset duplicates out of a freshly fitted catalog. Returns the merged
+    catalog and its TF-IDF rows; merged rows are re-vectorized from their combined fields.
+    """
+    groups = find_duplicates(combined_df, tfidf_matrix, min_similarity)
+    merged_df, kept_rows, merged_rows = merge_groups(combined_df, groups)
+    if not groups:
+        return merged_df, tfidf_matrix
+
+    tfidf_matrix = sparse.csr_matrix(tfidf_matrix)[kept_rows]
+    replacement = vectorization.transform_weighted(vectorizer, merged_df.iloc[merged_rows])
+
+    # Swap in the re-vectorized rows: zero the old ones, scatter the new ones into place
+    keep = np.ones(len(kept_rows), dtype=np.float32)
+    keep[merged_rows] = 0
+    scatter = sparse.csr_matrix((np.ones(len(merged_rows), dtype=np.float32),
+                                 (merged_rows, np.arange(len(merged_rows)))),
+                                shape=(len(kept_rows), len(merged_rows)))
+    tfidf_matrix = (sparse.diags(keep) @ tfidf_matrix + scatter @ replacement).tocsr().astype(np.float32)
+
+    logger.info("🧬 Merged duplicate movies", extra={"groups": len(groups),
+                                                     "rows_removed": len(combined_df) - len(merged_df)})
+    return merged_df, tfidf_matrix
+
+
+def apply_provenance(combined_df, keys, provenance):
+    """
+    Redo a saved deduplication: row i of the result is `keys[i]` with the rows listed in
+    `provenance[i]` merged into it, in that order. KeyError if any of them is gone.
+    """
+    positions = {key: i for i, key in enumerate(row_keys(combined_df))}
+    groups = [[positions[key]] + [positions[alias] for alias in parse_provenance(merged_from)]
+              for key, merged_from in zip(keys, provenance) if merged_from]
+    return merge_groups(combined_df, groups)[0]
+
+
+def format_provenance(records):
+    return ",".join(f"{record['source']}:{record['id']}" for record in records)
+
+
+def parse_provenance(merged_from):
+    """
+    `(source, id)` keys from a provenance string such as "kaggle:12,imdb:40".
+    """
+    keys = []
+    for entry in (merged_from or "").split(","):
+        if entry:
+            source, movie_id = entry.split(":")
+            keys.append((source, int(movie_id)))
+    return keys
+
+
+def _merge_records(records):
+    """
+    One catalog record for a group of duplicate records, canonical first.
+    """
+    merged = dict(records[0])
+    duplicates = records[1:]
+    for field in ("year", "director", "description"):
+        if merged[field] in (None, ""):
+            merged[field] = next((r[field] for r in duplicates if r[field] not in (None, "")), merged[field])
+
+    ratings = [r["rating"] for r in records if r["rating"] is not None]
+    merged["rating"] = round(sum(ratings) / len(ratings), 1) if ratings else None
+    for field in ("genres", "stars"):
+        names = (name.strip() for r in records for name in (r[field] or "").split(","))
+        merged[field] = ", ".join(dict.fromkeys(name for name in names if name))
+
+    merged[catalog.PROVENANCE_COLUMN] = format_provenance(duplicates)
+
+    # Other titles the group went by, once per normalized form, so title lookups still find them
+    seen = {str(merged["title"] or "").strip().lower()}
+    aliases = []
+    for r in records:
+        for title in [r["title"], *(r.get(catalog.ALIAS_COLUMN) or "").split(catalog.ALIAS_SEPARATOR)]:
+            key = str(title or "").strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                aliases.append(title)
+    merged[catalog.ALIAS_COLUMN] = catalog.ALIAS_SEPARATOR.join(aliases)
+    return merged
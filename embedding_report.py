@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+
+import crud
+from database import SessionLocal
+from recommender import movies_to_df, fit_tfidf, embed_tfidf, build_vector_index
+from vector_index import recall_at_k, nbytes
+
+if __name__ == "__main__":
+    # Compare compact embeddings against exact TF-IDF cosine search, to pick RECOMMENDER_SVD_DIM
+    parser = argparse.ArgumentParser(description="Recall vs brute-force report for recommender embeddings")
+    parser.add_argument("--dims", default="64,128,256,512", help="Comma-separated SVD dimensions to try")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled query movies")
+    args = parser.parse_args()
+
+    # Step 1: Load and vectorize the catalog once
+    db = SessionLocal()
+    try:
+        imdb_movies, kaggle_movies = crud.get_catalog(db)
+    finally:
+        db.close()
+
+    combined_df = movies_to_df(imdb_movies, kaggle_movies)
+    vectorizer, tfidf_matrix = fit_tfidf(combined_df)
+    n_rows = tfidf_matrix.shape[0]
+
+    rng = np.random.default_rng(0)
+    query_rows = np.sort(rng.choice(n_rows, size=min(args.queries, n_rows), replace=False))
+
+    # Step 2: Ground truth from exact sparse search (the query itself is excluded from its neighbours)
+    def neighbours(index, queries):
+        _, I = index.search(queries, args.k + 1)
+        return np.array([[i for i in row if i != q][:args.k] for q, row in zip(query_rows, I)])
+
+
+    def report(name, vector_matrix, build_seconds):
+        index = build_vector_index(vector_matrix, "flat")
+        queries = vector_matrix[query_rows]
+        if not hasattr(queries, "tocsr"):
+            queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+        start = time.perf_counter()
+        found = neighbours(index, queries)
+        per_query_ms = (time.perf_counter() - start) * 1000 / len(query_rows)
+
+        recall = recall_at_k(truth, found)
+        print(f"{name:<12} {nbytes(vector_matrix) / 2**20:>10.1f} {build_seconds:>9.2f} {per_query_ms:>10.3f} {recall:>10.3f}")
+
+
+    exact_matrix, _ = embed_tfidf(tfidf_matrix, "sparse")
+    truth = neighbours(build_vector_index(exact_matrix, "flat"), exact_matrix[query_rows])
+
+    print(f"📊 {n_rows} movies, {tfidf_matrix.shape[1]} TF-IDF features, {len(query_rows)} queries, recall@{args.k}")
+    print(f"{'embedding':<12} {'memory MB':>10} {'build s':>9} {'query ms':>10} {'recall':>10}")
+    report("sparse", exact_matrix, 0.0)
+
+    for dim in [int(d) for d in args.dims.split(",") if d.strip()]:
+        start = time.perf_counter()
+        vector_matrix, _ = embed_tfidf(tfidf_matrix, "svd", dim)
+        report(f"svd-{vector_matrix.shape[1]}", vector_matrix, time.perf_counter() - start)
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import catalog
+from neighbour_table import NeighbourTable
+from vector_index import SparseIPIndex
+from vectorization import make_vectorizer
+
+# 📦 On-disk layout of a recommender index artifact
+FORMAT_VERSION = 3
+DEFAULT_ARTIFACT_DIR = "artifacts/recommender"
+
+MANIFEST_FILE = "manifest.json"
+VECTORIZER_FILE = "vectorizer.json"
+IDF_FILE = "idf.npy"
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+ROWS_FILE = "rows.npz"
+PROJECTION_FILE = "projection.npy"
+CSR_DATA_FILE = "csr_data.npy"
+CSR_INDICES_FILE = "csr_indices.npy"
+CSR_INDPTR_FILE = "csr_indptr.npy"
+NEIGHBOUR_IDS_FILE = "neighbour_ids.npy"
+NEIGHBOUR_SCORES_FILE = "neighbour_scores.npy"
+CATALOG_DIR = "catalog"
+LIVE_FILE = "live.npy"
+TITLE_HASHES_FILE = "title_hashes.npy"
+TITLE_ROWS_FILE = "title_rows.npy"
+
+# Columns whose contents decide whether an artifact still matches the tables
+HASH_COLUMNS = ["source", "id", "title", "year", "rating", "genres", "director", "stars", "description"]
+
+
+class StaleArtifactError(Exception):
+    """
+    The artifact on disk was built from different table contents or an older format.
+    """
+
+
+class IndexArtifact:
+    """
+    Loaded artifact: fitted vectorizer, memory-mapped vectors and search index, row keys
+    and, when the build computed one, the precomputed neighbour table.
+    """
+
+    def __init__(self, vectorizer, vector_matrix, faiss_index, row_keys, manifest, projection=None, provenance=None,
+                 neighbours=None, catalog_df=None, live_mask=None, titles=None, rows_path=None):
+        self.vectorizer = vectorizer
+        self.vector_matrix = vector_matrix
+        self.faiss_index = faiss_index
+        self._row_keys = row_keys
+        self.manifest = manifest
+        self.projection = projection
+        # Per row, the duplicates merged into it at build time ("" for most rows)
+        self._provenance = provenance
+        self.neighbours = neighbours
+        # Only in artifacts saved with the catalog (shared serving): everything a snapshot needs
+        self.catalog_df = catalog_df
+        self.live_mask = live_mask
+        self.titles = titles
+        self._rows_path = rows_path
+
+    @property
+    def row_keys(self):
+        """
+        `(source, id)` per index row; from `rows_path`, these are read on first use.
+        """
+        if self._row_keys is None:
+            self._read_rows()
+        return self._row_keys
+
+    @property
+    def provenance(self):
+        if self._provenance is None:
+            if self._row_keys is None:
+                self._read_rows()
+            else:
+                self._provenance = [""] * len(self._row_keys)
+        return self._provenance
+
+    def _read_rows(self):
+        rows = np.load(self._rows_path)
+        self._row_keys = list(zip(rows["source"].tolist(), rows["id"].tolist()))
+        self._provenance = rows["merged_from"].tolist()
+
+
+def source_hash(combined_df):
+    """
+    Order-independent content hash of the (deduplicated) catalog rows.
+    """
+    rows = combined_df[HASH_COLUMNS].sort_values(["source", "id"]).astype(str)
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    digest.update(pd.util.hash_pandas_object(rows, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def verify_source(artifact, combined_df):
+    """
+    StaleArtifactError unless `combined_df` is the catalog the artifact was built from.
+    """
+    expected_hash = source_hash(combined_df)
+    if artifact.manifest["source_hash"] != expected_hash:
+        raise StaleArtifactError(
+            f"built from source hash {artifact.manifest['source_hash'][:12]}, tables are now {expected_hash[:12]}"
+        )
+
+
+def row_keys(combined_df):
+    """
+    `(source, id)` for every index row, in index order.
+    """
+    return list(zip(combined_df["source"], combined_df["id"].astype(int)))
+
+
+def align_rows(combined_df, keys):
+    """
+    Reorder `combined_df` so row i is the movie stored at position i of the index.
+    """
+    positions = {key: i for i, key in enumerate(row_keys(combined_df))}
+    order = [positions[key] for key in keys]
+    return combined_df.iloc[order].reset_index(drop=True)
+
+
+def save_artifact(path, snapshot, include_catalog=False, previous=None):
+    """
+    Write `snapshot` to `path`, replacing any previous artifact in one rename.
+    With `include_catalog`, also write the catalog columns, live-row mask, title index and
+    generation, so the snapshot can be attached without touching the database.
+
+    `previous` is `(path, snapshot)` of an artifact written earlier. Parts the two snapshots
+    share (same vectorizer, vectors and index, catalog, neighbour table...) are hard-linked
+    from it instead of being written again.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    previous_path, previous_snapshot = previous if previous and os.path.isdir(previous[0]) else (None, None)
+
+    def linked(attributes, *names):
+        """
+        Hard-link `names` from the previous artifact if it holds the same `attributes` objects.
+        False when they have to be written.
+        """
+        if previous_snapshot is None:
+            return False
+        if any(getattr(snapshot, name) is not getattr(previous_snapshot, name) for name in attributes):
+            return False
+        sources = [os.path.join(previous_path, name) for name in names]
+        if not all(os.path.exists(source) for source in sources):
+            return False
+        for source, name in zip(sources, names):
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(tmp_path, name), copy_function=os.link)
+            else:
+                os.link(source, os.path.join(tmp_path, name))
+        return True
+
+    vectorizer = snapshot.vectorizer
+    if not linked(["vectorizer"], VECTORIZER_FILE, IDF_FILE):
+        params = {k: v for k, v in vectorizer.get_params().items()
+                  if k != "vocabulary" and (v is None or isinstance(v, (str, int, float, bool)))}
+        with open(os.path.join(tmp_path, VECTORIZER_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "params": params,
+                "vocabulary": {term: int(i) for term, i in vectorizer.vocabulary_.items()},
+            }, f)
+        np.save(os.path.join(tmp_path, IDF_FILE), vectorizer.idf_.astype(np.float64))
+
+    vector_matrix = snapshot.vector_matrix
+    if sparse.issparse(vector_matrix):
+        # CSR arrays are saved separately so each one can be memory-mapped
+        if not linked(["vector_matrix"], CSR_DATA_FILE, CSR_INDICES_FILE, CSR_INDPTR_FILE):
+            np.save(os.path.join(tmp_path, CSR_DATA_FILE), vector_matrix.data)
+            np.save(os.path.join(tmp_path, CSR_INDICES_FILE), vector_matrix.indices)
+            np.save(os.path.join(tmp_path, CSR_INDPTR_FILE), vector_matrix.indptr)
+    elif not linked(["vector_matrix", "faiss_index"], VECTORS_FILE, INDEX_FILE):
+        np.save(os.path.join(tmp_path, VECTORS_FILE), np.ascontiguousarray(vector_matrix, dtype=np.float32))
+        faiss.write_index(snapshot.faiss_index, os.path.join(tmp_path, INDEX_FILE))
+    if snapshot.projection is not None and not linked(["projection"], PROJECTION_FILE):
+        np.save(os.path.join(tmp_path, PROJECTION_FILE), snapshot.projection)
+    if snapshot.neighbours is not None and not linked(["neighbours"], NEIGHBOUR_IDS_FILE, NEIGHBOUR_SCORES_FILE):
+        np.save(os.path.join(tmp_path, NEIGHBOUR_IDS_FILE), snapshot.neighbours.ids)
+        np.save(os.path.join(tmp_path, NEIGHBOUR_SCORES_FILE), snapshot.neighbours.scores)
+    if include_catalog:
+        if not linked(["combined_df"], CATALOG_DIR):
+            catalog.save_frame(snapshot.combined_df, os.path.join(tmp_path, CATALOG_DIR))
+        if not linked(["titles"], TITLE_HASHES_FILE, TITLE_ROWS_FILE):
+            np.save(os.path.join(tmp_path, TITLE_HASHES_FILE), snapshot.titles.hashes)
+            np.save(os.path.join(tmp_path, TITLE_ROWS_FILE), snapshot.titles.rows)
+        if snapshot.live_mask is not None and not linked(["live_mask"], LIVE_FILE):
+            np.save(os.path.join(tmp_path, LIVE_FILE), snapshot.live_mask)
+
+    if linked(["combined_df"], ROWS_FILE):
+        # Same rows as the previous artifact, so the same (order-independent) content hash
+        hashed = read_manifest(previous_path)["source_hash"]
+    else:
+        keys = row_keys(snapshot.combined_df)
+        np.savez(
+            os.path.join(tmp_path, ROWS_FILE),
+            source=np.array([source for source, _ in keys], dtype=str),
+            id=np.array([movie_id for _, movie_id in keys], dtype=np.int64),
+            merged_from=snapshot.combined_df["merged_from"].astype(str).to_numpy(dtype=str),
+        )
+        hashed = source_hash(snapshot.combined_df)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "source_hash": hashed,
+        "rows": len(snapshot.combined_df),
+        "dim": int(vector_matrix.shape[1]),
+        "embedding": snapshot.embedding,
+        "neighbours_k": snapshot.neighbours.k if snapshot.neighbours is not None else 0,
+        "catalog": include_catalog,
+        "generation": snapshot.generation,
+        "lineage": snapshot.lineage,
+        "drift": snapshot.drift,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # 🔁 Swap directories so readers never see a half-written artifact
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_artifact(path, expected_hash=None):
+    """
+    Load the artifact at `path` read-only. Vectors and index are memory-mapped,
+    so every worker process attaching to the same files shares their pages.
+
+    Raises FileNotFoundError when there is no artifact and StaleArtifactError
+    when `expected_hash` does not match the one it was built from.
+    """
+    manifest = read_manifest(path)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise StaleArtifactError(f"format version {manifest.get('format_version')} != {FORMAT_VERSION}")
+    if expected_hash is not None and manifest["source_hash"] != expected_hash:
+        raise StaleArtifactError(
+            f"built from source hash {manifest['source_hash'][:12]}, tables are now {expected_hash[:12]}"
+        )
+
+    with open(os.path.join(path, VECTORIZER_FILE), encoding="utf-8") as f:
+        saved = json.load(f)
+    vectorizer = make_vectorizer(saved["params"], saved["vocabulary"], np.load(os.path.join(path, IDF_FILE)))
+
+    if manifest["embedding"] == "sparse":
+        vector_matrix = sparse.csr_matrix((
+            np.load(os.path.join(path, CSR_DATA_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, CSR_INDICES_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, CSR_INDPTR_FILE), mmap_mode="r"),
+        ), shape=(manifest["rows"], manifest["dim"]), copy=False)
+        faiss_index = SparseIPIndex(vector_matrix)
+    else:
+        vector_matrix = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        # IO_FLAG_MMAP_IFC maps the whole file zero-copy; older FAISS only has IO_FLAG_MMAP (IVF lists)
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        faiss_index = faiss.read_index(os.path.join(path, INDEX_FILE), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+
+    projection = None
+    if os.path.exists(os.path.join(path, PROJECTION_FILE)):
+        projection = np.load(os.path.join(path, PROJECTION_FILE), mmap_mode="r")
+
+    neighbours = None
+    if manifest.get("neighbours_k"):
+        neighbours = NeighbourTable(np.load(os.path.join(path, NEIGHBOUR_IDS_FILE), mmap_mode="r"),
+                                    np.load(os.path.join(path, NEIGHBOUR_SCORES_FILE), mmap_mode="r"))
+
+    catalog_df = live_mask = titles = None
+    if manifest.get("catalog"):
+        catalog_df = catalog.load_frame(os.path.join(path, CATALOG_DIR))
+        titles = catalog.TitleIndex(np.load(os.path.join(path, TITLE_HASHES_FILE), mmap_mode="r"),
+                                    np.load(os.path.join(path, TITLE_ROWS_FILE), mmap_mode="r"))
+        if os.path.exists(os.path.join(path, LIVE_FILE)):
+            live_mask = np.load(os.path.join(path, LIVE_FILE), mmap_mode="r")
+
+    # Row keys are only read when needed (checking against the tables); attaching skips them
+    return IndexArtifact(vectorizer, vector_matrix, faiss_index, None, manifest, projection,
+                         neighbours=neighbours, catalog_df=catalog_df, live_mask=live_mask, titles=titles,
+                         rows_path=os.path.join(path, ROWS_FILE))
@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+import crud
+from database import SessionLocal
+from recommender import movies_to_df, fit_tfidf, embed_tfidf
+from vector_index import build_faiss_index, search_params, recall_at_k
+
+if __name__ == "__main__":
+    # Compare ANN index kinds against the exact flat index on the real catalog
+    parser = argparse.ArgumentParser(description="Recall and latency of FAISS index kinds vs IndexFlatIP")
+    parser.add_argument("--embedding", default="svd", choices=["svd", "dense"], help="Dense vectors to index")
+    parser.add_argument("--svd-dim", type=int, default=256)
+    parser.add_argument("--kinds", default="ivf,hnsw,ivfpq", help="Comma-separated index kinds")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="nprobe values for IVF kinds")
+    parser.add_argument("--ef-search", default="16,64,128,256", help="efSearch values for HNSW")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Step 1: Load and embed the catalog
+    db = SessionLocal()
+    try:
+        imdb_movies, kaggle_movies = crud.get_catalog(db)
+    finally:
+        db.close()
+
+    combined_df = movies_to_df(imdb_movies, kaggle_movies)
+    _, tfidf_matrix = fit_tfidf(combined_df)
+    vectors, _ = embed_tfidf(tfidf_matrix, args.embedding, args.svd_dim)
+
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = np.ascontiguousarray(vectors[query_rows])
+
+
+    def measure(index, params=None):
+        """
+        One query per search call, as the API issues them. Returns (ids, p50 ms, p99 ms).
+        """
+        found = np.empty((len(queries), args.k), dtype=np.int64)
+        latencies = np.empty(len(queries))
+        for i in range(len(queries)):
+            start = time.perf_counter()
+            _, I = index.search(queries[i:i + 1], args.k, params=params)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            found[i] = I[0]
+        return found, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+    def timed_build(kind):
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, kind)
+        return index, time.perf_counter() - start
+
+
+    # Step 2: Exact baseline
+    faiss.omp_set_num_threads(1)  # per-query latency, not batch throughput
+    flat, flat_build = timed_build("flat")
+    truth, p50, p99 = measure(flat)
+
+    print(f"📊 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'flat':<10} {'-':<14} {flat_build:>8.2f} {1.0:>8.3f} {p50:>8.3f} {p99:>8.3f}")
+
+    # Step 3: Each ANN kind across its search knob
+    for kind in [k.strip() for k in args.kinds.split(",") if k.strip()]:
+        index, build_seconds = timed_build(kind)
+        if kind == "hnsw":
+            sweep = [("efSearch", int(v)) for v in args.ef_search.split(",")]
+        else:
+            sweep = [("nprobe", int(v)) for v in args.nprobe.split(",")]
+
+        for name, value in sweep:
+            params = search_params(index, nprobe=value if name == "nprobe" else None,
+                                   ef_search=value if name == "efSearch" else None)
+            found, p50, p99 = measure(index, params)
+            recall = recall_at_k(truth, found)
+            print(f"{kind:<10} {f'{name}={value}':<14} {build_seconds:>8.2f} {recall:>8.3f} {p50:>8.3f} {p99:>8.3f}")
@@ -1,119 +1,217 @@
-import pandas as pd
+import argparse
 import ast
 import csv
 import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# 📦 Output columns, in order
+OUTPUT_COLUMNS = ['id', 'title', 'genres', 'year', 'rating', 'description', 'director', 'stars']
+MOVIE_COLUMNS = ['id', 'title', 'genres', 'release_date', 'vote_average', 'overview']
+
+# 🔎 The genres/crew/cast columns are Python-literal lists of flat dicts. Pulling the few
+# fields we need out with regexes is far cheaper than ast.literal_eval on the whole cell.
+QUOTED = r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")"""
+NAME_RE = re.compile(r"'name': " + QUOTED)
+DICT_RE = re.compile(r"\{[^{}]*\}")
+DIRECTOR_JOB = "'job': 'Director'"
+
+
+def _literal(quoted):
+    """
+    Value of a quoted Python string literal; only strings with escapes need the real parser.
+    """
+    return ast.literal_eval(quoted) if "\\" in quoted else quoted[1:-1]
+
 
-# ✅ Step 1: Validate CSV Files Existence and Format
-required_files = ['movies.csv', 'credits.csv']
-for file in required_files:
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"❌ Required file '{file}' not found in the current directory.")
-
-# Quick check for file structure
-try:
-    test_movies = pd.read_csv('movies.csv', nrows=5)
-    test_credits = pd.read_csv('credits.csv', nrows=5)
-    print("✅ CSV files detected and format appears valid.")
-except Exception as e:
-    raise ValueError(f"❌ Error reading CSV files: {e}")
-
-# 🛠️ Step 2: Load and Process the Dataset
-movies = pd.read_csv('movies.csv', low_memory=False)
-credits = pd.read_csv('credits.csv')
-
-# Normalize and merge
-movies['id'] = pd.to_numeric(movies['id'], errors='coerce')
-credits['id'] = pd.to_numeric(credits['id'], errors='coerce')
-movies = movies.dropna(subset=['id'])
-credits = credits.dropna(subset=['id'])
-movies['id'] = movies['id'].astype(int)
-credits['id'] = credits['id'].astype(int)
-movies = movies.merge(credits, on='id')
-
-movies = movies.dropna(subset=['title', 'overview', 'genres', 'release_date'])
-movies['year'] = pd.to_datetime(movies['release_date'], errors='coerce').dt.year
-
-# Parse fields
 def parse_genres(x):
-    try:
-        return ", ".join([d['name'] for d in ast.literal_eval(x)])
-    except:
+    if not isinstance(x, str):
         return ""
+    return ", ".join(_literal(name) for name in NAME_RE.findall(x))
+
 
 def parse_crew(x):
-    try:
-        crew = ast.literal_eval(x)
-        directors = [d['name'] for d in crew if d['job'] == 'Director']
-        return ", ".join(directors)
-    except:
+    if not isinstance(x, str):
         return ""
+    directors = []
+    for entry in DICT_RE.finditer(x):
+        if DIRECTOR_JOB in entry.group():
+            name = NAME_RE.search(entry.group())
+            if name:
+                directors.append(_literal(name.group(1)))
+    return ", ".join(directors)
+
 
 def parse_cast(x):
-    try:
-        cast = ast.literal_eval(x)
-        return ", ".join([d['name'] for d in cast[:3]])
-    except:
+    if not isinstance(x, str):
         return ""
-
-movies['genres'] = movies['genres'].apply(parse_genres)
-movies['director'] = movies['crew'].apply(parse_crew)
-movies['stars'] = movies['cast'].apply(parse_cast)
-movies['rating'] = movies['vote_average']
-movies['description'] = movies['overview']
-
-
-
-
-# Filter + Clean
-final_df = movies[['id','title', 'genres', 'year', 'rating', 'description', 'director', 'stars']]
-final_df = final_df.dropna(subset=['title', 'genres', 'rating']).copy()
-final_df = final_df.drop_duplicates(subset='title', keep='first').copy()
-
-columns_to_clean = ['title', 'genres', 'description', 'director', 'stars']
-for col in columns_to_clean:
-    final_df[col] = final_df[col].astype(str) \
-        .str.replace('\n', ' ', regex=True) \
-        .str.replace('\r', ' ', regex=True) \
-        .str.replace('"', "'", regex=True)
-
-# ✅ Step 3: Validate dataset before saving
-print("🔍 Validating final DataFrame structure before saving...")
-bad_rows = final_df[final_df.isnull().any(axis=1)]
-if len(bad_rows) > 0:
-    print(f"❌ Found {len(bad_rows)} rows with null values:")
-    print(bad_rows.head())
-    final_df = final_df.dropna()
-
-print("🧪 Columns in final DataFrame:", final_df.columns.tolist())
-print("🆔 Sample IDs:", final_df['id'].head())
-
-
-# ✅ Step 4: Save CSV initially (preliminary version)
-temp_path = 'combined_movies_temp.csv'
-final_df.to_csv(
-    temp_path,
-    index=False,
-    quoting=csv.QUOTE_ALL,
-    quotechar='"',
-    escapechar='\\',
-    lineterminator='\n'
-)
-
-# ✅ Step 5: Validate and clean malformed rows (expecting exactly 7 columns)
-valid_rows = []
-with open(temp_path, 'r', encoding='utf-8') as infile:
-    reader = csv.reader(infile, quotechar='"', escapechar='\\')
-    headers = next(reader)
-    for row in reader:
-        if len(row) == 7:
-            valid_rows.append(row)
-
-# ✅ Step 6: Save cleaned version
-final_csv_path = 'combined_movies.csv'
-with open(final_csv_path, 'w', newline='', encoding='utf-8') as outfile:
-    writer = csv.writer(outfile, quoting=csv.QUOTE_ALL, quotechar='"', escapechar='\\')
-    writer.writerow(headers)
-    writer.writerows(valid_rows)
-
-# ✅ Final message
-print(f"✅ Cleaned dataset saved as {final_csv_path} with {len(valid_rows)} valid rows.")
\ No newline at end of file
+    names = []
+    for name in NAME_RE.finditer(x):
+        names.append(_literal(name.group(1)))
+        if len(names) == 3:
+            break
+    return ", ".join(names)
+
+
+def parse_credits_chunk(chunk):
+    """
+    Reduce a credits.csv chunk to `(id, director, stars)`, dropping the bulky crew/cast text.
+    """
+    chunk = chunk.assign(id=pd.to_numeric(chunk['id'], errors='coerce')).dropna(subset=['id'])
+    return pd.DataFrame({
+        'id': chunk['id'].astype(int).to_numpy(),
+        'director': chunk['crew'].map(parse_crew).to_numpy(),
+        'stars': chunk['cast'].map(parse_cast).to_numpy(),
+    })
+
+
+def parse_movies_chunk(chunk):
+    """
+    Clean a movies.csv chunk: numeric id, release year and comma-joined genre names.
+    """
+    chunk = chunk.assign(id=pd.to_numeric(chunk['id'], errors='coerce'))
+    chunk = chunk.dropna(subset=['id', 'title', 'overview', 'genres', 'release_date'])
+    return pd.DataFrame({
+        'id': chunk['id'].astype(int).to_numpy(),
+        'title': chunk['title'].to_numpy(),
+        'genres': chunk['genres'].map(parse_genres).to_numpy(),
+        'year': pd.to_datetime(chunk['release_date'], errors='coerce').dt.year.astype('Int64').to_numpy(),
+        'rating': pd.to_numeric(chunk['vote_average'], errors='coerce').to_numpy(),
+        'description': chunk['overview'].to_numpy(),
+    })
+
+
+def bounded_map(executor, fn, chunks, window):
+    """
+    Like `executor.map`, but keeps at most `window` chunks in flight so the
+    reader never runs ahead of the workers and memory stays bounded.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(fn, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def validate_rows(df):
+    """
+    Drop rows that would not load cleanly, in memory: missing fields, and text
+    with line breaks or double quotes that break naive CSV readers.
+    """
+    df = df.dropna(subset=OUTPUT_COLUMNS)
+    df = df[df['title'].astype(str).str.strip() != ''].copy()
+    for col in ['title', 'genres', 'description', 'director', 'stars']:
+        df[col] = df[col].astype(str) \
+            .str.replace('\n', ' ', regex=False) \
+            .str.replace('\r', ' ', regex=False) \
+            .str.replace('"', "'", regex=False)
+    return df
+
+
+class ParquetOutput:
+    """
+    Appends chunks to one Parquet file as row groups; a no-op without pyarrow.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            self._pa = pyarrow
+            self._pq = pyarrow.parquet
+        except ImportError:
+            print("⚠️ Parquet output needs the 'pyarrow' package; writing CSV only.")
+            self._pa = None
+
+    def write(self, df):
+        if self._pa is None:
+            return
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = self._pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def merge(movies_path, credits_path, output, chunksize, workers):
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = 2 * workers
+
+        # 🛠️ Pass 1: stream credits and keep only id -> (director, stars)
+        credits_chunks = pd.read_csv(credits_path, usecols=['id', 'crew', 'cast'], chunksize=chunksize)
+        credits = pd.concat(list(bounded_map(executor, parse_credits_chunk, credits_chunks, window)),
+                            ignore_index=True)
+        credits = credits.drop_duplicates(subset='id', keep='first').set_index('id')
+        print(f"✅ Parsed credits for {len(credits)} movies.")
+
+        # 🛠️ Pass 2: stream movies, join credits, validate and append to the outputs
+        csv_path, parquet_path = f"{output}.csv", f"{output}.parquet"
+        parquet = ParquetOutput(parquet_path)
+        seen_titles = set()
+        total = 0
+        try:
+            movie_chunks = pd.read_csv(movies_path, usecols=MOVIE_COLUMNS, dtype=str, chunksize=chunksize)
+            for chunk in bounded_map(executor, parse_movies_chunk, movie_chunks, window):
+                chunk = chunk.join(credits, on='id', how='inner')[OUTPUT_COLUMNS]
+                chunk = validate_rows(chunk)
+
+                # Same title twice: the first one seen wins, across chunks
+                chunk = chunk.drop_duplicates(subset='title', keep='first')
+                chunk = chunk[~chunk['title'].isin(seen_titles)]
+                seen_titles.update(chunk['title'])
+
+                chunk.to_csv(
+                    csv_path,
+                    mode='w' if total == 0 else 'a',
+                    header=total == 0,
+                    index=False,
+                    quoting=csv.QUOTE_ALL,
+                    quotechar='"',
+                    escapechar='\\',
+                    lineterminator='\n'
+                )
+                parquet.write(chunk)
+                total += len(chunk)
+        finally:
+            parquet.close()
+
+    outputs = csv_path if parquet.writer is None else f"{csv_path} and {parquet_path}"
+    print(f"✅ Cleaned dataset saved as {outputs} with {total} valid rows.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge Kaggle movies.csv and credits.csv into one clean dataset")
+    parser.add_argument("--movies", default="movies.csv")
+    parser.add_argument("--credits", default="credits.csv")
+    parser.add_argument("--output", default="combined_movies", help="Output path without extension (.csv/.parquet)")
+    parser.add_argument("--chunksize", type=int, default=5000, help="Rows parsed per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    # ✅ Step 1: Validate CSV Files Existence and Format
+    for file in [args.movies, args.credits]:
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"❌ Required file '{file}' not found.")
+
+    # Quick check for file structure
+    try:
+        pd.read_csv(args.movies, nrows=5, usecols=MOVIE_COLUMNS)
+        pd.read_csv(args.credits, nrows=5, usecols=['id', 'crew', 'cast'])
+        print("✅ CSV files detected and format appears valid.")
+    except Exception as e:
+        raise ValueError(f"❌ Error reading CSV files: {e}")
+
+    # ✅ Step 2: Stream, parse and save
+    merge(args.movies, args.credits, args.output, args.chunksize, args.workers)
@@ -1,19 +1,96 @@
-from fastapi import FastAPI
+import os
+import time
+from contextlib import asynccontextmanager
+from anyio import to_thread
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
+import collaborative
+import crud
+import metrics
 import models
 import routes
-from database import engine
+import shared_serving
+import vector_index
+from database import engine, SessionLocal, async_engine
+from index_artifact import DEFAULT_ARTIFACT_DIR
+from log_config import configure_logging
+from recommender import recommender_engine
+from response_cache import response_cache
+
+configure_logging()
+
+# Create tables and search indexes
+models.create_tables(engine)
+
+
+def load_movies():
+    db = SessionLocal()
+    try:
+        return crud.get_catalog(db)
+    finally:
+        db.close()
+
+
+def load_new_movies(high_water_marks, keys):
+    db = SessionLocal()
+    try:
+        return crud.get_movies_since(db, high_water_marks, keys)
+    finally:
+        db.close()
+
+
+def load_interactions():
+    db = SessionLocal()
+    try:
+        return crud.get_interactions(db, collaborative.MIN_RATING)
+    finally:
+        db.close()
+
+
+def start_engines():
+    recommender_engine.start(load_movies, artifact_dir=os.getenv("RECOMMENDER_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR),
+                             delta_loader=load_new_movies)
+    # 🔁 Fold newly uploaded movies into the index without a full rebuild
+    recommender_engine.start_polling()
+    # 👥 Collaborative model trains in the background; until then every mode answers from content
+    collaborative.collaborative_engine.start(load_interactions, recommender_engine)
+
+
+# Build the recommender index once and keep it resident for the app's lifetime
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Threads for sync routes; size it to the DB pool so requests don't queue for both
+    to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("API_THREADS", "40"))
+
+    # Cached responses belong to the old generation once the index is rebuilt
+    recommender_engine.add_reload_listener(lambda snapshot: response_cache.invalidate())
+    # Loads are followed by a reload, so re-read the catalog version rather than wait out its TTL
+    recommender_engine.add_reload_listener(lambda snapshot: routes.catalog_version_cache.clear())
+    if shared_serving.SHARED_DIR:
+        # 🧩 Worker under serve.py: the parent builds, this process only maps its generations
+        follower = shared_serving.Follower(shared_serving.SHARED_DIR, recommender_engine,
+                                           collaborative.collaborative_engine)
+        await follower.start()
+        yield
+        follower.stop()
+    else:
+        start_engines()
+        yield
+        recommender_engine.stop_polling()
+
+    if async_engine is not None:
+        await async_engine.dispose()
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Movie Recommendation System",
     description="API for searching, filtering and recommending movies from PostgreSQL",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Serve static files (e.g. JS, CSS, images if needed)
@@ -24,6 +101,52 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 def read_index():
     return "static/index.html"
 
+# ⏱️ Request latency by route template (not raw path, to keep label cardinality bounded)
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                        route=getattr(route, "path", "unmatched"), status=status)
+
+
+def index_samples():
+    snapshot = recommender_engine.snapshot
+    if snapshot is None:
+        return []
+    live_rows = len(snapshot.combined_df) if snapshot.live_mask is None else int(snapshot.live_mask.sum())
+    return [
+        ({"kind": "rows"}, len(snapshot.combined_df)),
+        ({"kind": "live_rows"}, live_rows),
+        ({"kind": "vector_bytes"}, vector_index.nbytes(snapshot.vector_matrix)),
+        ({"kind": "generation"}, snapshot.generation),
+    ]
+
+
+def pool_samples():
+    pool = engine.pool
+    samples = []
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        if hasattr(pool, name):
+            samples.append(({"state": name}, getattr(pool, name)()))
+    return samples
+
+
+metrics.CallbackMetric("movies_index", "Recommender index size and generation.", index_samples)
+metrics.CallbackMetric("movies_index_vocabulary_drift", "Unknown-token share in incrementally added rows.",
+                       lambda: recommender_engine.snapshot.vocabulary_drift if recommender_engine.snapshot else None)
+metrics.CallbackMetric("movies_cache_requests_total", "Response cache lookups by result.",
+                       lambda: [({"result": "hit"}, response_cache.hits), ({"result": "miss"}, response_cache.misses)],
+                       kind="counter")
+metrics.CallbackMetric("movies_cache_entries", "Entries in the response cache.", lambda: response_cache.stats()["entries"])
+metrics.CallbackMetric("movies_db_pool_connections", "Database connection pool usage.", pool_samples)
+
 # CORS config — now optional, but keep it open if needed
 app.add_middleware(
     CORSMiddleware,
@@ -33,5 +156,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 🗜️ Compress responses over COMPRESSION_MIN_BYTES (0 turns it off); brotli when brotli-asgi is installed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+if COMPRESSION_MIN_BYTES > 0:
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_BYTES, gzip_fallback=True)
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
 # Register API routes
 app.include_router(routes.router)
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 📊 Stage timing can be switched off (METRICS_ENABLED=0); request latency and gauges stay
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; wide enough for both a sub-millisecond search and a multi-minute index build
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            try:
+                lines += metric.render()
+            except Exception:
+                logger.exception("Failed to collect metric %s", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    def __init__(self, name, help_text, registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = _header(self.name, self.help_text, "counter")
+        with self._lock:
+            lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = _header(self.name, self.help_text, "histogram")
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge (or counter) whose samples are read from `collect()` at scrape time:
+    either a number or a list of `(labels_dict, value)`.
+    """
+
+    def __init__(self, name, help_text, collect, kind="gauge", registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.kind = kind
+        registry.register(self)
+
+    def render(self):
+        samples = self.collect()
+        if samples is None:
+            return []
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        lines = _header(self.name, self.help_text, self.kind)
+        lines += [f"{self.name}{_format_labels(_label_key(labels))} {_number(value)}" for labels, value in samples]
+        return lines
+
+
+# ⏱️ Shared instruments
+REQUEST_SECONDS = Histogram("movies_http_request_seconds", "HTTP request latency by route and status.")
+STAGE_SECONDS = Histogram("movies_stage_seconds", "Time spent in each instrumented stage.")
+
+
+@contextmanager
+def stage(name):
+    """
+    Time the enclosed block into `movies_stage_seconds{stage=name}`.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("stage finished", extra={"stage": name, "duration_ms": round(seconds * 1000, 3)})
+
+
+def render():
+    return REGISTRY.render()
+
+
+def _header(name, help_text, kind):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
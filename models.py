@@ -1,10 +1,24 @@
 # models.py
-from sqlalchemy import Column, Integer, Float, String, Text
+from sqlalchemy import BigInteger, Column, Integer, Float, String, Text, Index, text
 from database import Base
 
+# Columns the API can sort by; each gets a (column, id) B-tree for keyset pagination.
+# description is left out: long Text values can exceed the B-tree row size limit.
+SORT_INDEX_COLUMNS = ["title", "year", "rating", "genres", "director", "stars"]
+
+
+def _sort_indexes(table_name):
+    return tuple(Index(f"ix_{table_name}_{column}_id", column, "id") for column in SORT_INDEX_COLUMNS)
+
+
 # 🎬 IMDb Movie Table
 class IMDbMovie(Base):
     __tablename__ = "movies"
+    __table_args__ = (
+        # Trigram GIN index so title ILIKE '%...%' doesn't scan the table
+        Index("ix_movies_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        *_sort_indexes("movies"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String)
@@ -18,6 +32,11 @@ class IMDbMovie(Base):
 # 🎬 Kaggle Movie Table
 class KaggleMovie(Base):
     __tablename__ = "movies_combined"
+    __table_args__ = (
+        Index("ix_movies_combined_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}),
+        *_sort_indexes("movies_combined"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String)
@@ -27,3 +46,53 @@ class KaggleMovie(Base):
     description = Column(Text)
     director = Column(String)
     stars = Column(String)
+
+
+# ⭐ User ratings and interaction events, for the collaborative recommender
+class MovieRating(Base):
+    __tablename__ = "movie_ratings"
+    __table_args__ = (
+        Index("ix_movie_ratings_movie", "source", "movie_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    source = Column(String, nullable=False)  # "imdb" (movies) or "kaggle" (movies_combined)
+    movie_id = Column(Integer, nullable=False)
+    rating = Column(Float)  # explicit 0-10 rating; NULL for an implicit event such as a view
+
+
+# 🔖 Counter bumped once by every bulk load into a movie table, so cached /search pages can't outlive it
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+# Tables whose loads bump the catalog version, and the statement that does it (run in the load's transaction)
+CATALOG_TABLES = (IMDbMovie.__tablename__, KaggleMovie.__tablename__)
+BUMP_CATALOG_VERSION = "UPDATE catalog_version SET version = version + 1 WHERE id = 1"
+
+
+def create_tables(bind):
+    """
+    Create missing tables, and indexes that are missing on tables that already existed.
+    """
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+    with bind.begin() as conn:
+        if not conn.execute(text("SELECT 1 FROM catalog_version WHERE id = 1")).first():
+            conn.execute(text("INSERT INTO catalog_version (id, version) VALUES (1, 0)"))
+        if bind.dialect.name == "postgresql":
+            # Earlier versions bumped it from per-statement triggers, which serialized every writer
+            for table in CATALOG_TABLES:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_catalog_version ON {table}"))
+            conn.execute(text("DROP FUNCTION IF EXISTS bump_catalog_version()"))
@@ -0,0 +1,83 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+class MovieFilterIndex:
+    """
+    Genre and rating lookups precomputed over a catalog DataFrame.
+
+    Each genre gets a boolean row mask and ratings are kept as a sorted array,
+    so a filter resolves to a row mask with a few vectorized ops instead of
+    string matching over a DataFrame copy. Rows outside the optional `live`
+    mask (deleted or superseded ones) never match.
+    """
+
+    def __init__(self, combined_df, live=None):
+        self.size = len(combined_df)
+        self.live = live
+
+        # 🎭 One mask per distinct genre token ("Action, Sci-Fi" -> "action", "sci-fi").
+        # Genre strings are split once per distinct value, then mapped to rows by category code.
+        genres = combined_df["genres"]
+        if not isinstance(genres.dtype, pd.CategoricalDtype):
+            genres = genres.fillna("").astype(str).astype("category")
+        codes = genres.cat.codes.to_numpy()
+        tokens = pd.Series(genres.cat.categories.astype(str)).str.lower().str.split(",").explode().str.strip()
+        exploded = pd.DataFrame({"code": tokens.index.to_numpy(), "genre": tokens.to_numpy()})
+        exploded = exploded[exploded["genre"].notna() & (exploded["genre"] != "")]
+        self.genre_masks = {}
+        for genre_name, genre_codes in exploded.groupby("genre")["code"]:
+            self.genre_masks[genre_name] = np.isin(codes, genre_codes.to_numpy())
+
+        # ⭐ Rated rows sorted by rating, so ">= x" is one binary search
+        ratings = pd.to_numeric(combined_df["rating"], errors="coerce").to_numpy(dtype=np.float64)
+        rated_rows = np.flatnonzero(~np.isnan(ratings))
+        order = np.argsort(ratings[rated_rows], kind="stable")
+        self.rating_rows = rated_rows[order]
+        self.rating_values = ratings[self.rating_rows]
+
+        self._genre_mask = lru_cache(maxsize=256)(self._build_genre_mask)
+
+    def _build_genre_mask(self, genre):
+        mask = np.zeros(self.size, dtype=bool)
+        for genre_name, genre_rows in self.genre_masks.items():
+            if genre in genre_name:
+                mask |= genre_rows
+        if self.live is not None:
+            mask &= self.live
+        mask.setflags(write=False)
+        return mask
+
+    def genre_mask(self, genre):
+        """
+        Rows whose genres contain `genre` (case-insensitive substring, like the old `str.contains`).
+        """
+        return self._genre_mask(genre.strip().lower())
+
+    def rating_mask(self, min_rating):
+        """
+        Rows with a known rating >= `min_rating`.
+        """
+        start = np.searchsorted(self.rating_values, float(min_rating), side="left")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.rating_rows[start:]] = True
+        if self.live is not None:
+            mask &= self.live
+        return mask
+
+    def mask(self, genre=None, rating=None):
+        """
+        Combined row mask for the given filters, or None when no filter applies
+        and every row is live. The returned array may be shared; copy it before modifying.
+        """
+        mask = None
+        if genre:
+            mask = self.genre_mask(genre)
+        if rating is not None:
+            rating_rows = self.rating_mask(rating)
+            mask = rating_rows if mask is None else mask & rating_rows
+        if mask is None:
+            return self.live
+        return mask
@@ -0,0 +1,109 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from metrics import Counter, stage
+
+logger = logging.getLogger(__name__)
+
+# 📇 Neighbours stored per movie by the offline job (build_index.py); in-process builds
+# only compute the table with RECOMMENDER_NEIGHBOURS_IN_PROCESS=1
+NEIGHBOURS_K = int(os.getenv("RECOMMENDER_NEIGHBOURS_K", "50"))
+IN_PROCESS = os.getenv("RECOMMENDER_NEIGHBOURS_IN_PROCESS", "0") == "1"
+
+# Query rows per batched search, and threads running batches (FAISS and scipy release the GIL)
+BATCH_ROWS = int(os.getenv("RECOMMENDER_NEIGHBOURS_BATCH_ROWS", "2048"))
+WORKERS = int(os.getenv("RECOMMENDER_NEIGHBOURS_WORKERS", "0")) or os.cpu_count() or 1
+# Scratch memory shared by all batches in flight when scoring exactly (sparse embedding)
+MEMORY_BYTES = int(os.getenv("RECOMMENDER_NEIGHBOURS_MEMORY_MB", "1024")) * 2 ** 20
+# Exact scoring holds, per query row and catalog row: the sparse product (up to 12 bytes),
+# its dense float32 copy, the negated copy top_k partitions and the int64 partition indices
+SCRATCH_BYTES_PER_SCORE = 28
+MIN_BATCH_ROWS = 32
+
+TABLE_LOOKUPS = Counter("movies_neighbour_table_lookups_total",
+                        "Title queries answered from the precomputed neighbour table (hit) or by live search (miss).")
+
+
+class NeighbourTable:
+    """
+    Top-K neighbours of every catalog row as of one full build: `ids` (int32, -1 padded)
+    and `scores` (float16) of shape rows x K, best first, the row itself left out.
+    Plain arrays, so both can be memory-mapped from an index artifact.
+    """
+
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+
+    @property
+    def size(self):
+        return self.ids.shape[0]
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def lookup(self, row, top_n, allowed=None):
+        """
+        `(ids, scores)` of the best `top_n` stored neighbours of `row` within the `allowed`
+        mask, or None when the stored K can't tell (too few survive the filter, or the row
+        is newer than the table).
+        """
+        if row >= self.size:
+            return None
+        ids = np.asarray(self.ids[row])
+        valid = ids >= 0
+        keep = valid.copy()
+        if allowed is not None:
+            keep[valid] = allowed[ids[valid]]
+        # A short (-1 padded) list holds every neighbour there was, so it is complete
+        if keep.sum() < top_n and valid.all():
+            return None
+        positions = np.flatnonzero(keep)[:top_n]
+        return ids[positions].astype(np.intp), np.asarray(self.scores[row])[positions].astype(np.float32)
+
+
+def compute(snapshot, k=NEIGHBOURS_K, batch_rows=BATCH_ROWS, workers=WORKERS, memory_bytes=MEMORY_BYTES):
+    """
+    Neighbour table for every live row of `snapshot`, from batched index searches
+    spread over `workers` threads. Exact (sparse) searches score a dense batch x rows
+    matrix, so batch size and threads are cut until all batches fit in `memory_bytes`.
+    """
+    n = len(snapshot.combined_df)
+    if sparse.issparse(snapshot.vector_matrix):
+        batch_rows, workers = _scratch_limits(n, batch_rows, workers, memory_bytes)
+    ids = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    allowed = snapshot.filters.mask()
+
+    def run(start):
+        rows = np.arange(start, min(start + batch_rows, n))
+        # One extra slot because a movie is its own nearest neighbour
+        D, I = snapshot.search(snapshot.row_vectors(rows), k + 1, allowed=allowed)
+        # Stable sort puts the entries that aren't the row itself first, in rank order
+        order = np.argsort(I == rows[:, None], axis=1, kind="stable")[:, :k]
+        found = np.take_along_axis(I, order, axis=1)
+        ids[rows] = found
+        scores[rows] = np.where(found >= 0, np.take_along_axis(D, order, axis=1), 0)
+
+    with stage("build.neighbours"), ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run, range(0, n, batch_rows)))
+
+    logger.info("📇 Computed neighbour table", extra={"rows": n, "k": k, "batch_rows": batch_rows,
+                                                      "workers": workers})
+    return NeighbourTable(ids, scores)
+
+
+def _scratch_limits(n, batch_rows, workers, memory_bytes):
+    """
+    `(batch_rows, workers)` within the requested ones whose exact-scoring scratch fits in
+    `memory_bytes`: threads go first, so each keeps at least MIN_BATCH_ROWS rows per batch.
+    """
+    row_bytes = max(n, 1) * SCRATCH_BYTES_PER_SCORE
+    workers = max(1, min(workers, memory_bytes // (row_bytes * MIN_BATCH_ROWS)))
+    batch_rows = max(1, min(batch_rows, memory_bytes // (row_bytes * workers)))
+    return batch_rows, workers
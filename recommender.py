@@ -1,128 +1,807 @@
+import logging
+import os
+import threading
+from collections import defaultdict
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
 import faiss
 import numpy as np
+import catalog
+import collaborative
+import dedup
+import index_artifact
+import neighbour_table
+import vector_index
+import vectorization
+from metrics import stage
+from movie_filters import MovieFilterIndex
+from response_cache import TTLCache
+from vector_index import INDEX_KIND, SparseIPIndex, build_faiss_index
+
+logger = logging.getLogger(__name__)
 
 # Global variables
 combined_df = None
 faiss_index = None
 vector_matrix = None
+_loaded_snapshot = None
 
 
-def load_combined_data(imdb_movies, kaggle_movies):
+class RecommenderSnapshot:
+    """
+    One complete index build: DataFrame, fitted vectorizer, vectors and FAISS index.
+    Never mutated after construction, so a request can hold it while a reload runs.
+    """
+
+    def __init__(self, combined_df, vectorizer, vector_matrix, faiss_index, generation=0, projection=None,
+                 live_mask=None, drift=None, lineage=None, query_vectors=None, neighbours=None, titles=None,
+                 index_mapped=False):
+        self.combined_df = combined_df
+        self.vectorizer = vectorizer
+        self.vector_matrix = vector_matrix
+        self.faiss_index = faiss_index
+        # FAISS index memory-mapped read-only from an artifact; extending it needs an in-memory copy
+        self.index_mapped = index_mapped
+        self.generation = generation
+        self.projection = projection
+        # Generation of the full build this one extends; rows keep their positions within a lineage
+        self.lineage = generation if lineage is None else lineage
+        # 🔤 LRU of free-text query vectors; shared within a lineage, whose vector space is fixed
+        self.query_vectors = query_vectors or TTLCache(max_entries=QUERY_VECTOR_CACHE_SIZE, ttl=float("inf"))
+        # 📇 Precomputed top-K per row (NeighbourTable), or None to always search live
+        self.neighbours = neighbours
+
+        # Rows deleted or superseded by incremental updates stay in the index but are masked out
+        self.live_mask = live_mask
+        # Vocabulary drift accumulated by incremental updates since the last full fit
+        self.drift = drift or {"rows_added": 0, "tokens": 0, "oov_tokens": 0}
+
+        self.filters = MovieFilterIndex(combined_df, live_mask)
+        self.catalog = catalog.MovieCatalog(combined_df, MOVIE_COLUMNS)
+
+        # 🔑 Normalized title -> first live row, one binary search over hashes per lookup
+        self.titles = titles or catalog.TitleIndex.build(combined_df["title"], live_mask,
+                                                         combined_df.get(catalog.ALIAS_COLUMN))
+
+        # High-water marks for incremental updates: newest id seen per source table,
+        # counting duplicates that were merged into other rows
+        ids = pd.to_numeric(combined_df["id"], errors="coerce")
+        self.high_water_marks = {
+            source: int(ids[combined_df["source"] == source].max()) if (combined_df["source"] == source).any() else 0
+            for source in ("imdb", "kaggle")
+        }
+        for merged_from in combined_df[catalog.PROVENANCE_COLUMN].unique():
+            for source, movie_id in dedup.parse_provenance(merged_from):
+                self.high_water_marks[source] = max(self.high_water_marks[source], movie_id)
+        self._key_rows = None
+
+    @property
+    def key_rows(self):
+        """
+        `(source, id)` -> row of its live version, built on first use.
+        """
+        if self._key_rows is None:
+            keys = index_artifact.row_keys(self.combined_df)
+            live = self.live_mask
+            self._key_rows = {key: row for row, key in enumerate(keys) if live is None or live[row]}
+        return self._key_rows
+
+    @property
+    def vocabulary_drift(self):
+        """
+        Share of tokens in incrementally added rows that the fitted vocabulary doesn't know.
+        """
+        return self.drift["oov_tokens"] / self.drift["tokens"] if self.drift["tokens"] else 0.0
+
+    @property
+    def embedding(self):
+        if sparse.issparse(self.vector_matrix):
+            return "sparse"
+        return "svd" if self.projection is not None else "dense"
+
+    def find_title(self, title):
+        """
+        Row of the first movie with this title (case/whitespace-insensitive), or None.
+        A title only a merged-away duplicate had finds the movie it was merged into.
+        """
+        key = (title or "").strip().lower()
+        row = self.titles.find(key)
+        if row is None:
+            return None
+        if str(self.combined_df["title"].array[row]).strip().lower() == key:
+            return row
+        aliases = self.combined_df[catalog.ALIAS_COLUMN].array[row] if catalog.ALIAS_COLUMN in self.combined_df else ""
+        if key in (alias.strip().lower() for alias in str(aliases).split(catalog.ALIAS_SEPARATOR)):
+            return row
+        return None
+
+    def row_vectors(self, rows):
+        """
+        Search vectors for catalog rows, in the form `faiss_index.search` accepts.
+        """
+        vectors = self.vector_matrix[rows]
+        if sparse.issparse(vectors):
+            return vectors
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def embed(self, tfidf_rows):
+        """
+        Map TF-IDF rows from this snapshot's vectorizer into its search vector space.
+        """
+        if self.embedding == "sparse":
+            return sparse.csr_matrix(tfidf_rows, dtype=np.float32)
+        if self.embedding == "svd":
+            vectors = np.ascontiguousarray(tfidf_rows @ np.asarray(self.projection).T, dtype=np.float32)
+        else:
+            vectors = tfidf_rows.astype(np.float32).toarray()
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def query_vector(self, text):
+        """
+        Search vector for free `text`, or None when none of its words are in the vocabulary.
+        """
+        key = " ".join((text or "").lower().split())
+        vector = self.query_vectors.get(key)
+        if vector is None:
+            tfidf_row = vectorization.transform_texts(self.vectorizer, [key])
+            vector = self.embed(tfidf_row) if tfidf_row.nnz else False
+            self.query_vectors.set(key, vector)
+        return vector if vector is not False else None
+
+    def search(self, queries, k, allowed=None, nprobe=None, ef_search=None):
+        """
+        Top-k neighbours of `queries`, restricted to the `allowed` row mask when given.
+        """
+        return vector_index.search(self.faiss_index, self.vector_matrix, queries, k,
+                                   allowed=allowed, nprobe=nprobe, ef_search=ef_search)
+
+
+MOVIE_COLUMNS = catalog.CATALOG_COLUMNS + ["source", catalog.PROVENANCE_COLUMN]
+
+# TF-IDF settings, also recorded in persisted index artifacts
+VECTORIZER_PARAMS = {"stop_words": "english", "max_features": 10000}
+
+# 🔁 Incremental updates: poll interval, and the drift that triggers a full refit
+REFRESH_SECONDS = float(os.getenv("RECOMMENDER_REFRESH_SECONDS", "30"))
+DRIFT_THRESHOLD = float(os.getenv("RECOMMENDER_DRIFT_THRESHOLD", "0.15"))
+GROWTH_THRESHOLD = float(os.getenv("RECOMMENDER_GROWTH_THRESHOLD", "0.25"))
+DRIFT_MIN_TOKENS = int(os.getenv("RECOMMENDER_DRIFT_MIN_TOKENS", "5000"))
+
+# 🧮 Search vector representation: "sparse" (exact, CSR), "svd" (LSA projection) or "dense" (legacy)
+EMBEDDING = os.getenv("RECOMMENDER_EMBEDDING", "sparse")
+SVD_DIM = int(os.getenv("RECOMMENDER_SVD_DIM", "256"))
+
+# Free-text queries whose vectors are kept for reuse
+QUERY_VECTOR_CACHE_SIZE = int(os.getenv("RECOMMENDER_QUERY_CACHE_SIZE", "1024"))
+
+
+def movies_to_df(imdb_movies, kaggle_movies):
+    """
+    Merge IMDb and Kaggle movies into one columnar catalog DataFrame.
+    Each side is either a catalog frame (crud.get_catalog) or a list of ORM objects.
+    """
+
+    def to_df(movies):
+        return movies if isinstance(movies, pd.DataFrame) else catalog.frame_from_movies(movies)
+
+    return catalog.combine_sources(to_df(imdb_movies), to_df(kaggle_movies))
+
+
+def fit_tfidf(combined_df):
+    """
+    Fit TF-IDF over the weighted text fields, in parallel chunks for large catalogs.
+    Rows come back L2-normalized and sparse.
     """
-    Merge IMDb and Kaggle movies, vectorize with TF-IDF, and build FAISS index.
-    """
-    global combined_df, faiss_index, vector_matrix
-
-    def to_df(movies, source):
-        return pd.DataFrame([{
-            "id": m.id,
-            "title": m.title or "",
-            "year": str(m.year) if m.year else "",
-            "rating": float(m.rating) if str(m.rating).strip() not in ["", "None"] else None,
-            "genres": m.genres or "",
-            "director": m.director or "",
-            "stars": m.stars or "",
-            "description": m.description or "",
-            "source": source
-        } for m in movies])
-
-    imdb_df = to_df(imdb_movies, "imdb")
-    kaggle_df = to_df(kaggle_movies, "kaggle")
-    combined_df = pd.concat([imdb_df, kaggle_df], ignore_index=True)
-
-    # Prepare content
-    combined_df["content"] = (
-    (combined_df["title"] + " ") * 3 +
-    (combined_df["genres"] + " ") * 2 +
-    (combined_df["director"] + " ") * 2 +
-    (combined_df["stars"] + " ") * 2 +
-    (combined_df["description"] + " ") * 2
-).str.lower().fillna("")
-
-    vectorizer = TfidfVectorizer(stop_words="english", max_features=10000)
-    tfidf_matrix = vectorizer.fit_transform(combined_df["content"])
-    vector_matrix = tfidf_matrix.astype(np.float32).toarray()
-
-    # Normalize and build FAISS index
+    return vectorization.fit_weighted_tfidf(combined_df, VECTORIZER_PARAMS)
+
+
+def embed_tfidf(tfidf_matrix, embedding=None, svd_dim=None):
+    """
+    Turn TF-IDF rows into search vectors. Returns `(vector_matrix, projection)`.
+
+    - "sparse": keep the CSR matrix as is (exact cosine, no densifying)
+    - "svd": LSA projection to `svd_dim` dense dimensions; `projection` maps new TF-IDF rows into it
+    - "dense": the full float32 TF-IDF matrix (legacy, memory heavy)
+    """
+    embedding = embedding or EMBEDDING
+    svd_dim = svd_dim or SVD_DIM
+
+    if embedding == "sparse":
+        return sparse.csr_matrix(tfidf_matrix, dtype=np.float32), None
+
+    if embedding == "svd":
+        dim = min(svd_dim, tfidf_matrix.shape[0] - 1, tfidf_matrix.shape[1] - 1)
+        if dim < 1:
+            raise ValueError(f"Too little data for an SVD embedding (shape {tfidf_matrix.shape})")
+        svd = TruncatedSVD(n_components=dim, random_state=0)
+        vector_matrix = np.ascontiguousarray(svd.fit_transform(tfidf_matrix), dtype=np.float32)
+        projection = svd.components_.astype(np.float32)
+    elif embedding == "dense":
+        vector_matrix = tfidf_matrix.astype(np.float32).toarray()
+        projection = None
+    else:
+        raise ValueError(f"Unknown embedding '{embedding}' (expected sparse, svd or dense)")
+
     faiss.normalize_L2(vector_matrix)
-    faiss_index = faiss.IndexFlatIP(vector_matrix.shape[1])
-    faiss_index.add(vector_matrix)
+    return vector_matrix, projection
 
 
-def get_combined_recommendations(title: str = "", genre: str = "", rating: float = None, top_n: int = 10):
+def build_vector_index(vector_matrix, index_kind=None):
+    """
+    Inner-product index over the embedded vectors: exact CSR search for sparse
+    vectors, otherwise the FAISS index kind from `index_kind` / RECOMMENDER_INDEX.
+    """
+    if sparse.issparse(vector_matrix):
+        if (index_kind or INDEX_KIND) != "flat":
+            logger.info("ℹ️ ANN index kinds need dense vectors; sparse embedding uses exact search.")
+        return SparseIPIndex(vector_matrix)
+
+    return build_faiss_index(vector_matrix, index_kind)
+
+
+def build_snapshot(imdb_movies, kaggle_movies, generation=0, embedding=None, svd_dim=None, index_kind=None,
+                   deduplicate=None, neighbours_k=None):
+    """
+    Merge IMDb and Kaggle movies, vectorize with TF-IDF, merge films present in
+    both datasets (unless `deduplicate` / RECOMMENDER_DEDUP is off), and build the search index.
+    With `neighbours_k` (or RECOMMENDER_NEIGHBOURS_IN_PROCESS=1), also precompute each row's
+    top-K neighbour table.
+    """
+    with stage("build.dataframe"):
+        combined_df = movies_to_df(imdb_movies, kaggle_movies)
+    with stage("build.tfidf"):
+        vectorizer, tfidf_matrix = fit_tfidf(combined_df)
+    if dedup.DEDUP_ENABLED if deduplicate is None else deduplicate:
+        with stage("build.dedup"):
+            combined_df, tfidf_matrix = dedup.deduplicate(combined_df, vectorizer, tfidf_matrix)
+    with stage("build.embed"):
+        vector_matrix, projection = embed_tfidf(tfidf_matrix, embedding, svd_dim)
+    with stage("build.index"):
+        faiss_index = build_vector_index(vector_matrix, index_kind)
+
+    with stage("build.snapshot"):
+        snapshot = RecommenderSnapshot(combined_df, vectorizer, vector_matrix, faiss_index, generation, projection)
+    if neighbours_k is None and neighbour_table.IN_PROCESS:
+        neighbours_k = neighbour_table.NEIGHBOURS_K
+    if neighbours_k:
+        snapshot.neighbours = neighbour_table.compute(snapshot, neighbours_k)
+    logger.info("🧠 Built recommender index", extra={"rows": len(combined_df), "generation": generation,
+                                                     "embedding": snapshot.embedding})
+    return snapshot
+
+
+def load_snapshot(artifact_dir, imdb_movies, kaggle_movies, generation=0):
+    """
+    Attach to a prebuilt index artifact instead of refitting.
+    Returns None when the artifact is missing or was built from different table contents.
+    """
+    with stage("build.dataframe"):
+        combined_df = movies_to_df(imdb_movies, kaggle_movies)
+
+    try:
+        with stage("artifact.load"):
+            artifact = index_artifact.load_artifact(artifact_dir)
+            # Redo the build's duplicate merges, then check the result is what was indexed
+            try:
+                combined_df = dedup.apply_provenance(combined_df, artifact.row_keys, artifact.provenance)
+            except KeyError as e:
+                raise index_artifact.StaleArtifactError(f"merged movie {e} is no longer in the tables")
+            index_artifact.verify_source(artifact, combined_df)
+    except FileNotFoundError:
+        logger.info(f"ℹ️ No index artifact at '{artifact_dir}', building in-process.")
+        return None
+    except index_artifact.StaleArtifactError as e:
+        logger.warning(f"⚠️ Refusing stale index artifact: {e}")
+        return None
+
+    combined_df = index_artifact.align_rows(combined_df, artifact.row_keys)
+    return RecommenderSnapshot(combined_df, artifact.vectorizer, artifact.vector_matrix, artifact.faiss_index,
+                               generation, artifact.projection, neighbours=artifact.neighbours, index_mapped=True)
+
+
+def extend_snapshot(snapshot, imdb_movies, kaggle_movies, deleted_keys=(), generation=0):
+    """
+    Next generation of `snapshot` with new/updated rows appended and `deleted_keys`
+    masked out, reusing the fitted vocabulary instead of refitting.
+
+    Rows keep their positions (which are also their index ids), so the new rows are
+    added to a copy of the index under ids `len(old)..`; in-flight requests keep
+    searching the old copy. An updated movie is its old row deleted plus a new row.
+    New rows are not checked for duplicates; the next full refit merges them.
+    """
+    new_df = movies_to_df(imdb_movies, kaggle_movies)
+    n_old = len(snapshot.combined_df)
+
+    live = np.ones(n_old, dtype=bool) if snapshot.live_mask is None else snapshot.live_mask.copy()
+    replaced = set(deleted_keys) | set(index_artifact.row_keys(new_df))
+    for key in replaced:
+        row = snapshot.key_rows.get(key)
+        if row is not None:
+            live[row] = False
+
+    combined_df = snapshot.combined_df
+    vector_matrix = snapshot.vector_matrix
+    faiss_index = snapshot.faiss_index
+    index_mapped = snapshot.index_mapped
+    drift = dict(snapshot.drift)
+
+    if len(new_df):
+        tfidf_rows = vectorization.transform_weighted(snapshot.vectorizer, new_df)
+        new_vectors = snapshot.embed(tfidf_rows)
+
+        combined_df = catalog.concat_frames([combined_df, new_df])
+        faiss_index = vector_index.extend_index(faiss_index, new_vectors, start_id=n_old, mapped=index_mapped)
+        index_mapped = False
+        vector_matrix = faiss_index.matrix if isinstance(faiss_index, SparseIPIndex) else \
+            np.vstack([np.asarray(vector_matrix), new_vectors])
+        live = np.concatenate([live, np.ones(len(new_df), dtype=bool)])
+
+        # 📈 Track how much of the new text the old vocabulary can't see
+        tokens, oov_tokens = vectorization.weighted_tokens(snapshot.vectorizer, new_df)
+        drift["tokens"] += tokens
+        drift["oov_tokens"] += oov_tokens
+        drift["rows_added"] += len(new_df)
+
+    return RecommenderSnapshot(combined_df, snapshot.vectorizer, vector_matrix, faiss_index, generation,
+                               snapshot.projection, live_mask=None if live.all() else live, drift=drift,
+                               lineage=snapshot.lineage, query_vectors=snapshot.query_vectors,
+                               neighbours=snapshot.neighbours, index_mapped=index_mapped)
+
+
+def needs_refit(snapshot):
+    """
+    True once incremental updates have drifted far enough from the fitted vocabulary.
+    """
+    live_rows = len(snapshot.combined_df) if snapshot.live_mask is None else int(snapshot.live_mask.sum())
+    grown = snapshot.drift["rows_added"] / max(live_rows, 1)
+    drifted = snapshot.drift["tokens"] >= DRIFT_MIN_TOKENS and snapshot.vocabulary_drift > DRIFT_THRESHOLD
+    return drifted or grown > GROWTH_THRESHOLD
+
+
+def load_combined_data(imdb_movies, kaggle_movies):
+    """
+    Build a snapshot and publish it as the module-level globals.
+    """
+    global combined_df, faiss_index, vector_matrix, _loaded_snapshot
+
+    snapshot = build_snapshot(imdb_movies, kaggle_movies)
+    _loaded_snapshot = snapshot
+    combined_df = snapshot.combined_df
+    faiss_index = snapshot.faiss_index
+    vector_matrix = snapshot.vector_matrix
+    return snapshot
+
+
+class RecommenderEngine:
+    """
+    Long-lived owner of the current RecommenderSnapshot.
+
+    Built once at startup and kept resident. `reload()` builds the next
+    generation off to the side and swaps it in with a single assignment,
+    so requests that already grabbed `snapshot` keep a consistent view.
+    """
+
+    def __init__(self):
+        self._loader = None
+        self._delta_loader = None
+        self._artifact_dir = None
+        self._stop_polling = threading.Event()
+        self._snapshot = None
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+        self._reload_listeners = []
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def generation(self):
+        return self._snapshot.generation if self._snapshot is not None else 0
+
+    @property
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def add_reload_listener(self, listener):
+        """
+        Call `listener(snapshot)` after every new generation is published.
+        """
+        self._reload_listeners.append(listener)
+
+    def start(self, loader, artifact_dir=None, delta_loader=None):
+        """
+        Register `loader` (returns `(imdb_movies, kaggle_movies)`) and build the first snapshot.
+        With `artifact_dir`, a fresh on-disk artifact is memory-mapped instead of refitting.
+        `delta_loader(high_water_marks, keys)` returns `(imdb_movies, kaggle_movies)` newer than
+        the marks or listed in `keys`, and enables `refresh()`.
+        """
+        self._loader = loader
+        self._artifact_dir = artifact_dir
+        self._delta_loader = delta_loader
+        try:
+            self.reload()
+        except Exception as e:
+            logger.exception(f"❌ Initial recommender build failed: {e}")
+
+    def reload(self):
+        """
+        Rebuild from the loader and publish the new snapshot. Builds never overlap.
+        """
+        if self._loader is None:
+            raise RuntimeError("RecommenderEngine.start() has not been called")
+
+        with self._reload_lock, stage("index.reload"):
+            snapshot = self._rebuild()
+
+        self._publish(snapshot)
+        return snapshot
+
+    def _rebuild(self):
+        imdb_movies, kaggle_movies = self._loader()
+        generation = self._generation + 1
+
+        snapshot = None
+        if self._artifact_dir:
+            snapshot = load_snapshot(self._artifact_dir, imdb_movies, kaggle_movies, generation)
+        if snapshot is None:
+            snapshot = build_snapshot(imdb_movies, kaggle_movies, generation)
+
+        self._generation = snapshot.generation
+        self._snapshot = snapshot
+        return snapshot
+
+    def install(self, snapshot):
+        """
+        Make a snapshot built elsewhere (the shared-serving parent process) the current generation.
+        """
+        with self._reload_lock:
+            self._generation = snapshot.generation
+            self._snapshot = snapshot
+        self._publish(snapshot)
+
+    def _publish(self, snapshot):
+        for listener in self._reload_listeners:
+            listener(snapshot)
+
+    def refresh(self, updated_keys=(), deleted_keys=()):
+        """
+        Fold rows added since the high-water marks (plus explicitly updated/deleted
+        `(source, id)` keys) into a new generation without refitting. Schedules a full
+        reload in the background once vocabulary drift crosses the threshold.
+        Returns a summary dict.
+        """
+        if self._delta_loader is None:
+            raise RuntimeError("RecommenderEngine was started without a delta_loader")
+
+        with self._reload_lock:
+            current = self._snapshot
+            if current is None:
+                snapshot = self._rebuild()
+                summary = {"mode": "full", "generation": snapshot.generation}
+            else:
+                imdb_movies, kaggle_movies = self._delta_loader(current.high_water_marks, list(updated_keys))
+                if not (len(imdb_movies) or len(kaggle_movies) or deleted_keys):
+                    return {"mode": "unchanged", "generation": current.generation}
+
+                with stage("index.refresh"):
+                    snapshot = extend_snapshot(current, imdb_movies, kaggle_movies, deleted_keys,
+                                               self._generation + 1)
+                self._generation = snapshot.generation
+                self._snapshot = snapshot
+                summary = {
+                    "mode": "incremental",
+                    "generation": snapshot.generation,
+                    "rows_added": len(imdb_movies) + len(kaggle_movies),
+                    "rows_deleted": len(deleted_keys),
+                    "vocabulary_drift": round(snapshot.vocabulary_drift, 4),
+                }
+
+        self._publish(snapshot)
+
+        if summary["mode"] == "incremental" and needs_refit(snapshot):
+            logger.info(f"🔁 Vocabulary drift {snapshot.vocabulary_drift:.1%}; scheduling a full refit.")
+            summary["refit_scheduled"] = self.reload_in_background()
+        return summary
+
+    def start_polling(self, interval=None):
+        """
+        Call `refresh()` every `interval` seconds on a daemon thread until `stop_polling()`.
+        """
+        interval = REFRESH_SECONDS if interval is None else interval
+        if interval <= 0 or self._delta_loader is None:
+            return False
+        self._stop_polling.clear()
+
+        def run():
+            while not self._stop_polling.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.exception(f"❌ Incremental recommender refresh failed: {e}")
+
+        threading.Thread(target=run, name="recommender-refresh", daemon=True).start()
+        return True
+
+    def stop_polling(self):
+        self._stop_polling.set()
+
+    def reload_in_background(self):
+        """
+        Start a reload on a daemon thread. Returns False if one is already running.
+        """
+        if self.reloading:
+            return False
+
+        def run():
+            try:
+                self.reload()
+            except Exception as e:
+                logger.exception(f"❌ Background recommender reload failed: {e}")
+
+        threading.Thread(target=run, name="recommender-reload", daemon=True).start()
+        return True
+
+
+# 🧠 Process-wide engine, started from the FastAPI lifespan hook
+recommender_engine = RecommenderEngine()
+
+
+def get_combined_recommendations(title: str = "", genre: str = "", rating: float = None, top_n: int = 10,
+                                 snapshot: RecommenderSnapshot = None, nprobe: int = None, ef_search: int = None,
+                                 mode: str = "content", cf_index=None, weight: float = None):
     """
     Recommend top N similar movies using FAISS with fallback strategy.
+    Uses `snapshot` when given, otherwise the module-level globals.
+    `nprobe` / `ef_search` tune IVF / HNSW indexes for this call only;
+    `mode`, `cf_index` and `weight` are as for get_batch_recommendations.
+
+    Genre/rating filters are applied inside the vector search, so the result is
+    the top N among matching movies rather than whatever survives post-filtering.
+    """
+    query = {"title": title, "genre": genre, "rating": rating}
+    results = get_batch_recommendations([query], top_n=top_n, snapshot=snapshot, nprobe=nprobe, ef_search=ef_search,
+                                        mode=mode, cf_index=cf_index, weight=weight)
+    if results[0] is None:
+        logger.debug("❌ Title not found in dataset.", extra={"title": title})
+        return []
+    return results[0]
+
+
+def get_batch_recommendations(queries, top_n: int = 10, snapshot: RecommenderSnapshot = None,
+                              nprobe: int = None, ef_search: int = None, mode: str = "content",
+                              cf_index=None, weight: float = None):
+    """
+    Recommendations for many `{"title", "genre", "rating"}` queries at once.
+
+    Title queries that share the same filters are stacked into one matrix and
+    answered with a single index search; ranking and fallback are the same as
+    get_combined_recommendations. Returns one list of movie dicts per query,
+    or None when its title is not in the catalog.
+
+    `mode` picks the similarity: "content" (TF-IDF), "collaborative" (item factors
+    from `cf_index`) or "hybrid" (content and collaborative scores blended with
+    `weight` on the collaborative side). Movies without factors fall back to content.
+    """
+    snapshot = snapshot or _loaded_snapshot
+    if snapshot is None:
+        logger.error("❌ Data or FAISS index not loaded.")
+        return [[] for _ in queries]
+
+    filters = snapshot.filters
+    results = [[] for _ in queries]
+    if mode != "content" and cf_index is None:
+        mode = "content"
+    weight = collaborative.HYBRID_WEIGHT if weight is None else weight
+
+    def neighbours(rows, allowed):
+        return _ranked_neighbours(snapshot, rows, top_n, allowed, nprobe, ef_search, mode, cf_index, weight)
+
+    # Queries with identical filters share one allowed-row mask and one search call
+    groups = defaultdict(list)
+    title_rows = {}
+    for i, query in enumerate(queries):
+        genre = (query.get("genre") or "").strip().lower()
+        rating = query.get("rating")
+        if not (query.get("title") or "").strip():
+            results[i] = _filter_only_recommendations(snapshot, genre, rating, top_n)
+            continue
+        title_rows[i] = snapshot.find_title(query.get("title"))
+        if title_rows[i] is None:
+            results[i] = None
+        else:
+            groups[(genre, rating)].append(i)
+
+    for (genre, rating), members in groups.items():
+        rows = [title_rows[i] for i in members]
+        with stage("recommend.filter"):
+            allowed = filters.mask(genre=genre, rating=rating)
+        with stage("recommend.search"):
+            recommendations = dict(zip(members, neighbours(rows, allowed)))
+
+        # 🛟 Fallback: if not enough results, drop the rating filter
+        short = [(i, row) for i, row in zip(members, rows) if len(recommendations[i]) < top_n]
+        if short and rating is not None:
+            logger.debug("⚠️ Not enough filtered results; applying fallback without rating filter.",
+                         extra={"queries": len(short), "genre": genre, "rating": rating})
+            fallback = filters.mask(genre=genre)
+            with stage("recommend.search"):
+                extra = neighbours([row for _, row in short], fallback)
+            for (i, _), candidates in zip(short, extra):
+                seen = set(recommendations[i])
+                recommendations[i] += [c for c in candidates if c not in seen][:top_n - len(seen)]
+
+        with stage("recommend.to_records"):
+            for i in members:
+                results[i] = snapshot.catalog.records(recommendations[i])
+
+    return results
+
+
+def _neighbours(snapshot, rows, top_n, allowed, nprobe, ef_search):
+    """
+    Top-N allowed neighbours of each catalog row, excluding the row itself. Rows the
+    precomputed neighbour table can answer are read from it; the rest (and requests
+    that tune the ANN search) go through one stacked live search.
     """
-    global combined_df, faiss_index, vector_matrix
+    results = [None] * len(rows)
+    if snapshot.neighbours is not None and nprobe is None and ef_search is None:
+        with stage("recommend.table"):
+            results = _table_neighbours(snapshot, rows, top_n, allowed)
+
+    live = [j for j, found in enumerate(results) if found is None]
+    if snapshot.neighbours is not None:
+        neighbour_table.TABLE_LOOKUPS.inc(len(rows) - len(live), result="hit")
+        neighbour_table.TABLE_LOOKUPS.inc(len(live), result="miss")
+    if live:
+        live_rows = [rows[j] for j in live]
+        # One extra slot because a movie is its own nearest neighbour
+        _, I = snapshot.search(snapshot.row_vectors(live_rows), top_n + 1, allowed=allowed,
+                               nprobe=nprobe, ef_search=ef_search)
+        for j, row, found in zip(live, live_rows, I):
+            results[j] = [int(i) for i in found if i >= 0 and i != row][:top_n]
+    return results
+
+
+def _table_neighbours(snapshot, rows, top_n, allowed):
+    """
+    Neighbours from the precomputed table, None where it can't answer. Rows appended by
+    incremental updates since the table was built are searched and merged in; the merge
+    re-scores both sides in float32 (the table keeps float16) and breaks ties on row id.
+    """
+    table = snapshot.neighbours
+    stored = [table.lookup(row, top_n, allowed) for row in rows]
+    served = [j for j, found in enumerate(stored) if found is not None]
+
+    n_rows = len(snapshot.combined_df)
+    if served and n_rows > table.size:
+        newer = np.zeros(n_rows, dtype=bool)
+        newer[table.size:] = True if allowed is None else allowed[table.size:]
+        if newer.any():
+            D, I = snapshot.search(snapshot.row_vectors([rows[j] for j in served]), top_n, allowed=newer)
+            for j, found in zip(served, I):
+                ids, _ = stored[j]
+                ids = np.concatenate([ids, found[(found >= 0) & (found != rows[j])]])
+                scores = _exact_scores(snapshot, rows[j], ids)
+                stored[j] = (ids[np.lexsort((ids, -scores))[:top_n]], None)
 
-    if combined_df is None or faiss_index is None:
-        print("❌ Data or FAISS index not loaded.")
+    return [None if found is None else found[0].tolist() for found in stored]
+
+
+def _exact_scores(snapshot, row, candidates):
+    """
+    float32 inner products of `row`'s vector with each of the `candidates` rows.
+    """
+    scores = snapshot.row_vectors([row]) @ snapshot.row_vectors(candidates).T
+    return np.asarray(scores.todense() if sparse.issparse(scores) else scores, dtype=np.float32).ravel()
+
+
+def get_query_recommendations(text: str, genre: str = "", rating: float = None, top_n: int = 10,
+                              snapshot: RecommenderSnapshot = None, nprobe: int = None, ef_search: int = None):
+    """
+    Top N movies for free text such as "space heist with a robot": the text is vectorized
+    like a catalog row and searched directly, with the same filters and fallback as
+    title queries. Returns None when no word of the text is in the vocabulary.
+    """
+    snapshot = snapshot or _loaded_snapshot
+    if snapshot is None:
+        logger.error("❌ Data or FAISS index not loaded.")
         return []
 
-    filtered_df = combined_df.copy()
-
-    # Apply genre filter
-    if genre:
-        filtered_df = filtered_df[filtered_df["genres"].str.lower().str.contains(genre.lower(), na=False)]
-
-    # Apply rating filter
-    if rating is not None:
-        filtered_df["rating"] = pd.to_numeric(filtered_df["rating"], errors="coerce")
-        filtered_df = filtered_df[filtered_df["rating"].notna()]
-        filtered_df = filtered_df[filtered_df["rating"] >= float(rating)]
-
-    print("🧾 Filtered count:", len(filtered_df))
-    print("🧾 Filtered titles:", filtered_df["title"].tolist())
-
-    if title:
-        clean_title = title.strip().lower()
-        idx_list = combined_df[combined_df["title"].str.lower().str.strip() == clean_title].index
-        if idx_list.empty:
-            print("❌ Title not found in dataset.")
-            return []
-
-        query_idx = idx_list[0]
-        query_vector = vector_matrix[query_idx].reshape(1, -1)
-        D, I = faiss_index.search(query_vector, top_n + 10)  # Search wider for better fallback room
-
-        recommendations = []
-        seen = set()
-        for i in I[0]:
-            if i == query_idx or i in seen:
-                continue
-            if i in filtered_df.index:
-                recommendations.append(combined_df.iloc[i])
-                seen.add(i)
-            if len(recommendations) >= top_n:
-                break
-
-        # 🛟 Fallback: if not enough results, drop filters progressively
-        if len(recommendations) < top_n:
-            print("⚠️ Not enough filtered results. Applying fallback without rating filter.")
-            fallback_df = combined_df.copy()
-
-            if genre:
-                fallback_df = fallback_df[fallback_df["genres"].str.lower().str.contains(genre.lower(), na=False)]
-
-            for i in I[0]:
-                if i == query_idx or i in seen:
-                    continue
-                if i in fallback_df.index:
-                    recommendations.append(combined_df.iloc[i])
-                    seen.add(i)
-                if len(recommendations) >= top_n:
-                    break
-
-        return [r.to_dict() for r in recommendations]
-
-    # 🔄 No title provided, fallback to genre/rating filters
-    if filtered_df.empty:
-        print("⚠️ No matches found after filters. Falling back to genre only.")
-        fallback_df = combined_df.copy()
-        if genre:
-            fallback_df = fallback_df[fallback_df["genres"].str.lower().str.contains(genre.lower(), na=False)]
-        return fallback_df.head(top_n).to_dict(orient="records")
-
-    return filtered_df.head(top_n).to_dict(orient="records")
+    with stage("recommend.query_vector"):
+        vector = snapshot.query_vector(text)
+    if vector is None:
+        return None
+
+    genre = (genre or "").strip().lower()
+    with stage("recommend.filter"):
+        allowed = snapshot.filters.mask(genre=genre, rating=rating)
+    with stage("recommend.search"):
+        _, I = snapshot.search(vector, top_n, allowed=allowed, nprobe=nprobe, ef_search=ef_search)
+    rows = [int(i) for i in I[0] if i >= 0]
+
+    # 🛟 Fallback: if not enough results, drop the rating filter
+    if len(rows) < top_n and rating is not None:
+        with stage("recommend.search"):
+            _, I = snapshot.search(vector, top_n, allowed=snapshot.filters.mask(genre=genre),
+                                   nprobe=nprobe, ef_search=ef_search)
+        seen = set(rows)
+        rows += [int(i) for i in I[0] if i >= 0 and int(i) not in seen][:top_n - len(rows)]
+
+    with stage("recommend.to_records"):
+        return snapshot.catalog.records(rows)
+
+
+def _ranked_neighbours(snapshot, rows, top_n, allowed, nprobe, ef_search, mode, cf_index, weight):
+    """
+    `_neighbours` under the requested similarity mode, per row; rows whose movie has
+    no collaborative factors are answered from content alone.
+    """
+    if mode == "content":
+        return _neighbours(snapshot, rows, top_n, allowed, nprobe, ef_search)
+
+    rows = np.asarray(rows, dtype=np.intp)
+    warm = cf_index.has(rows)
+    results = [None] * len(rows)
+    if (~warm).any():
+        cold = np.flatnonzero(~warm)
+        for i, found in zip(cold, _neighbours(snapshot, rows[cold], top_n, allowed, nprobe, ef_search)):
+            results[i] = found
+    if warm.any():
+        warm = np.flatnonzero(warm)
+        if mode == "collaborative":
+            found = _cf_neighbours(cf_index, rows[warm], top_n, allowed)
+        else:
+            found = _hybrid_neighbours(snapshot, cf_index, rows[warm], top_n, allowed, nprobe, ef_search, weight)
+        for i, neighbours in zip(warm, found):
+            results[i] = neighbours
+    return results
+
+
+def _cf_neighbours(cf_index, rows, top_n, allowed):
+    """
+    Top-N allowed neighbours of each row in item-factor space, excluding the row itself.
+    """
+    _, I = cf_index.search(cf_index.row_vectors(rows), top_n + 1, allowed=allowed)
+    return [[int(i) for i in found if i >= 0 and i != row][:top_n] for row, found in zip(rows, I)]
+
+
+def _hybrid_neighbours(snapshot, cf_index, rows, top_n, allowed, nprobe, ef_search, weight):
+    """
+    Blend of both similarities: candidates are pooled from each index, then re-ranked
+    by `(1 - weight) * content cosine + weight * collaborative cosine`, computed exactly.
+    """
+    pool = top_n * max(collaborative.HYBRID_POOL, 1)
+    content = _neighbours(snapshot, rows, pool, allowed, nprobe, ef_search)
+    collaborative_found = _cf_neighbours(cf_index, rows, pool, allowed)
+
+    results = []
+    for row, a, b in zip(rows, content, collaborative_found):
+        candidates = np.fromiter(dict.fromkeys(a + b), dtype=np.intp)
+        if len(candidates) == 0:
+            results.append([])
+            continue
+        content_scores = _exact_scores(snapshot, row, candidates)
+        cf_scores = cf_index.row_vectors(candidates) @ cf_index.row_vectors([row])[0]
+        blended = (1 - weight) * content_scores + weight * cf_scores
+        order = np.argsort(-blended, kind="stable")[:top_n]
+        results.append(candidates[order].tolist())
+    return results
+
+
+def _filter_only_recommendations(snapshot, genre, rating, top_n):
+    """
+    No title given: the first N catalog rows matching the filters.
+    """
+    filters = snapshot.filters
+    allowed = filters.mask(genre=genre, rating=rating)
+    rows = np.arange(min(top_n, filters.size)) if allowed is None else np.flatnonzero(allowed)[:top_n]
+    if len(rows) == 0:
+        logger.debug("⚠️ No matches found after filters. Falling back to genre only.",
+                     extra={"genre": genre, "rating": rating})
+        fallback = filters.mask(genre=genre)
+        rows = np.arange(min(top_n, filters.size)) if fallback is None else np.flatnonzero(fallback)[:top_n]
+
+    return snapshot.catalog.records(rows)
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 🗃️ Response cache settings
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory", "redis" or "off"
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Seconds a process reuses the catalog_version it last read, instead of querying it on every /search
+CATALOG_VERSION_TTL = float(os.getenv("CATALOG_VERSION_TTL", "2"))
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Shared cache in Redis (or anything speaking its protocol), values stored as JSON.
+
+    Keys live under a namespace version, so `clear()` is one INCR instead of a key scan;
+    old entries simply age out through their TTL.
+    """
+
+    def __init__(self, url=CACHE_REDIS_URL, ttl=CACHE_TTL, prefix="movies:cache"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def _versioned(self, key):
+        version = int(self.client.get(f"{self.prefix}:version") or 0)
+        return f"{self.prefix}:v{version}:{key}"
+
+    def get(self, key):
+        raw = self.client.get(self._versioned(key))
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self._versioned(key), json.dumps(value, default=str), ex=max(1, int(self.ttl)))
+
+    def clear(self):
+        self.client.incr(f"{self.prefix}:version")
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    """
+    Caches route results keyed on normalized request parameters and the
+    recommender index generation, with hit/miss counters.
+
+    A reload bumps the generation, so stale entries are never served;
+    `invalidate()` additionally drops them right away.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Counters only; backend calls (possibly network round trips) stay outside it
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(namespace, params, generation=0):
+        normalized = {k: _normalize(v) for k, v in params.items()}
+        digest = hashlib.sha1(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{namespace}:g{generation}:{digest}"
+
+    def get(self, namespace, params, generation=0):
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(self.make_key(namespace, params, generation))
+        except Exception as e:
+            logger.warning(f"⚠️ Cache read failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, namespace, params, value, generation=0):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(self.make_key(namespace, params, generation), value)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache write failed: {e}")
+
+    def invalidate(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__ if self.enabled else "off",
+            "entries": len(self.backend) if self.enabled else 0,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "evictions": self.backend.evictions if self.enabled else 0,
+        }
+
+
+def normalize_text(value):
+    """
+    Case/whitespace-insensitive form of a free-text parameter (title, genre, query).
+    """
+    return (value or "").strip().lower() or None
+
+
+def _normalize(value):
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def create_cache(backend=CACHE_BACKEND):
+    if backend == "off":
+        return ResponseCache(None)
+    if backend == "redis":
+        try:
+            return ResponseCache(RedisCache())
+        except ImportError:
+            logger.warning("⚠️ CACHE_BACKEND=redis needs the 'redis' package; using the in-memory cache.")
+    return ResponseCache(TTLCache())
+
+
+# 🧠 Process-wide cache used by the API routes
+response_cache = create_cache()
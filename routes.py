@@ -1,23 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional, Union
-from database import get_db
+from typing import List, Optional
+import csv
+import io
+import json
+import metrics
+from database import get_db, get_async_db, ASYNC_DB, SessionLocal
 import crud
 import re
-from recommender import load_combined_data, get_combined_recommendations
-from schemas import IMDbMovieOut, KaggleMovieOut
+import shared_serving
+from collaborative import MODES, collaborative_engine
+from recommender import (get_combined_recommendations, get_batch_recommendations, get_query_recommendations,
+                         recommender_engine)
+from response_cache import CATALOG_VERSION_TTL, TTLCache, response_cache, normalize_text
+from schemas import MovieOut, MOVIE_FIELDS, BatchRecommendationRequest, BatchRecommendationResult, IndexRefreshRequest
 
 router = APIRouter()
 
-# 🎯 Combined response model union
-MovieResponseModel = Union[IMDbMovieOut, KaggleMovieOut]
+# ⚡ orjson when installed (pip install orjson), otherwise the stdlib encoder
+try:
+    import orjson
 
-@router.get("/recommendations/filter", response_model=List[MovieResponseModel])
+    def dump_json(value) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    def dump_json(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def field_projection(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return: " + ", ".join(MOVIE_FIELDS)),
+) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in MOVIE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"❌ Unknown fields: {', '.join(unknown)}.")
+    return names or None
+
+
+def movie_records(movies, fields: Optional[List[str]] = None) -> list:
+    """
+    Movies (catalog dicts or search result rows) as plain dicts, limited to `fields` when given.
+    """
+    records = [movie if isinstance(movie, dict) else movie._asdict() for movie in movies]
+    if fields:
+        return [{name: record.get(name) for name in fields} for record in records]
+    return records
+
+
+def movies_response(movies, fields: Optional[List[str]] = None, headers: Optional[dict] = None) -> Response:
+    """
+    JSON-encode movies directly. Catalog records and search rows already have the
+    MovieOut types, so there is no per-item model validation on the way out.
+    """
+    with metrics.stage("serialize"):
+        body = dump_json(movie_records(movies, fields))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def similarity_mode(
+    mode: str = Query("content", pattern="^(" + "|".join(MODES) + ")$",
+                      description="Similarity: content (TF-IDF), collaborative (ratings) or hybrid"),
+    weight: Optional[float] = Query(None, ge=0, le=1, description="Hybrid mode: share of the collaborative score"),
+) -> dict:
+    return {"mode": mode, "weight": weight}
+
+
+def collaborative_params(similarity: dict, snapshot) -> dict:
+    """
+    Keyword arguments for the recommender: the collaborative index aligned to `snapshot`
+    when a non-content mode was asked for (None until a model is trained).
+    """
+    cf_index = collaborative_engine.index_for(snapshot) if similarity["mode"] != "content" else None
+    return {**similarity, "cf_index": cf_index}
+
+
+@router.get("/recommendations/filter", response_model=List[MovieOut])
 def filtered_recommendations(
     title: Optional[str] = None,
     genre: Optional[str] = None,
     rating: Optional[float] = None,
-    db: Session = Depends(get_db)
+    nprobe: Optional[int] = Query(None, ge=1, description="IVF lists to probe (IVF indexes only)"),
+    ef_search: Optional[int] = Query(None, ge=1, description="HNSW search depth (HNSW indexes only)"),
+    similarity: dict = Depends(similarity_mode),
+    fields: Optional[List[str]] = Depends(field_projection),
 ):
     if not any([title, genre, rating]):
         raise HTTPException(status_code=400, detail="⚠️ Provide at least one filter (title, genre, or rating).")
@@ -25,41 +94,350 @@ def filtered_recommendations(
     if re.search(r"[^a-zA-Z0-9\s]", title or "") or re.search(r"[^a-zA-Z0-9\s]", genre or ""):
         raise HTTPException(status_code=400, detail="❌ Invalid characters in title or genre.")
 
-    imdb_movies = crud.get_imdb_movies(db)
-    kaggle_movies = crud.get_kaggle_movies(db)
+    # Pin one generation of the resident index for the whole request
+    snapshot = recommender_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="⏳ Recommender index is not ready yet.")
 
-    # Load into FAISS-based recommender
-    from recommender import load_combined_data, get_combined_recommendations
-    load_combined_data(imdb_movies, kaggle_movies)
+    cache_params = {"title": normalize_text(title), "genre": normalize_text(genre), "rating": rating,
+                    "nprobe": nprobe, "ef_search": ef_search}
+    if similarity["mode"] != "content":
+        # A retrained model changes these results without a new index generation
+        cache_params.update(similarity, cf_version=collaborative_engine.version)
+    with metrics.stage("cache.lookup"):
+        cached = response_cache.get("recommendations", cache_params, snapshot.generation)
+    if cached is not None:
+        return movies_response(cached, fields)
 
-    recommendations = get_combined_recommendations(title=title, genre=genre, rating=rating, top_n=5)
+    recommendations = get_combined_recommendations(title=title, genre=genre, rating=rating, top_n=5, snapshot=snapshot,
+                                                   nprobe=nprobe, ef_search=ef_search,
+                                                   **collaborative_params(similarity, snapshot))
 
     if title:
-        all_titles = [m.title.lower().strip() for m in imdb_movies + kaggle_movies]
-        if title.lower().strip() not in all_titles:
+        if snapshot.find_title(title) is None:
             raise HTTPException(status_code=404, detail="❌ Title not found in either dataset.")
 
     if not recommendations:
         raise HTTPException(status_code=404, detail="😢 No movies found for your filters.")
 
-    return recommendations
+    response_cache.set("recommendations", cache_params, recommendations, snapshot.generation)
+    return movies_response(recommendations, fields)
 
 
-@router.get("/search", response_model=List[MovieResponseModel])
-def search_movies(
-    query: str = Query(..., min_length=1, description="Movie title to search"),
-    db: Session = Depends(get_db)
+@router.get("/recommendations/query", response_model=List[MovieOut])
+def query_recommendations(
+    q: str = Query(..., min_length=1, max_length=500, description="Free text, e.g. 'space heist with a robot'"),
+    genre: Optional[str] = None,
+    rating: Optional[float] = None,
+    top_n: int = Query(5, ge=1, le=100),
+    nprobe: Optional[int] = Query(None, ge=1, description="IVF lists to probe (IVF indexes only)"),
+    ef_search: Optional[int] = Query(None, ge=1, description="HNSW search depth (HNSW indexes only)"),
+    fields: Optional[List[str]] = Depends(field_projection),
+):
+    """
+    Movies matching free text, searched directly in the index without a title lookup.
+    The text is only vectorized, never sent to the database, so punctuation is fine.
+    """
+    if re.search(r"[^a-zA-Z0-9\s]", genre or ""):
+        raise HTTPException(status_code=400, detail="❌ Invalid characters in genre.")
+
+    snapshot = recommender_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="⏳ Recommender index is not ready yet.")
+
+    cache_params = {"q": normalize_text(q), "genre": normalize_text(genre), "rating": rating, "top_n": top_n,
+                    "nprobe": nprobe, "ef_search": ef_search}
+    with metrics.stage("cache.lookup"):
+        cached = response_cache.get("query", cache_params, snapshot.generation)
+    if cached is not None:
+        return movies_response(cached, fields)
+
+    recommendations = get_query_recommendations(q, genre=genre, rating=rating, top_n=top_n, snapshot=snapshot,
+                                                nprobe=nprobe, ef_search=ef_search)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="❌ None of the query words are known to the index.")
+    if not recommendations:
+        raise HTTPException(status_code=404, detail="😢 No movies found for your filters.")
+
+    response_cache.set("query", cache_params, recommendations, snapshot.generation)
+    return movies_response(recommendations, fields)
+
+
+@router.post("/recommendations/batch", response_model=List[BatchRecommendationResult])
+def batch_recommendations(
+    request: BatchRecommendationRequest,
+    nprobe: Optional[int] = Query(None, ge=1, description="IVF lists to probe (IVF indexes only)"),
+    ef_search: Optional[int] = Query(None, ge=1, description="HNSW search depth (HNSW indexes only)"),
+    similarity: dict = Depends(similarity_mode),
+    fields: Optional[List[str]] = Depends(field_projection),
 ):
+    """
+    Answer many recommendation queries with one stacked index search per distinct filter.
+    Each query gets its own result or error, in request order.
+    """
+    snapshot = recommender_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="⏳ Recommender index is not ready yet.")
+
+    # Validate per query so one bad entry doesn't fail the whole batch
+    errors = {}
+    for i, query in enumerate(request.queries):
+        if not any([query.title, query.genre, query.rating]):
+            errors[i] = "⚠️ Provide at least one filter (title, genre, or rating)."
+        elif re.search(r"[^a-zA-Z0-9\s]", query.title or "") or re.search(r"[^a-zA-Z0-9\s]", query.genre or ""):
+            errors[i] = "❌ Invalid characters in title or genre."
+
+    valid = [i for i in range(len(request.queries)) if i not in errors]
+    results = get_batch_recommendations(
+        [request.queries[i].model_dump() for i in valid],
+        top_n=request.top_n, snapshot=snapshot, nprobe=nprobe, ef_search=ef_search,
+        **collaborative_params(similarity, snapshot),
+    )
+    recommendations = dict(zip(valid, results))
+
+    response = []
+    for i, query in enumerate(request.queries):
+        found = recommendations.get(i)
+        error = errors.get(i)
+        if error is None and found is None:
+            error = "❌ Title not found in either dataset."
+        elif error is None and not found:
+            error = "😢 No movies found for your filters."
+        response.append({"query": query.model_dump(), "recommendations": movie_records(found or [], fields),
+                         "error": error})
+
+    with metrics.stage("serialize"):
+        body = dump_json(response)
+    return Response(body, media_type="application/json")
+
+
+def search_query(
+    query: str = Query(..., min_length=1, description="Movie title to search"),
+    sort_by: str = Query("title", description="Sort field: " + ", ".join(crud.SORT_FIELDS)),
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+) -> dict:
     if re.search(r"[^a-zA-Z0-9\s]", query):
         raise HTTPException(status_code=400, detail="❌ Only letters, digits, and spaces allowed.")
+    return {"search": query.strip(), "sort_by": sort_by, "limit": limit, "cursor": cursor}
+
+
+# 🔖 Last catalog version read by this process; at most one version query per CATALOG_VERSION_TTL
+catalog_version_cache = TTLCache(max_entries=1, ttl=CATALOG_VERSION_TTL)
+
+
+def catalog_version(db: Session) -> int:
+    version = catalog_version_cache.get("version")
+    if version is None:
+        version = crud.get_catalog_version(db)
+        catalog_version_cache.set("version", version)
+    return version
+
 
-    imdb_movies = crud.get_imdb_movies(db)
-    kaggle_movies = crud.get_kaggle_movies(db)
-    all_movies = imdb_movies + kaggle_movies
+async def catalog_version_async(db) -> int:
+    version = catalog_version_cache.get("version")
+    if version is None:
+        version = await crud.get_catalog_version_async(db)
+        catalog_version_cache.set("version", version)
+    return version
 
-    results = [m for m in all_movies if query.lower().strip() in m.title.lower().strip()]
 
-    if not results:
+def cached_search_page(params: dict, catalog_version: int):
+    """
+    Cached `(results, next_cursor)` for these search parameters, or None.
+    """
+    with metrics.stage("cache.lookup"):
+        cached = response_cache.get("search", search_cache_params(params, catalog_version),
+                                    recommender_engine.generation)
+    if cached is None:
+        return None
+    return cached["results"], cached["next_cursor"]
+
+
+def cache_search_page(params: dict, catalog_version: int, page):
+    results, next_cursor = page
+    if results:
+        value = {"results": movie_records(results), "next_cursor": next_cursor}
+        response_cache.set("search", search_cache_params(params, catalog_version), value,
+                           recommender_engine.generation)
+
+
+def search_cache_params(params: dict, catalog_version: int) -> dict:
+    # Pages are read straight from the tables, so any write to them (bulk load or not) is a new key
+    return {**params, "search": normalize_text(params["search"]), "catalog_version": catalog_version}
+
+
+def search_response(page, params: dict, fields: Optional[List[str]]) -> Response:
+    results, next_cursor = page
+    if not results and not params["cursor"]:
         raise HTTPException(status_code=404, detail="😢 No matching movies found.")
 
-    return results
+    # Body stays a plain list; the next page is advertised in a header
+    return movies_response(results, fields, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+# Substring match runs in Postgres on the pg_trgm title indexes, one keyset page at a time
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    @router.get("/search", response_model=List[MovieOut])
+    async def search_movies(
+        params: dict = Depends(search_query),
+        fields: Optional[List[str]] = Depends(field_projection),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        version = await catalog_version_async(db)
+        page = cached_search_page(params, version)
+        if page is None:
+            try:
+                page = await crud.search_movies_async(db, **params)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"❌ {e}.")
+            cache_search_page(params, version, page)
+        return search_response(page, params, fields)
+else:
+    @router.get("/search", response_model=List[MovieOut])
+    def search_movies(
+        params: dict = Depends(search_query),
+        fields: Optional[List[str]] = Depends(field_projection),
+        db: Session = Depends(get_db)
+    ):
+        version = catalog_version(db)
+        page = cached_search_page(params, version)
+        if page is None:
+            try:
+                page = crud.search_movies(db, **params)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"❌ {e}.")
+            cache_search_page(params, version, page)
+        return search_response(page, params, fields)
+
+
+# 📤 Full catalog export formats
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@router.get("/movies/export")
+def export_movies(
+    query: str = Query("", description="Optional title substring; empty exports everything"),
+    sort_by: str = Query("title", description="Sort field: " + ", ".join(crud.SORT_FIELDS)),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    fields: Optional[List[str]] = Depends(field_projection),
+):
+    """
+    Stream every matching movie from both tables as NDJSON (one object per line) or CSV.
+    Rows are read through a server-side cursor and written chunk by chunk, so memory
+    use does not grow with the catalog.
+    """
+    if re.search(r"[^a-zA-Z0-9\s]", query):
+        raise HTTPException(status_code=400, detail="❌ Only letters, digits, and spaces allowed.")
+
+    return StreamingResponse(
+        export_chunks(query.strip(), sort_by, export_format, fields),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="movies.{export_format}"'},
+    )
+
+
+def export_chunks(search: str, sort_by: str, export_format: str, fields: Optional[List[str]]):
+    """
+    Encoded export body, one chunk of rows at a time.
+    """
+    # Dependency-managed sessions are closed before a streamed body is sent, so the export opens its own
+    db = SessionLocal()
+    try:
+        if export_format == "csv":
+            fields = fields or MOVIE_FIELDS
+            yield csv_lines([fields])
+        for rows in crud.stream_movies(db, search, sort_by):
+            records = movie_records(rows, fields)
+            if export_format == "csv":
+                yield csv_lines([[record[name] for name in fields] for record in records])
+            else:
+                yield b"".join(dump_json(record) + b"\n" for record in records)
+    finally:
+        db.close()
+
+
+def csv_lines(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
+
+
+@router.post("/admin/reload")
+def reload_recommender(wait: bool = False):
+    """
+    Rebuild the recommender index from the database.
+    Runs in the background unless `wait` is set; requests keep using the current generation meanwhile.
+    """
+    if shared_serving.SHARED_DIR:
+        return shared_serving.submit(shared_serving.SHARED_DIR, "reload")
+    if wait:
+        snapshot = recommender_engine.reload()
+        return {"status": "reloaded", "generation": snapshot.generation}
+
+    started = recommender_engine.reload_in_background()
+    return {
+        "status": "reloading" if started else "already_reloading",
+        "generation": recommender_engine.generation,
+    }
+
+
+@router.post("/admin/collaborative/train")
+def train_collaborative(wait: bool = False):
+    """
+    Retrain the collaborative model from the ratings table.
+    Runs in the background unless `wait` is set; requests keep using the current model meanwhile.
+    """
+    if shared_serving.SHARED_DIR:
+        return shared_serving.submit(shared_serving.SHARED_DIR, "train")
+    if wait:
+        model = collaborative_engine.train()
+        return {"status": "trained" if model else "no_events", "version": collaborative_engine.version,
+                "users": model.users if model else 0, "events": model.events if model else 0}
+
+    started = collaborative_engine.train_in_background()
+    return {"status": "training" if started else "already_training", "version": collaborative_engine.version}
+
+
+@router.post("/admin/index/refresh")
+def refresh_recommender(request: Optional[IndexRefreshRequest] = None):
+    """
+    Fold movies uploaded since the last build into the index without refitting.
+    Optionally lists edited (`updated`) and removed (`deleted`) movies by source and id.
+    """
+    request = request or IndexRefreshRequest()
+    if shared_serving.SHARED_DIR:
+        return shared_serving.submit(shared_serving.SHARED_DIR, "refresh",
+                                     updated=[(key.source, key.id) for key in request.updated],
+                                     deleted=[(key.source, key.id) for key in request.deleted])
+    try:
+        return recommender_engine.refresh(
+            updated_keys=[(key.source, key.id) for key in request.updated],
+            deleted_keys=[(key.source, key.id) for key in request.deleted],
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=f"❌ {e}.")
+
+
+@router.get("/admin/cache")
+def cache_stats():
+    """
+    Response cache hit/miss counters.
+    """
+    return response_cache.stats()
+
+
+@router.post("/admin/cache/clear")
+def clear_cache():
+    response_cache.invalidate()
+    return response_cache.stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """
+    Latency histograms, stage timings, index, cache and DB pool gauges in Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from datetime import timedelta
-from typing import Optional
+from typing import List, Literal, Optional
 
 # 🔧 Base logic shared by both datasets
 class BaseMovieSchema(BaseModel):
@@ -48,3 +48,50 @@ class KaggleMovieOut(KaggleMovieCreate):
 
     class Config:
         from_attributes = True
+
+
+# ⚡ Unified response schema for both tables; `source` says which one a movie came from
+class MovieOut(BaseModel):
+    id: int
+    source: Literal["imdb", "kaggle"]
+    title: str
+    year: Optional[int] = None
+    rating: Optional[float] = None
+    genres: str = ""
+    director: str = ""
+    stars: str = ""
+    description: str = ""
+    # `source:id` of duplicates merged into this entry when the index was built (recommendations only)
+    merged_from: str = ""
+
+
+# Fields a response can be projected onto with `?fields=`
+MOVIE_FIELDS = list(MovieOut.model_fields)
+
+
+# 📦 Batch recommendations
+class RecommendationQuery(BaseModel):
+    title: Optional[str] = None
+    genre: Optional[str] = None
+    rating: Optional[float] = None
+
+
+class BatchRecommendationRequest(BaseModel):
+    queries: List[RecommendationQuery] = Field(..., min_length=1, max_length=1000)
+    top_n: int = Field(5, ge=1, le=100)
+
+
+class BatchRecommendationResult(BaseModel):
+    query: RecommendationQuery
+    recommendations: List[MovieOut] = []
+    error: Optional[str] = None
+
+
+class MovieKey(BaseModel):
+    source: Literal["imdb", "kaggle"]
+    id: int
+
+
+class IndexRefreshRequest(BaseModel):
+    updated: List[MovieKey] = []
+    deleted: List[MovieKey] = []
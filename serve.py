@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+import uvicorn
+
+if __name__ == "__main__":
+    # Step 1: Options
+    parser = argparse.ArgumentParser(description="Run the API with N workers sharing one memory-mapped index.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shared-dir", default=os.getenv("RECOMMENDER_SHARED_DIR", "artifacts/shared"))
+    args = parser.parse_args()
+
+    # Step 2: Workers inherit the environment, so they attach instead of building
+    os.environ["RECOMMENDER_SHARED_DIR"] = os.path.abspath(args.shared_dir)
+    os.makedirs(args.shared_dir, exist_ok=True)
+
+    import collaborative
+    import main
+    import shared_serving
+
+    # Step 3: Build (or map) the index, train the collaborative model and publish both
+    main.start_engines()
+    coordinator = shared_serving.Coordinator(os.environ["RECOMMENDER_SHARED_DIR"], main.recommender_engine,
+                                             collaborative.collaborative_engine)
+    coordinator.start()
+    if shared_serving.read_current(coordinator.shared_dir) is None:
+        # Workers would only wait for a generation that never comes
+        print("❌ The initial index build failed, so there is nothing to publish; see the log above.")
+        sys.exit(1)
+    print(f"📣 Publishing index generations to '{coordinator.shared_dir}' for {args.workers} workers")
+
+    # Step 4: Serve; the workers memory-map each published generation
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        coordinator.stop()
+        main.recommender_engine.stop_polling()
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import collaborative
+import index_artifact
+from metrics import stage
+from recommender import RecommenderSnapshot
+
+logger = logging.getLogger(__name__)
+
+# 🧩 Shared serving (serve.py): the parent builds each generation once into this directory and
+# every uvicorn worker memory-maps it. Unset for a plain single-process `uvicorn main:app`.
+SHARED_DIR = os.getenv("RECOMMENDER_SHARED_DIR", "")
+POLL_SECONDS = float(os.getenv("RECOMMENDER_SHARED_POLL_SECONDS", "1"))
+# Generations kept on disk; older ones are deleted (workers still mapping them keep their pages)
+KEEP_GENERATIONS = int(os.getenv("RECOMMENDER_SHARED_KEEP", "3"))
+# How long a starting worker waits for the parent's first generation before failing its startup
+STARTUP_WAIT_SECONDS = float(os.getenv("RECOMMENDER_SHARED_STARTUP_WAIT", "600"))
+
+CURRENT_FILE = "CURRENT"
+REQUESTS_DIR = "requests"
+COLLABORATIVE_DIR = "collaborative"
+GENERATION_PREFIX = "gen-"
+
+
+def read_current(shared_dir):
+    """
+    Directory name of the published generation, or None before the first one.
+    """
+    try:
+        with open(os.path.join(shared_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def attach(generation_dir):
+    """
+    `(snapshot, cf_index, cf_version)` for a published generation. Vectors, index, catalog
+    columns and tables are memory-mapped, so attaching costs no copy of them.
+    """
+    with stage("shared.attach"):
+        artifact = index_artifact.load_artifact(generation_dir)
+        manifest = artifact.manifest
+        if not manifest.get("catalog"):
+            raise index_artifact.StaleArtifactError(f"'{generation_dir}' was saved without its catalog")
+
+        snapshot = RecommenderSnapshot(
+            artifact.catalog_df, artifact.vectorizer, artifact.vector_matrix, artifact.faiss_index,
+            manifest["generation"], artifact.projection, live_mask=artifact.live_mask, drift=manifest.get("drift"),
+            lineage=manifest.get("lineage"), neighbours=artifact.neighbours, titles=artifact.titles,
+            index_mapped=True,
+        )
+
+        cf_index, cf_version = None, 0
+        cf_dir = os.path.join(generation_dir, COLLABORATIVE_DIR)
+        if os.path.exists(cf_dir):
+            cf_index, cf_version = collaborative.load_index(cf_dir)
+    return snapshot, cf_index, cf_version
+
+
+def submit(shared_dir, action, **params):
+    """
+    Queue an admin action (reload, refresh, train) for the parent process, which owns the build.
+    """
+    requests_dir = os.path.join(shared_dir, REQUESTS_DIR)
+    os.makedirs(requests_dir, exist_ok=True)
+    name = f"{time.time():.6f}-{uuid.uuid4().hex}.json"
+    tmp_path = os.path.join(requests_dir, f".{name}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"action": action, **params}, f)
+    os.replace(tmp_path, os.path.join(requests_dir, name))
+    return {"status": "queued", "action": action}
+
+
+class Coordinator:
+    """
+    Parent side. Publishes every new content generation or collaborative model as a
+    complete directory, then flips CURRENT to it in one rename, so workers only ever
+    see whole generations. Files unchanged since the previous generation are hard links
+    to it. Also carries out the admin actions workers queue.
+    """
+
+    def __init__(self, shared_dir, content_engine, collaborative_engine):
+        self.shared_dir = shared_dir
+        self._content = content_engine
+        self._collaborative = collaborative_engine
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._published = None
+        self._published_path = None
+        self._published_snapshot = None
+        self._sequence = max([_sequence(name) for name in self._generations()] or [0])
+
+    def start(self):
+        """
+        Publish the current state, follow both engines and start serving worker requests.
+        Register after `collaborative_engine.start()` so the model is re-aligned before a
+        new content generation is written.
+        """
+        os.makedirs(os.path.join(self.shared_dir, REQUESTS_DIR), exist_ok=True)
+        self._content.add_reload_listener(lambda snapshot: self.publish())
+        self._collaborative.add_listener(self.publish)
+        self.publish()
+
+        def run():
+            while not self._stop.wait(POLL_SECONDS):
+                try:
+                    self.handle_requests()
+                except Exception as e:
+                    logger.exception(f"❌ Shared-serving request failed: {e}")
+
+        threading.Thread(target=run, name="shared-coordinator", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self):
+        """
+        Write the current snapshot and collaborative index as the next generation.
+        Returns its directory, or None when there was nothing new.
+        """
+        with self._lock:
+            snapshot = self._content.snapshot
+            if snapshot is None:
+                return None
+            cf_index = self._collaborative.index_for(snapshot)
+            state = (snapshot.generation, self._collaborative.version, cf_index is not None)
+            if state == self._published:
+                return None
+
+            self._sequence += 1
+            name = f"{GENERATION_PREFIX}{self._sequence:08d}"
+            path = os.path.join(self.shared_dir, name)
+            with stage("shared.publish"):
+                # Only what changed since the last generation is written; the rest (all of it for a
+                # new model, the vectorizer and neighbour table for a refresh) is hard-linked from it
+                previous = (self._published_path, self._published_snapshot) if self._published_path else None
+                index_artifact.save_artifact(path, snapshot, include_catalog=True, previous=previous)
+                if cf_index is not None:
+                    collaborative.save_index(cf_index, os.path.join(path, COLLABORATIVE_DIR),
+                                             self._collaborative.version)
+                self._write_current(name)
+
+            self._published = state
+            self._published_path = path
+            self._published_snapshot = snapshot
+            self._prune(name)
+        logger.info("📣 Published shared generation", extra={"path": path, "generation": snapshot.generation,
+                                                            "cf_version": state[1]})
+        return path
+
+    def handle_requests(self):
+        """
+        Run the admin actions workers have queued, oldest first.
+        """
+        requests_dir = os.path.join(self.shared_dir, REQUESTS_DIR)
+        for name in sorted(os.listdir(requests_dir)):
+            if name.startswith("."):
+                continue
+            path = os.path.join(requests_dir, name)
+            with open(path, encoding="utf-8") as f:
+                request = json.load(f)
+            os.remove(path)
+
+            action = request.get("action")
+            if action == "reload":
+                self._content.reload_in_background()
+            elif action == "refresh":
+                self._content.refresh(
+                    updated_keys=[tuple(key) for key in request.get("updated", [])],
+                    deleted_keys=[tuple(key) for key in request.get("deleted", [])],
+                )
+            elif action == "train":
+                self._collaborative.train_in_background()
+            else:
+                logger.warning(f"⚠️ Unknown shared-serving action '{action}'")
+
+    def _write_current(self, name):
+        tmp_path = os.path.join(self.shared_dir, f".{CURRENT_FILE}-{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(tmp_path, os.path.join(self.shared_dir, CURRENT_FILE))
+
+    def _generations(self):
+        if not os.path.isdir(self.shared_dir):
+            return []
+        return sorted(name for name in os.listdir(self.shared_dir) if name.startswith(GENERATION_PREFIX))
+
+    def _prune(self, current):
+        for name in self._generations()[:-KEEP_GENERATIONS]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.shared_dir, name), ignore_errors=True)
+
+
+class Follower:
+    """
+    Worker side. Attaches to the published generation and swaps in each new one
+    as CURRENT changes; requests in flight keep the snapshot they started with.
+    """
+
+    def __init__(self, shared_dir, content_engine, collaborative_engine):
+        self.shared_dir = shared_dir
+        self._content = content_engine
+        self._collaborative = collaborative_engine
+        self._current = None
+        self._stop = threading.Event()
+
+    async def start(self, wait_seconds=STARTUP_WAIT_SECONDS):
+        """
+        Attach to the current generation, then keep following it on a daemon thread.
+        Waits up to `wait_seconds` for the parent's first one without blocking the event
+        loop, and raises RuntimeError if none appears, so the worker fails its startup.
+        """
+        deadline = time.monotonic() + wait_seconds
+        while not await asyncio.to_thread(self.poll):
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"No shared generation in '{self.shared_dir}' after {wait_seconds:.0f}s; "
+                                   f"is the serve.py parent running, and did its index build succeed?")
+            await asyncio.sleep(POLL_SECONDS)
+
+        def run():
+            while not self._stop.wait(POLL_SECONDS):
+                self.poll()
+
+        threading.Thread(target=run, name="shared-follower", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """
+        Switch to the published generation if it changed. Returns True once attached.
+        """
+        name = read_current(self.shared_dir)
+        if name is None or name == self._current:
+            return self._current is not None
+        try:
+            snapshot, cf_index, cf_version = attach(os.path.join(self.shared_dir, name))
+        except (FileNotFoundError, index_artifact.StaleArtifactError) as e:
+            # Pruned or replaced while we were reading it; the next poll sees the newer one
+            logger.warning(f"⚠️ Could not attach shared generation '{name}': {e}")
+            return self._current is not None
+
+        self._collaborative.install(cf_index, cf_version)
+        self._content.install(snapshot)
+        self._current = name
+        logger.info("🔗 Attached shared generation", extra={"shared_generation": name, "generation": snapshot.generation})
+        return True
+
+
+def _sequence(name):
+    try:
+        return int(name[len(GENERATION_PREFIX):])
+    except ValueError:
+        return 0
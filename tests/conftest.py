@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app modules from the repository root and never need a real PostgreSQL
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'movies.db')}")
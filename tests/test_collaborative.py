@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+pytest.importorskip("faiss")
+
+import collaborative
+import recommender
+
+WORDS = [f"word{i}" for i in range(200)]
+
+
+def movies(n, start_id, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": range(start_id, start_id + n),
+        "title": [" ".join(rng.choice(WORDS, 3)) for _ in range(n)],
+        "year": 2000,
+        "rating": 7.0,
+        "genres": "Action",
+        "director": "Someone",
+        "stars": "Someone Else",
+        "description": [" ".join(rng.choice(WORDS, 12)) for _ in range(n)],
+    })
+
+
+def weights(users, items, density, seed):
+    rng = np.random.default_rng(seed)
+    return sparse.random(users, items, density=density, format="csr", dtype=np.float32, random_state=rng,
+                         data_rvs=lambda n: rng.integers(1, 4, n).astype(np.float32))
+
+
+@pytest.mark.parametrize("block_events", [7, 1 << 20])
+def test_least_squares_matches_exact_solve(block_events):
+    matrix = weights(30, 20, 0.2, seed=0)
+    confidence = matrix * np.float32(collaborative.ALPHA)
+    rng = np.random.default_rng(1)
+    X = rng.standard_normal((30, 4)).astype(np.float32) * 0.01
+    Y = rng.standard_normal((20, 4)).astype(np.float32)
+    regularization = 0.1
+
+    # Enough conjugate-gradient steps to converge on a 4-dimensional system
+    collaborative._least_squares(confidence, X, Y, regularization, cg_steps=12, block_events=block_events)
+
+    dense = confidence.toarray()
+    for u in range(30):
+        c = dense[u]
+        A = Y.T @ Y + Y.T @ (c[:, None] * Y) + regularization * np.eye(4)
+        b = Y.T @ ((c + 1) * (c > 0))
+        np.testing.assert_allclose(X[u], np.linalg.solve(A, b), rtol=1e-3, atol=1e-4)
+
+
+def test_als_separates_co_consumed_items():
+    # Two audiences, each interacting only with its own half of the catalog
+    rng = np.random.default_rng(0)
+    rows, cols = [], []
+    for user in range(60):
+        items = rng.choice(10, 5, replace=False) + (10 if user % 2 else 0)
+        rows += [user] * 5
+        cols += items.tolist()
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(60, 20))
+
+    user_factors, item_factors = collaborative.train_als(matrix, factors=8, iterations=10)
+
+    # Every user scores the items of their own half they haven't seen above the other half
+    scores = user_factors @ item_factors.T
+    own = (np.arange(20) // 10)[None, :] == (np.arange(60) % 2)[:, None]
+    unseen = own & (matrix.toarray() == 0)
+    assert all(scores[u, unseen[u]].mean() > scores[u, ~own[u]].mean() for u in range(60))
+
+    # Items of the same half point the same way; across halves they are close to orthogonal
+    normed = item_factors / np.linalg.norm(item_factors, axis=1, keepdims=True)
+    similarity = normed @ normed.T
+    same = (np.arange(20) // 10)[:, None] == (np.arange(20) // 10)[None, :]
+    assert similarity[same & ~np.eye(20, dtype=bool)].mean() > 10 * abs(similarity[~same].mean())
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return recommender.build_snapshot(movies(300, 1, seed=0), movies(100, 1, seed=1), deduplicate=False)
+
+
+@pytest.fixture(scope="module")
+def cf_index(snapshot):
+    rng = np.random.default_rng(2)
+    df = snapshot.combined_df
+    # Factors for every other row; the rest are cold and fall back to content
+    items = np.arange(0, len(df), 2)
+    keys = pd.DataFrame({"source": df["source"].astype(str).to_numpy()[items],
+                         "movie_id": df["id"].to_numpy(dtype=np.int64)[items]})
+    model = collaborative.CollaborativeModel(keys, rng.standard_normal((len(items), 16)).astype(np.float32))
+    return collaborative.align(model, snapshot, index_kind="flat")
+
+
+def test_train_maps_events_to_rows(snapshot):
+    df = snapshot.combined_df
+    events = pd.DataFrame({"user_id": [1, 1, 2, 2, 3], "source": ["imdb", "kaggle", "imdb", "kaggle", "kaggle"],
+                           "movie_id": [5, 7, 5, 7, 99999], "weight": [1.0, 1.0, 1.0, 1.0, 1.0]})
+    model = collaborative.train(events, snapshot, factors=4, iterations=2)
+
+    # The unknown movie is dropped; the two known ones keep their keys
+    assert sorted(zip(model.keys["source"], model.keys["movie_id"])) == [("imdb", 5), ("kaggle", 7)]
+    assert (model.users, model.events) == (2, 4)
+    aligned = collaborative.align(model, snapshot, index_kind="flat")
+    known_rows = np.flatnonzero(aligned.known)
+    assert sorted(zip(df["source"].astype(str).to_numpy()[known_rows], df["id"].to_numpy()[known_rows])) == \
+        [("imdb", 5), ("kaggle", 7)]
+
+
+@pytest.mark.parametrize("weight", [0.0, 0.3, 1.0])
+def test_hybrid_blend_reranks_pooled_candidates(snapshot, cf_index, weight):
+    rows = np.flatnonzero(cf_index.known)[:10]
+    top_n = 5
+    found = recommender._hybrid_neighbours(snapshot, cf_index, rows, top_n, None, None, None, weight)
+
+    pool = top_n * collaborative.HYBRID_POOL
+    content = recommender._neighbours(snapshot, rows, pool, None, None, None)
+    cf = recommender._cf_neighbours(cf_index, rows, pool, None)
+    for row, result, a, b in zip(rows, found, content, cf):
+        candidates = np.array(list(dict.fromkeys(a + b)))
+        content_scores = np.asarray((snapshot.row_vectors([row]) @ snapshot.row_vectors(candidates).T).todense()).ravel()
+        cf_scores = cf_index.vectors[candidates] @ cf_index.vectors[row]
+        blended = (1 - weight) * content_scores + weight * cf_scores
+        expected = candidates[np.argsort(-blended, kind="stable")[:top_n]]
+        assert result == expected.tolist()
+        if weight == 0.0:
+            assert result == a[:top_n]
+        if weight == 1.0:
+            assert result == b[:top_n]
+
+
+def test_hybrid_mode_falls_back_to_content_for_cold_rows(snapshot, cf_index):
+    titles = snapshot.combined_df["title"]
+    cold = int(np.flatnonzero(~cf_index.known)[0])
+    query = [{"title": titles.iloc[cold]}]
+    content = recommender.get_batch_recommendations(query, top_n=5, snapshot=snapshot)
+    hybrid = recommender.get_batch_recommendations(query, top_n=5, snapshot=snapshot, mode="hybrid",
+                                                   cf_index=cf_index, weight=0.5)
+    assert hybrid == content
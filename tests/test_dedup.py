@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+pytest.importorskip("faiss")
+
+import catalog
+import dedup
+import index_artifact
+import recommender
+import shared_serving
+
+
+def frame(rows):
+    return catalog.compact_frame(pd.DataFrame.from_records(rows, columns=catalog.CATALOG_COLUMNS))
+
+
+def movie(movie_id, title, year=1999, rating=8.0, genres="Action", director="Lana Wachowski",
+          stars="Keanu Reeves", description="a hacker learns the world is a simulation"):
+    return (movie_id, title, year, rating, genres, director, stars, description)
+
+
+IMDB = frame([
+    movie(1, "The Matrix", rating=8.7, genres="Action, Sci-Fi", stars="Keanu Reeves, Carrie-Anne Moss"),
+    movie(2, "Heat", year=1995, director="Michael Mann", stars="Al Pacino",
+          description="a detective hunts a crew of bank robbers in los angeles"),
+    movie(3, "Solaris", year=1972, director="Andrei Tarkovsky", stars="Donatas Banionis",
+          description="a psychologist is sent to a space station orbiting an ocean planet"),
+])
+KAGGLE = frame([
+    movie(11, "Matrix, The", rating=8.1, genres="Sci-Fi, Thriller", director="", stars="Laurence Fishburne, Keanu Reeves"),
+    movie(12, "Heat", year=1986, director="Dick Richards", stars="Burt Reynolds",
+          description="a las vegas bodyguard takes revenge on a mobster"),
+    movie(13, "Solaris", year=1972, director="Steven Soderbergh", stars="George Clooney",
+          description="romance drama remake with grief and memory themes"),
+])
+
+
+def combined():
+    combined_df = recommender.movies_to_df(IMDB, KAGGLE)
+    vectorizer, tfidf_matrix = recommender.fit_tfidf(combined_df)
+    return combined_df, vectorizer, tfidf_matrix
+
+
+def test_normalize_titles_ignores_case_punctuation_and_articles():
+    keys = dedup.normalize_titles(pd.Series(["The Matrix", "Matrix, The", "the matrix!", "A Matrix", "Matrices"]))
+    assert keys.tolist() == ["matrix", "matrix", "matrix", "matrix", "matrices"]
+
+
+def test_blocks_on_title_and_year():
+    combined_df, _, tfidf_matrix = combined()
+    # Same normalized title and year merges, canonical IMDb row first; Heat differs in year,
+    # and the two Solaris rows share title and year but not enough text
+    assert dedup.find_duplicates(combined_df, tfidf_matrix) == [[0, 3]]
+
+
+def test_similarity_cutoff():
+    df = catalog.combine_sources(frame([movie(1, "Heat"), movie(2, "Heat")]), frame([movie(3, "Heat")]))
+
+    def unit(cosine):
+        return [cosine, np.sqrt(1 - cosine ** 2)]
+
+    tfidf_matrix = sparse.csr_matrix(np.array([[1.0, 0.0], unit(0.49), unit(0.51)]))
+    assert dedup.find_duplicates(df, tfidf_matrix, min_similarity=0.5) == [[0, 2]]
+    assert dedup.find_duplicates(df, tfidf_matrix, min_similarity=0.4) == [[0, 1, 2]]
+    assert dedup.find_duplicates(df, tfidf_matrix, min_similarity=0.6) == []
+
+
+def test_merge_fields_and_provenance():
+    combined_df, _, _ = combined()
+    merged_df, kept_rows, merged_rows = dedup.merge_groups(combined_df, [[0, 3]])
+
+    assert kept_rows.tolist() == [0, 1, 2, 4, 5]
+    assert merged_rows.tolist() == [0]
+    record = catalog.MovieCatalog(merged_df, list(merged_df.columns)).records([0])[0]
+    assert record["title"] == "The Matrix"
+    assert record["rating"] == 8.4
+    assert record["genres"] == "Action, Sci-Fi, Thriller"
+    assert record["stars"] == "Keanu Reeves, Carrie-Anne Moss, Laurence Fishburne"
+    assert record["director"] == "Lana Wachowski"
+    assert record[catalog.PROVENANCE_COLUMN] == "kaggle:11"
+    assert record[catalog.ALIAS_COLUMN] == "Matrix, The"
+    # Untouched rows keep their fields and order
+    assert merged_df["title"].tolist() == ["The Matrix", "Heat", "Solaris", "Heat", "Solaris"]
+    assert (merged_df[catalog.PROVENANCE_COLUMN].astype(str).iloc[1:] == "").all()
+
+
+def test_missing_fields_filled_from_duplicates():
+    records = [{"title": "Heat", "year": None, "rating": None, "genres": "", "director": "", "stars": "",
+                "description": "", catalog.ALIAS_COLUMN: ""},
+               {"title": "heat ", "year": 1995, "rating": 8.3, "genres": "Crime", "director": "Michael Mann",
+                "stars": "Al Pacino", "description": "bank robbers", "source": "kaggle", "id": 7}]
+    merged = dedup._merge_records(records)
+    assert (merged["year"], merged["rating"], merged["director"], merged["description"]) == \
+        (1995, 8.3, "Michael Mann", "bank robbers")
+    # Differs only in case and whitespace, so it's no alias
+    assert merged[catalog.ALIAS_COLUMN] == ""
+
+
+def test_provenance_round_trip():
+    assert dedup.parse_provenance(dedup.format_provenance([{"source": "kaggle", "id": 12}, {"source": "imdb", "id": 40}])) \
+        == [("kaggle", 12), ("imdb", 40)]
+    assert dedup.parse_provenance("") == []
+
+    combined_df, vectorizer, tfidf_matrix = combined()
+    merged_df, _ = dedup.deduplicate(combined_df, vectorizer, tfidf_matrix)
+    replayed = dedup.apply_provenance(recommender.movies_to_df(IMDB, KAGGLE), index_artifact.row_keys(merged_df),
+                                      merged_df[catalog.PROVENANCE_COLUMN].astype(str).tolist())
+    pd.testing.assert_frame_equal(replayed, merged_df)
+
+    with pytest.raises(KeyError):
+        dedup.apply_provenance(recommender.movies_to_df(IMDB, KAGGLE.iloc[1:]), index_artifact.row_keys(merged_df),
+                               merged_df[catalog.PROVENANCE_COLUMN].astype(str).tolist())
+
+
+def test_merged_alias_title_lookup(tmp_path):
+    built = recommender.build_snapshot(IMDB, KAGGLE, deduplicate=True)
+    artifact_dir = str(tmp_path / "artifact")
+    index_artifact.save_artifact(artifact_dir, built, include_catalog=True)
+    loaded = recommender.load_snapshot(artifact_dir, IMDB, KAGGLE)
+    attached, _, _ = shared_serving.attach(artifact_dir)
+
+    for snapshot in (built, loaded, attached):
+        row = snapshot.find_title("The Matrix")
+        assert row is not None
+        assert snapshot.find_title("  matrix, THE ") == row
+        assert snapshot.find_title("Matrix") is None
+        assert recommender.get_combined_recommendations(title="Matrix, The", top_n=2, snapshot=snapshot)
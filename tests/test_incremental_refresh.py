@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("faiss")
+
+import index_artifact
+import recommender
+
+WORDS = [f"word{i}" for i in range(300)]
+
+
+def movies(n, start_id, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": range(start_id, start_id + n),
+        "title": [" ".join(rng.choice(WORDS, 3)) for _ in range(n)],
+        "year": 2000,
+        "rating": 7.0,
+        "genres": "Action",
+        "director": "Someone",
+        "stars": "Someone Else",
+        "description": [" ".join(rng.choice(WORDS, 12)) for _ in range(n)],
+    })
+
+
+@pytest.mark.parametrize("index_kind", ["flat", "ivf"])
+def test_refresh_extends_memory_mapped_artifact(tmp_path, index_kind):
+    imdb, kaggle = movies(2500, 1, seed=0), movies(20, 1, seed=1)
+    built = recommender.build_snapshot(imdb, kaggle, embedding="svd", svd_dim=32, index_kind=index_kind,
+                                       deduplicate=False)
+    artifact_dir = str(tmp_path / "artifact")
+    index_artifact.save_artifact(artifact_dir, built)
+
+    added = movies(5, 5000, seed=2)
+    engine = recommender.RecommenderEngine()
+    engine.start(lambda: (imdb, kaggle), artifact_dir=artifact_dir,
+                 delta_loader=lambda marks, keys: (added, kaggle.iloc[:0]))
+    assert engine.snapshot.index_mapped
+
+    summary = engine.refresh()
+
+    snapshot = engine.snapshot
+    assert summary["mode"] == "incremental"
+    assert summary["rows_added"] == len(added)
+    assert snapshot.faiss_index.ntotal == len(imdb) + len(kaggle) + len(added)
+    assert not snapshot.index_mapped
+
+    title = added["title"].iloc[0]
+    assert snapshot.find_title(title) == len(imdb) + len(kaggle)
+    assert recommender.get_combined_recommendations(title=title, top_n=5, snapshot=snapshot)
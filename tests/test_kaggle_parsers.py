@@ -0,0 +1,59 @@
+import ast
+
+import pytest
+
+from kaggle_merge_script import parse_cast, parse_crew, parse_genres
+
+# Cells as they appear in the Kaggle CSVs: repr() of lists of flat dicts, so names with an
+# apostrophe are double-quoted and names with both quote kinds carry escapes
+GENRES = repr([{"id": 18, "name": "Drama"}, {"id": 10749, "name": "Romance"}, {"id": 35, "name": "Rock'n'Roll"}])
+CREW = repr([
+    {"credit_id": "52fe4", "department": "Directing", "gender": 2, "id": 7879, "job": "Director",
+     "name": "John Lasseter", "profile_path": "/7EdqiNbr4FRjIhKHyPPdFfEEEFG.jpg"},
+    {"credit_id": "52fe5", "department": "Writing", "gender": 2, "id": 12891, "job": "Screenplay",
+     "name": "Joss Whedon", "profile_path": None},
+    {"credit_id": "52fe6", "department": "Directing", "gender": 1, "id": 4, "job": "Director",
+     "name": "Mary O'Brien \"Mo\"", "profile_path": None},
+])
+CAST = repr([
+    {"cast_id": 14, "character": "Woody (voice)", "credit_id": "a", "gender": 2, "id": 31, "name": "Tom Hanks",
+     "order": 0, "profile_path": "/pQFoyx7rp09CJTAb932F2g8Nlho.jpg"},
+    {"cast_id": 15, "character": "Buzz", "credit_id": "b", "gender": 2, "id": 12898, "name": "Tim Allen",
+     "order": 1, "profile_path": None},
+    {"cast_id": 16, "character": "Mr. Potato Head", "credit_id": "c", "gender": 2, "id": 7167,
+     "name": "Don Rickles", "order": 2, "profile_path": None},
+    {"cast_id": 17, "character": "Slinky", "credit_id": "d", "gender": 2, "id": 12899, "name": "Jim Varney",
+     "order": 3, "profile_path": None},
+])
+
+
+def literal_genres(x):
+    return ", ".join(entry["name"] for entry in ast.literal_eval(x))
+
+
+def literal_crew(x):
+    return ", ".join(entry["name"] for entry in ast.literal_eval(x) if entry["job"] == "Director")
+
+
+def literal_cast(x):
+    return ", ".join(entry["name"] for entry in ast.literal_eval(x)[:3])
+
+
+@pytest.mark.parametrize("parse, literal, cell", [
+    (parse_genres, literal_genres, GENRES),
+    (parse_crew, literal_crew, CREW),
+    (parse_cast, literal_cast, CAST),
+])
+def test_regex_parsers_match_literal_eval(parse, literal, cell):
+    assert parse(cell) == literal(cell)
+
+
+def test_quoted_and_escaped_names():
+    assert parse_genres(GENRES) == "Drama, Romance, Rock'n'Roll"
+    assert parse_crew(CREW) == "John Lasseter, Mary O'Brien \"Mo\""
+    assert parse_cast(CAST) == "Tom Hanks, Tim Allen, Don Rickles"
+
+
+@pytest.mark.parametrize("cell", ["[]", float("nan"), None])
+def test_empty_and_missing_cells(cell):
+    assert parse_genres(cell) == parse_crew(cell) == parse_cast(cell) == ""
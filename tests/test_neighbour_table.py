@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("faiss")
+
+import neighbour_table
+import recommender
+
+WORDS = [f"word{i}" for i in range(300)]
+
+
+def movies(n, start_id, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": range(start_id, start_id + n),
+        "title": [" ".join(rng.choice(WORDS, 3)) for _ in range(n)],
+        "year": 2000,
+        "rating": rng.integers(1, 10, n).astype(float),
+        "genres": "Action",
+        "director": "Someone",
+        "stars": "Someone Else",
+        "description": [" ".join(rng.choice(WORDS, 12)) for _ in range(n)],
+    })
+
+
+def live_neighbours(snapshot, rows, top_n, allowed, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(snapshot, "neighbours", None)
+        return recommender._neighbours(snapshot, rows, top_n, allowed, None, None)
+
+
+@pytest.fixture(scope="module", params=["svd", "sparse"])
+def snapshot(request):
+    return recommender.build_snapshot(movies(400, 1, seed=0), movies(100, 1, seed=1), embedding=request.param,
+                                      svd_dim=32, index_kind="flat", deduplicate=False, neighbours_k=20)
+
+
+@pytest.mark.parametrize("min_rating", [None, 5])
+def test_table_lookup_matches_live_search(snapshot, min_rating, monkeypatch):
+    rows = list(range(0, 500, 7))
+    allowed = None if min_rating is None else snapshot.combined_df["rating"].to_numpy() >= min_rating
+
+    from_table = recommender._table_neighbours(snapshot, rows, 8, allowed)
+    served = [j for j, found in enumerate(from_table) if found is not None]
+    assert len(served) > 0.9 * len(rows)
+    live = live_neighbours(snapshot, [rows[j] for j in served], 8, allowed, monkeypatch)
+    assert [from_table[j] for j in served] == live
+
+
+def test_stored_k_too_small_for_filter_falls_back_to_live(snapshot):
+    allowed = np.zeros(len(snapshot.combined_df), dtype=bool)
+    allowed[::50] = True
+    assert recommender._table_neighbours(snapshot, [1, 2, 3], 10, allowed) == [None, None, None]
+
+
+def test_rows_added_after_the_table_are_merged_in(snapshot):
+    # New rows that copy existing ones, so each stored neighbour ties with its copy; float16
+    # table scores must not decide those ties differently from a live search
+    extended = recommender.extend_snapshot(snapshot, movies(400, 9000, seed=0), movies(0, 1, seed=0), generation=1)
+    assert extended.neighbours is snapshot.neighbours
+    assert extended.neighbours.size < len(extended.combined_df)
+
+    rows = list(range(0, 400, 5))
+    from_table = recommender._table_neighbours(extended, rows, 10, None)
+
+    # Exact float32 ranking over every row, ties broken on row id
+    candidates = np.arange(len(extended.combined_df))
+    for row, found in zip(rows, from_table):
+        scores = recommender._exact_scores(extended, row, candidates)
+        order = [int(i) for i in np.lexsort((candidates, -scores)) if i != row][:10]
+        assert found == order
+
+
+def test_compute_is_independent_of_batching(snapshot):
+    small = neighbour_table.compute(snapshot, k=20, batch_rows=32, workers=2)
+    np.testing.assert_array_equal(small.ids, snapshot.neighbours.ids)
+    np.testing.assert_array_equal(small.scores, snapshot.neighbours.scores)
@@ -0,0 +1,77 @@
+import base64
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import crud
+import models
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.create_tables(engine)
+    with Session(engine) as session:
+        for i in range(1, 41):
+            # Every fourth movie has no year, so year order ends in a NULL tail
+            session.add(models.IMDbMovie(title=f"Movie {i % 9}", year=None if i % 4 == 0 else 1990 + i % 5,
+                                         rating=float(i % 7)))
+        session.commit()
+        yield session
+
+
+def pages(db, sort_by, limit):
+    found, cursor = [], None
+    while True:
+        page = crud.get_imdb_movies(db, sort_by=sort_by, limit=limit, cursor=cursor)
+        found += page
+        if len(page) < limit:
+            return found
+        cursor = crud.encode_cursor(sort_by, page[-1], "imdb")
+
+
+@pytest.mark.parametrize("sort_by", ["year", "title", "rating"])
+def test_keyset_pages_match_one_ordered_read(db, sort_by):
+    expected = [movie.id for movie in crud.get_imdb_movies(db, sort_by=sort_by, limit=crud.MAX_PAGE_SIZE)]
+    assert [movie.id for movie in pages(db, sort_by, 7)] == expected
+
+
+def test_null_tail_is_paged_in_id_order(db):
+    found = pages(db, "year", 3)
+    years = [movie.year for movie in found]
+    tail = [movie.id for movie in found if movie.year is None]
+
+    assert years[-len(tail):] == [None] * len(tail)
+    assert tail == sorted(tail) and len(tail) == 10
+
+    # A cursor inside the tail continues with the rest of it only
+    cursor = crud.encode_cursor("year", found[-len(tail)], "imdb")
+    assert [movie.id for movie in crud.get_imdb_movies(db, sort_by="year", cursor=cursor)] == tail[1:]
+
+
+def test_cursor_for_another_sort_order_is_rejected(db):
+    cursor = crud.encode_cursor("title", crud.get_imdb_movies(db, limit=1)[0], "imdb")
+    with pytest.raises(ValueError, match="different sort order"):
+        crud.get_imdb_movies(db, sort_by="year", cursor=cursor)
+
+
+def encode(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    encode({"sort": "year", "value": [1990], "id": 3}),
+    encode({"sort": "title", "value": {"a": 1}, "id": 3}),
+    encode({"sort": "year", "value": "1990", "id": 3}),
+    encode({"sort": "rating", "value": True, "id": 3}),
+    encode({"sort": "title", "value": "x", "id": "three"}),
+    encode({"sort": "runtime", "value": 90, "id": 3}),
+    encode({"sort": "title", "value": "x"}),
+    encode({"sort": "title", "value": "Movie 1", "id": 3})[:-6],
+    "not a cursor!",
+])
+def test_tampered_or_truncated_cursors_are_invalid(db, cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        crud.decode_cursor(cursor)
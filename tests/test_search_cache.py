@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import models
+import routes
+from bulk_loader import load_dataframe
+from database import get_db
+from recommender import RecommenderEngine
+from response_cache import ResponseCache, TTLCache
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/movies.db")
+    models.create_tables(engine)
+    return engine
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    recommender = RecommenderEngine()
+    cache = ResponseCache(TTLCache())
+    # Same wiring as main.py's lifespan
+    recommender.add_reload_listener(lambda snapshot: cache.invalidate())
+    recommender.add_reload_listener(lambda snapshot: routes.catalog_version_cache.clear())
+    monkeypatch.setattr(routes, "recommender_engine", recommender)
+    monkeypatch.setattr(routes, "response_cache", cache)
+    monkeypatch.setattr(routes, "catalog_version_cache", TTLCache(max_entries=1, ttl=60))
+
+    def get_test_db():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[get_db] = get_test_db
+    client = TestClient(app)
+    client.recommender = recommender
+    return client
+
+
+def movies(*titles):
+    return pd.DataFrame({"title": list(titles), "year": 2000, "rating": 7.0, "genres": "Drama",
+                         "description": "", "director": "", "stars": ""})
+
+
+def titles(client):
+    response = client.get("/search", params={"query": "heat"})
+    return sorted(movie["title"] for movie in response.json()) if response.status_code == 200 else []
+
+
+def test_bulk_load_invalidates_cached_pages(client, engine):
+    load_dataframe(engine, movies("Heat"), "movies")
+    assert titles(client) == ["Heat"]
+
+    load_dataframe(engine, movies("Heat Wave"), "movies")
+    # The load bumped the version; the process sees it once its cached copy expires
+    routes.catalog_version_cache.clear()
+    assert titles(client) == ["Heat", "Heat Wave"]
+    assert client.recommender.generation == 0
+
+
+def test_reload_invalidates_cached_pages(client, engine):
+    load_dataframe(engine, movies("Heat"), "movies")
+    assert titles(client) == ["Heat"]
+
+    # A write that bypasses the bulk loader keeps serving the cached page ...
+    with Session(engine) as session:
+        session.add(models.IMDbMovie(title="Heat Wave", year=2001))
+        session.commit()
+    assert titles(client) == ["Heat"]
+
+    # ... until the next generation is published
+    client.recommender.install(SimpleNamespace(generation=1))
+    assert titles(client) == ["Heat", "Heat Wave"]
+
+
+def test_version_is_bumped_once_per_load(engine):
+    with Session(engine) as session:
+        before = session.get(models.CatalogVersion, 1).version
+    load_dataframe(engine, movies(*[f"Movie {i}" for i in range(2500)]), "movies")
+    load_dataframe(engine, movies("Heat"), "unrelated_table")
+    with Session(engine) as session:
+        assert session.get(models.CatalogVersion, 1).version == before + 1
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("faiss")
+
+import collaborative
+import index_artifact
+import neighbour_table
+import recommender
+import shared_serving
+
+WORDS = [f"word{i}" for i in range(300)]
+
+
+def movies(n, start_id, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": range(start_id, start_id + n),
+        "title": [" ".join(rng.choice(WORDS, 3)) for _ in range(n)],
+        "year": 2000,
+        "rating": 7.0,
+        "genres": "Action",
+        "director": "Someone",
+        "stars": "Someone Else",
+        "description": [" ".join(rng.choice(WORDS, 12)) for _ in range(n)],
+    })
+
+
+@pytest.fixture
+def parent(tmp_path, monkeypatch):
+    monkeypatch.setattr(neighbour_table, "IN_PROCESS", True)
+    imdb, kaggle = movies(300, 1, seed=0), movies(50, 1, seed=1)
+    content = recommender.RecommenderEngine()
+    # Each refresh finds the rows queued in `content.added`
+    content.added = movies(0, 1, seed=0)
+    content.start(lambda: (imdb, kaggle), delta_loader=lambda marks, keys: (content.added, kaggle.iloc[:0]))
+    coordinator = shared_serving.Coordinator(str(tmp_path / "shared"), content, collaborative.CollaborativeEngine())
+    yield coordinator
+    coordinator.stop()
+
+
+def follower(shared_dir):
+    return shared_serving.Follower(shared_dir, recommender.RecommenderEngine(), collaborative.CollaborativeEngine())
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(shared_serving, "POLL_SECONDS", 0.02)
+
+
+def test_follower_waits_without_blocking_the_event_loop(parent):
+    worker = follower(parent.shared_dir)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        # The parent publishes its first generation while the worker is starting
+        threading.Timer(0.3, parent.start).start()
+        await worker.start(wait_seconds=30)
+        ticking.cancel()
+        return ticks
+
+    try:
+        assert asyncio.run(run()) >= 10
+        assert worker._content.snapshot.generation == parent._content.snapshot.generation
+    finally:
+        worker.stop()
+
+
+def test_follower_fails_fast_without_a_generation(tmp_path):
+    worker = follower(str(tmp_path))
+    with pytest.raises(RuntimeError, match="No shared generation"):
+        asyncio.run(worker.start(wait_seconds=0.1))
+    assert worker._content.snapshot is None
+
+
+def generation_dir(coordinator):
+    return os.path.join(coordinator.shared_dir, shared_serving.read_current(coordinator.shared_dir))
+
+
+def same_file(a, b, name):
+    return os.stat(os.path.join(a, name)).st_ino == os.stat(os.path.join(b, name)).st_ino
+
+
+def test_published_generation_attaches_to_the_same_snapshot(parent):
+    parent.start()
+    assert shared_serving.read_current(parent.shared_dir) == "gen-00000001"
+    assert parent.publish() is None
+
+    built = parent._content.snapshot
+    attached, cf_index, _ = shared_serving.attach(generation_dir(parent))
+    assert cf_index is None
+    assert attached.generation == built.generation
+    assert attached.neighbours is not None
+    title = built.combined_df["title"].iloc[7]
+    assert attached.find_title(title) == built.find_title(title) == 7
+    assert recommender.get_combined_recommendations(title=title, top_n=5, snapshot=attached) == \
+        recommender.get_combined_recommendations(title=title, top_n=5, snapshot=built)
+
+
+def test_refresh_rewrites_only_what_changed(parent):
+    parent.start()
+    first = generation_dir(parent)
+
+    added = movies(5, 5000, seed=2)
+    parent._content.added = added
+    parent._content.refresh()
+    grown = generation_dir(parent)
+    assert grown != first
+    for name in (index_artifact.VECTORIZER_FILE, index_artifact.IDF_FILE,
+                 index_artifact.NEIGHBOUR_IDS_FILE, index_artifact.NEIGHBOUR_SCORES_FILE):
+        assert same_file(first, grown, name)
+    for name in (index_artifact.CSR_DATA_FILE, index_artifact.TITLE_HASHES_FILE, index_artifact.ROWS_FILE):
+        assert not same_file(first, grown, name)
+
+    parent._content.added = movies(0, 1, seed=0)
+    parent._content.refresh(deleted_keys=[("imdb", 3)])
+    shrunk = generation_dir(parent)
+    for name in (index_artifact.CSR_DATA_FILE, index_artifact.CSR_INDPTR_FILE, index_artifact.ROWS_FILE,
+                 os.path.join(index_artifact.CATALOG_DIR, "title.data.npy")):
+        assert same_file(grown, shrunk, name)
+    assert not same_file(grown, shrunk, index_artifact.TITLE_HASHES_FILE)
+
+    attached, _, _ = shared_serving.attach(shrunk)
+    assert attached.find_title(attached.combined_df["title"].iloc[2]) is None
+    assert attached.find_title(added["title"].iloc[0]) == 350
+
+
+def test_new_collaborative_model_links_every_content_file(parent):
+    parent.start()
+    first = generation_dir(parent)
+
+    snapshot = parent._content.snapshot
+    df = snapshot.combined_df
+    keys = pd.DataFrame({"source": df["source"].astype(str).to_numpy(), "movie_id": df["id"].to_numpy()})
+    model = collaborative.CollaborativeModel(keys, np.random.default_rng(0).standard_normal((len(df), 8)).astype(np.float32))
+    parent._collaborative.install(collaborative.align(model, snapshot, index_kind="flat"), version=1)
+    second = parent.publish()
+
+    for root, _, files in os.walk(first):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), first)
+            if relative != index_artifact.MANIFEST_FILE:
+                assert same_file(first, second, relative), relative
+    _, cf_index, cf_version = shared_serving.attach(second)
+    assert cf_version == 1 and cf_index.known.all()
+
+
+def test_old_generations_are_pruned(parent, monkeypatch):
+    monkeypatch.setattr(shared_serving, "KEEP_GENERATIONS", 2)
+    parent.start()
+    worker = follower(parent.shared_dir)
+    assert worker.poll()
+    mapped = worker._content.snapshot
+
+    for i in range(3):
+        parent._content.added = movies(2, 6000 + 10 * i, seed=10 + i)
+        parent._content.refresh()
+
+    assert parent._generations() == ["gen-00000003", "gen-00000004"]
+    assert shared_serving.read_current(parent.shared_dir) == "gen-00000004"
+    # A worker still on a deleted generation keeps answering from its mapped files until it moves on
+    title = mapped.combined_df["title"].iloc[0]
+    assert recommender.get_combined_recommendations(title=title, top_n=3, snapshot=mapped)
+    assert worker.poll()
+    assert worker._content.snapshot.generation == parent._content.snapshot.generation
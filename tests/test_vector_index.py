@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+pytest.importorskip("faiss")
+
+import faiss
+import vector_index
+
+
+def vectors(n, d, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, d)).astype(np.float32)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def reference(matrix, queries, k, allowed):
+    """
+    Exact top-k by copying the allowed rows out, the straightforward way.
+    """
+    rows = np.flatnonzero(allowed)
+    scores = queries @ matrix[rows].T
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return rows[order]
+
+
+@pytest.mark.parametrize("allowed_rows", [50, 3000])
+@pytest.mark.parametrize("kind", ["flat", "hnsw"])
+def test_filtered_search_equals_exact_masked_search(monkeypatch, allowed_rows, kind):
+    monkeypatch.setattr(vector_index, "EXACT_SUBSET_LIMIT", 1000)
+    matrix = vectors(5000, 16)
+    queries = vectors(8, 16, seed=1)
+    allowed = np.zeros(len(matrix), dtype=bool)
+    allowed[np.random.default_rng(2).choice(len(matrix), allowed_rows, replace=False)] = True
+
+    index = vector_index.build_faiss_index(matrix, kind)
+    _, found = vector_index.search(index, matrix, queries, 10, allowed=allowed, ef_search=512)
+
+    assert allowed[found].all()
+    expected = reference(matrix, queries, 10, allowed)
+    recall = vector_index.recall_at_k(expected, found)
+    assert recall == 1.0 if kind == "flat" or allowed_rows <= 1000 else recall >= 0.95
+
+
+def test_sparse_index_masked_search_matches_reference():
+    matrix = vectors(400, 12)
+    queries = vectors(5, 12, seed=3)
+    allowed = np.zeros(len(matrix), dtype=bool)
+    allowed[::7] = True
+
+    index = vector_index.SparseIPIndex(sparse.csr_matrix(matrix))
+    scores, found = vector_index.search(index, index.matrix, queries, 6, allowed=allowed)
+
+    np.testing.assert_array_equal(found, reference(matrix, queries, 6, allowed))
+    assert np.isfinite(scores).all()
+
+
+def test_masked_search_pads_when_fewer_rows_are_allowed_than_k():
+    matrix = vectors(100, 8)
+    allowed = np.zeros(len(matrix), dtype=bool)
+    allowed[[4, 9]] = True
+
+    scores, found = vector_index.exact_search(matrix, vectors(2, 8, seed=4), 5, allowed)
+
+    assert set(found[:, :2].ravel()) == {4, 9}
+    assert (found[:, 2:] == -1).all()
+    assert np.isneginf(scores[:, 2:]).all()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from vectorization import FIELD_WEIGHTS, fit_weighted_tfidf, transform_weighted
+
+WORDS = ["heat", "crime", "drama", "space", "love", "war", "night", "city", "dream", "ghost",
+         "the", "and", "robert", "de", "niro", "al", "pacino", "michael", "mann", "river"]
+
+
+def movies(n, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def text(low, high):
+        return [" ".join(rng.choice(WORDS, size=rng.integers(low, high))) for _ in range(n)]
+
+    df = pd.DataFrame({"title": text(1, 4), "genres": text(1, 3), "director": text(1, 3),
+                       "stars": text(0, 4), "description": text(3, 20)})
+    df.loc[::7, "stars"] = None
+    return df
+
+
+def repeated_text(df, weights=FIELD_WEIGHTS):
+    """
+    The text weighted_texts stands in for: every field repeated `weight` times.
+    """
+    return [" ".join(" ".join([row[field]] * weight) for field, weight in weights.items())
+            for _, row in df.fillna("").iterrows()]
+
+
+@pytest.mark.parametrize("params", [{"stop_words": "english"}, {"stop_words": "english", "max_features": 8}])
+@pytest.mark.parametrize("chunk_rows, workers", [(1000, 1), (37, 1), (37, 2)])
+def test_fit_matches_tfidf_vectorizer_on_repeated_text(params, chunk_rows, workers):
+    df = movies(200)
+    expected = TfidfVectorizer(**params)
+    expected_matrix = expected.fit_transform(repeated_text(df))
+
+    vectorizer, matrix = fit_weighted_tfidf(df, params, chunk_rows=chunk_rows, workers=workers)
+
+    assert vectorizer.vocabulary_ == expected.vocabulary_
+    np.testing.assert_allclose(vectorizer.idf_, expected.idf_)
+    np.testing.assert_allclose(matrix.toarray(), expected_matrix.toarray(), atol=1e-6)
+
+
+def test_transform_weighted_matches_transform_on_repeated_text():
+    df, new = movies(200), movies(20, seed=1)
+    params = {"stop_words": "english"}
+    expected = TfidfVectorizer(**params).fit(repeated_text(df))
+    vectorizer, _ = fit_weighted_tfidf(df, params, workers=1)
+
+    np.testing.assert_allclose(transform_weighted(vectorizer, new).toarray(),
+                               expected.transform(repeated_text(new)).toarray(), atol=1e-6)
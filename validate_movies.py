@@ -44,8 +44,14 @@ df_cleaned.to_csv("de_movies_cleaned.csv", index=False)
 print("\n✅ Cleaned data saved to 'de_movies_cleaned.csv'")
 
 # upload data
+import sys
 from sqlalchemy import create_engine
 import pandas as pd
+from bulk_loader import load_dataframe, notify_server
+from log_config import configure_logging
+
+# The loader logs its rows/sec summary and any failed server notification
+configure_logging()
 
 # Load your cleaned CSV
 df = pd.read_csv("de_movies_cleaned.csv")
@@ -60,8 +66,17 @@ print("🧾 Columns being uploaded:", df.columns.tolist())
 
 
 
-# Upload the data
-df.to_sql('movies', con=engine, index=False, if_exists='append')
+# Upload the data with COPY (pass "replace" or "upsert" to swap/merge instead of appending)
+mode = sys.argv[1] if len(sys.argv) > 1 else "append"
+stats = load_dataframe(engine, df, 'movies', mode=mode)
 
 print("✅ Data uploaded successfully!")
+if stats["updated_ids"]:
+    print(f"✏️ Updated {len(stats['updated_ids'])} existing rows, ids: {stats['updated_ids'][:20]}"
+          f"{' ...' if len(stats['updated_ids']) > 20 else ''}")
+
+# Bring the running API's recommender index up to date
+index = notify_server('movies', mode, stats)
+if index is not None:
+    print(f"🧠 Recommender index: {index}")
 
@@ -0,0 +1,228 @@
+import logging
+import os
+
+import faiss
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# 🧭 FAISS index kind for dense/SVD vectors: "flat" (exact), "ivf", "hnsw" or "ivfpq"
+INDEX_KIND = os.getenv("RECOMMENDER_INDEX", "flat")
+IVF_NLIST = int(os.getenv("RECOMMENDER_IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("RECOMMENDER_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("RECOMMENDER_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RECOMMENDER_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("RECOMMENDER_HNSW_EF_SEARCH", "64"))
+PQ_M = int(os.getenv("RECOMMENDER_PQ_M", "32"))
+PQ_NBITS = 8
+
+# Filtered searches over at most this many rows skip the index and are scored exactly
+EXACT_SUBSET_LIMIT = int(os.getenv("RECOMMENDER_EXACT_SUBSET_LIMIT", "4096"))
+
+
+class SparseIPIndex:
+    """
+    Exact inner-product search straight over a CSR matrix.
+
+    Mirrors the parts of the FAISS index API the recommender uses
+    (`ntotal`, `d`, `search`) so it can stand in for `IndexFlatIP`
+    without ever densifying the TF-IDF vectors.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        self.ntotal, self.d = self.matrix.shape
+
+    def search(self, queries, k, params=None):
+        """
+        Top-k rows by inner product for each query row. Returns `(D, I)` like FAISS,
+        padded with `-inf` / `-1` when fewer than k rows exist. `params` is accepted
+        for API compatibility; exact search has nothing to tune.
+        """
+        if sparse.issparse(queries):
+            scores = (queries.astype(np.float32) @ self.matrix.T).toarray()
+        else:
+            scores = np.asarray(self.matrix @ np.asarray(queries, dtype=np.float32).T).T
+        return top_k(scores, k)
+
+
+def build_faiss_index(vectors, kind=None):
+    """
+    Inner-product FAISS index of the given kind over L2-normalized float32 `vectors`.
+
+    - "flat": exhaustive IndexFlatIP (exact)
+    - "ivf": IndexIVFFlat with k-means trained centroids, tuned by nprobe
+    - "hnsw": IndexHNSWFlat graph, tuned by efSearch
+    - "ivfpq": IndexIVFPQ, compressed codes for very large catalogs
+
+    Falls back to "flat" when there are too few vectors to train the requested kind.
+    """
+    kind = kind or INDEX_KIND
+    n, d = vectors.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if kind in ("ivf", "ivfpq"):
+        # FAISS wants ~39 training points per centroid
+        nlist = min(IVF_NLIST, n // 39)
+        pq_m = _pq_subquantizers(d)
+        if nlist < 1 or (kind == "ivfpq" and (n < 2 ** PQ_NBITS or pq_m is None)):
+            logger.warning(f"⚠️ {n} vectors is too few for a '{kind}' index, using flat.")
+            return build_faiss_index(vectors, "flat")
+
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, PQ_NBITS, metric)
+        index.train(vectors)
+        index.nprobe = min(IVF_NPROBE, nlist)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == "flat":
+        index = faiss.IndexFlatIP(d)
+    else:
+        raise ValueError(f"Unknown index kind '{kind}' (expected flat, ivf, hnsw or ivfpq)")
+
+    index.add(vectors)
+    return index
+
+
+def extend_index(index, vectors, start_id, mapped=False):
+    """
+    Copy of `index` with `vectors` appended as ids `start_id..`; the original is left
+    untouched for searches already running against it. Trained indexes keep their
+    centroids/codebooks, so new vectors are assigned without retraining.
+
+    A `mapped` index was read read-only from an artifact; FAISS can neither clone nor
+    grow its memory-mapped storage, so a writable in-memory copy is read back from it.
+    """
+    if isinstance(index, SparseIPIndex):
+        return SparseIPIndex(sparse.vstack([index.matrix, sparse.csr_matrix(vectors, dtype=np.float32)], format="csr"))
+
+    if index.ntotal != start_id:
+        raise ValueError(f"Index holds {index.ntotal} vectors, expected {start_id}")
+    if mapped:
+        extended = faiss.deserialize_index(faiss.serialize_index(index))
+    else:
+        extended = faiss.clone_index(index)
+    extended.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return extended
+
+
+def _pq_subquantizers(d):
+    """
+    Largest sub-quantizer count <= PQ_M that divides the dimension.
+    """
+    for m in range(min(PQ_M, d), 0, -1):
+        if d % m == 0:
+            return m
+    return None
+
+
+def search_params(index, nprobe=None, ef_search=None, sel=None):
+    """
+    Per-request FAISS SearchParameters for `index`, or None to use its defaults.
+    Knobs that don't apply to the index kind are ignored; `sel` restricts the searched ids.
+    """
+    base = faiss.downcast_index(index) if isinstance(index, faiss.Index) else index
+    if isinstance(base, faiss.IndexIVF) and (nprobe or sel is not None):
+        params = faiss.SearchParametersIVF(nprobe=min(int(nprobe or base.nprobe), base.nlist))
+    elif isinstance(base, faiss.IndexHNSW) and (ef_search or sel is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or base.hnsw.efSearch))
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def search(index, vectors, queries, k, allowed=None, nprobe=None, ef_search=None):
+    """
+    Top-k search over `index`, optionally restricted to rows where the boolean
+    mask `allowed` is True. Filtered searches always return the best matching
+    rows available: selective filters are scored exactly with other rows masked out, and
+    ANN results that come back short are topped up the same way.
+    """
+    if allowed is None:
+        return index.search(queries, k, params=search_params(index, nprobe, ef_search))
+
+    n_allowed = int(np.count_nonzero(allowed))
+    if isinstance(index, SparseIPIndex) or n_allowed <= EXACT_SUBSET_LIMIT:
+        return exact_search(vectors, queries, k, allowed)
+
+    # 🎯 Let FAISS skip everything outside the filter while it searches
+    bitmap = np.packbits(allowed, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    D, I = index.search(queries, k, params=search_params(index, nprobe, ef_search, sel=selector))
+
+    short = np.flatnonzero((I < 0).sum(axis=1) > max(k - n_allowed, 0))
+    if len(short):
+        D[short], I[short] = exact_search(vectors, queries[short], k, allowed)
+    return D, I
+
+
+def exact_search(vectors, queries, k, allowed=None):
+    """
+    Brute-force inner-product top-k over `vectors`, as `(D, I)`. Rows outside the
+    boolean mask `allowed` are scored `-inf` and never returned, so the shared
+    matrix is scored as is instead of copying the allowed rows out of it.
+    """
+    if sparse.issparse(vectors):
+        queries = sparse.csr_matrix(queries, dtype=np.float32)
+        scores = (queries @ vectors.T).toarray()
+    else:
+        scores = np.asarray(queries, dtype=np.float32) @ np.asarray(vectors, dtype=np.float32).T
+    if allowed is None:
+        return top_k(scores, k)
+
+    scores[:, ~allowed] = -np.inf
+    D, I = top_k(scores, k)
+    I[np.isneginf(D)] = -1
+    return D, I
+
+
+def top_k(scores, k):
+    """
+    Row-wise top-k of a dense `(n_queries, n_rows)` score matrix, best first.
+    """
+    n_queries, n_rows = scores.shape
+    D = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    I = np.full((n_queries, k), -1, dtype=np.int64)
+    kk = min(k, n_rows)
+    if kk == 0:
+        return D, I
+
+    part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    I[:, :kk] = np.take_along_axis(part, order, axis=1)
+    D[:, :kk] = np.take_along_axis(part_scores, order, axis=1)
+    return D, I
+
+
+def recall_at_k(truth, found):
+    """
+    Mean fraction of each query's true top-k neighbours present in `found` (both `(n, k)` id arrays).
+    """
+    hits = 0
+    total = 0
+    for true_row, found_row in zip(truth, found):
+        expected = set(true_row[true_row >= 0].tolist())
+        hits += len(expected & set(found_row.tolist()))
+        total += len(expected)
+    return hits / total if total else 1.0
+
+
+def nbytes(matrix):
+    """
+    Memory held by a dense or CSR vector matrix.
+    """
+    if sparse.issparse(matrix):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return matrix.nbytes
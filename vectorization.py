@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# ⚖️ How much each field counts towards a movie's TF-IDF vector. Same effect as
+# repeating the field's text that many times, without building the repeated string.
+FIELD_WEIGHTS = {"title": 3, "genres": 2, "director": 2, "stars": 2, "description": 2}
+
+# 🧵 Parallel vectorization: rows per chunk and worker processes (0 = one per CPU)
+CHUNK_ROWS = int(os.getenv("RECOMMENDER_VECTORIZE_CHUNK_ROWS", "20000"))
+WORKERS = int(os.getenv("RECOMMENDER_VECTORIZE_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def fit_weighted_tfidf(combined_df, params, weights=None, chunk_rows=CHUNK_ROWS, workers=WORKERS):
+    """
+    Fit TF-IDF over the weighted fields of `combined_df`. Returns `(vectorizer, tfidf_matrix)`,
+    matching `TfidfVectorizer(**params).fit_transform` on the field-repeated text.
+
+    Each chunk of rows is tokenized in a worker process into weighted term counts over
+    its own vocabulary; the chunks are then mapped onto the kept global vocabulary and
+    stacked, and only the (cheap) IDF weighting runs on the combined count matrix.
+    """
+    weights = weights or FIELD_WEIGHTS
+    count_params = {k: v for k, v in params.items() if k != "max_features"}
+    chunks = [weighted_texts(combined_df.iloc[start:start + chunk_rows], weights)
+              for start in range(0, len(combined_df), chunk_rows)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            counted = list(executor.map(_count_chunk, chunks, [count_params] * len(chunks)))
+    else:
+        counted = [_count_chunk(chunk, count_params) for chunk in chunks]
+
+    vocabulary = _select_vocabulary(counted, params.get("max_features"))
+    terms = pd.Index(vocabulary)
+    counts = sparse.vstack(
+        [_remap_columns(matrix, terms.get_indexer(chunk_terms), len(terms)) for chunk_terms, matrix in counted],
+        format="csr",
+    ) if counted else sparse.csr_matrix((0, len(terms)))
+
+    transformer = TfidfTransformer()
+    tfidf_matrix = transformer.fit_transform(counts).astype(np.float32)
+    vectorizer = make_vectorizer(params, {term: i for i, term in enumerate(vocabulary)}, transformer.idf_)
+    return vectorizer, tfidf_matrix
+
+
+def transform_weighted(vectorizer, combined_df, weights=None):
+    """
+    TF-IDF rows for new movies under an already fitted `vectorizer`, same weighting as the fit.
+    """
+    counts = None
+    for weight, texts in weighted_texts(combined_df, weights).items():
+        weighted = CountVectorizer.transform(vectorizer, texts) * weight
+        counts = weighted if counts is None else counts + weighted
+    return _tfidf_rows(vectorizer, counts)
+
+
+def transform_texts(vectorizer, texts):
+    """
+    TF-IDF rows for free text (e.g. a search query) under a fitted `vectorizer`.
+    The text stands for every field at once; a uniform field weight cancels out in
+    the L2 normalization, so this matches `transform_weighted` on such a row.
+    """
+    return _tfidf_rows(vectorizer, CountVectorizer.transform(vectorizer, list(texts)))
+
+
+def _tfidf_rows(vectorizer, counts):
+    tfidf = sparse.csr_matrix(counts, dtype=np.float64).multiply(vectorizer.idf_)
+    return normalize(sparse.csr_matrix(tfidf), norm="l2").astype(np.float32)
+
+
+def weighted_tokens(vectorizer, combined_df, weights=None):
+    """
+    `(tokens, out_of_vocabulary_tokens)` over the weighted fields, for vocabulary drift tracking.
+    """
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    tokens = oov_tokens = 0
+    for weight, texts in weighted_texts(combined_df, weights).items():
+        for text in texts:
+            found = analyzer(text)
+            tokens += weight * len(found)
+            oov_tokens += weight * sum(1 for token in found if token not in vocabulary)
+    return tokens, oov_tokens
+
+
+def make_vectorizer(params, vocabulary, idf):
+    """
+    A ready-to-use TfidfVectorizer from a saved vocabulary and IDF vector, without refitting.
+    """
+    vectorizer = TfidfVectorizer(**params, vocabulary=vocabulary)
+    vectorizer.vocabulary_ = dict(vocabulary)
+    vectorizer.fixed_vocabulary_ = True
+    vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+    return vectorizer
+
+
+def weighted_texts(combined_df, weights=None):
+    """
+    `{weight: texts}`: per row, the fields sharing a weight joined into one string,
+    so each row is tokenized once per distinct weight rather than once per field.
+    """
+    weights = weights or FIELD_WEIGHTS
+    groups = {}
+    for field, weight in weights.items():
+        groups.setdefault(weight, []).append(field)
+
+    texts = {}
+    for weight, fields in groups.items():
+        columns = [combined_df[field].fillna("").astype(str) for field in fields]
+        joined = columns[0]
+        for column in columns[1:]:
+            joined = joined + " " + column
+        texts[weight] = joined.tolist()
+    return texts
+
+
+def _count_chunk(texts, count_params):
+    """
+    Weighted term counts for one chunk of `weighted_texts`, over the chunk's own vocabulary.
+    """
+    n_rows = len(next(iter(texts.values()), []))
+    vocabulary = {}
+    rows, columns, data = [], [], []
+    for weight, weight_texts in texts.items():
+        vectorizer = CountVectorizer(**count_params)
+        try:
+            counts = vectorizer.fit_transform(weight_texts).tocoo()
+        except ValueError:
+            # Nothing but stop words / empty strings in these fields
+            continue
+        term_ids = np.array([vocabulary.setdefault(term, len(vocabulary))
+                             for term in vectorizer.get_feature_names_out()], dtype=np.int64)
+        rows.append(counts.row)
+        columns.append(term_ids[counts.col])
+        data.append(counts.data.astype(np.int64) * weight)
+
+    terms = np.array(list(vocabulary), dtype=object)
+    if not data:
+        return terms, sparse.csr_matrix((n_rows, 0), dtype=np.int64)
+    # Duplicate (row, term) entries from different fields are summed
+    matrix = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(columns))),
+                               shape=(n_rows, len(terms)))
+    return terms, matrix
+
+
+def _select_vocabulary(counted, max_features):
+    """
+    Sorted global vocabulary: the `max_features` terms with the highest weighted counts
+    and the same tie-breaking as CountVectorizer's own pruning.
+    """
+    per_chunk = [pd.Series(np.asarray(matrix.sum(axis=0)).ravel(), index=terms)
+                 for terms, matrix in counted if len(terms)]
+    if not per_chunk:
+        return []
+
+    # groupby sorts the terms, so positions below are in alphabetical order
+    totals = pd.concat(per_chunk).groupby(level=0).sum()
+    if max_features is not None and len(totals) > max_features:
+        keep = (-totals.to_numpy(dtype=np.int64)).argsort()[:max_features]
+        totals = totals.iloc[np.sort(keep)]
+    return totals.index.tolist()
+
+
+def _remap_columns(matrix, columns, n_columns):
+    """
+    Move a chunk's columns to their global vocabulary ids, dropping terms that weren't kept (-1).
+    """
+    matrix = matrix.tocoo()
+    mapped = columns[matrix.col]
+    kept = mapped >= 0
+    return sparse.csr_matrix((matrix.data[kept], (matrix.row[kept], mapped[kept])), shape=(matrix.shape[0], n_columns))